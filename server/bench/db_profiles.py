@@ -0,0 +1,110 @@
+"""
+Measures concurrent read/write throughput of the backing database under each database profile.
+
+Each run fills a fresh database with items, then runs reader threads (point lookups by item ID)
+alongside writer threads (single-row quantity updates, one transaction each) for a fixed time. ::
+
+    cd server
+    python bench/db_profiles.py [--items <n>] [--readers <n>] [--writers <n>] [--seconds <n>]
+
+:see also: :py:data:`common.DATABASE_PROFILES`
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import common  # noqa: E402
+import migrations  # noqa: E402
+import models  # noqa: E402
+from identifier import Identifier  # noqa: E402
+
+
+def _fill(path: str, profile: common.DatabaseProfile, n_items: int):
+    conn = common.connect(path, profile)
+    migrations.migrate(conn)
+    item_ids = [Identifier(length=models.Item.id_length) for _ in range(n_items)]
+    user_id = Identifier(length=models.User.id_length)
+    box_id = Identifier(length=models.Box.id_length)
+    conn.executemany(
+        f'INSERT INTO {models.Item.table_name} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [(item_id, box_id, 'mfg', 100, 'desc', 'dk', 'mouser', 'jlc', user_id, 0) for item_id in item_ids],
+    )
+    conn.commit()
+    conn.close()
+    return item_ids
+
+
+def _run(path: str, profile: common.DatabaseProfile, item_ids, n_readers: int, n_writers: int, seconds: float):
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'busy': 0}
+    lock = threading.Lock()
+
+    def reader():
+        conn = common.connect(path, profile)
+        n = 0
+        while not stop.is_set():
+            conn.execute(
+                f'SELECT * FROM {models.Item.table_name} WHERE {models.Item.id_name}=?', (random.choice(item_ids),),
+            ).fetchone()
+            n += 1
+        conn.close()
+        with lock:
+            counts['reads'] += n
+
+    def writer():
+        conn = common.connect(path, profile)
+        n = busy = 0
+        while not stop.is_set():
+            try:
+                conn.execute(
+                    f'UPDATE {models.Item.table_name} SET quantity=quantity+1 WHERE {models.Item.id_name}=?',
+                    (random.choice(item_ids),),
+                )
+                conn.commit()
+                n += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                busy += 1
+        conn.close()
+        with lock:
+            counts['writes'] += n
+            counts['busy'] += busy
+
+    threads = [threading.Thread(target=reader) for _ in range(n_readers)]
+    threads += [threading.Thread(target=writer) for _ in range(n_writers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return {k: v / seconds for k, v in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure database throughput under each database profile.')
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--writers', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f'{args.items} items, {args.readers} readers, {args.writers} writers, {args.seconds}s per profile')
+    for name, profile in common.DATABASE_PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'inventory.db')
+            item_ids = _fill(path, profile, args.items)
+            result = _run(path, profile, item_ids, args.readers, args.writers, args.seconds)
+        print(f'{name:>8}: {result["reads"]:>10.0f} reads/s {result["writes"]:>8.0f} writes/s '
+              f'{result["busy"]:>6.0f} busy errors/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,8 @@ Base Box API endpoint:
     * ``/api/box/`` when the response contains zero or one :py:class:`models.Box`
     * ``/api/boxes/`` when the response contains two or more :py:class:`models.Box` es
 """
+import sqlite3
+
 import auth
 import common
 import db
@@ -79,18 +81,18 @@ def api_box_create():
     form = common.FlaskPOSTForm(flask.request.form)
     conn, cursor = common.get_db_connection()
 
-    desired_name = form.get('name')
-    box_res = cursor.execute(f'SELECT * FROM {models.Box.table_name} WHERE name=?', (desired_name,))
-    db_box = box_res.fetchone()
-    if db_box is not None:
-        flask.abort(400, f'Box with name {desired_name} already exists')
-
     box = models.Box(
         box_id=Identifier(length=models.Box.id_length),
-        name=desired_name,
+        name=form.get('name'),
     )
 
-    db.create_entity(conn, cursor, box)
+    # Box names are unique, so a box with the same name is only found by failing to insert
+    try:
+        db.create_entity(conn, cursor, box)
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        db.abort_if_unique_violated(e, models.Box, box.to_dict())
+        raise
     return box.to_response()
 
 
@@ -109,12 +111,12 @@ def api_box_update():
 
     :return: ``200`` on success with the updated :py:class:`models.Box`,\n
              ``400`` if no attributes to update were provided,\n
+             ``400`` if a box with the desired name already exists,\n
              ``400`` if box ID was malformed,\n
              ``400`` if API key was malformed,\n
              ``401`` if API key was invalid,\n
              ``403`` if user does not have required scope,\n
-             ``404`` if box was not found before updating,\n
-             ``404`` if box was not found after updating,\n
+             ``404`` if box was not found,\n
              ``500`` if any other error while authenticating
     """
     return db.update(
@@ -147,12 +149,74 @@ def api_box_delete():
     return db.delete(entity_type=models.Box)
 
 
+@api_box_blueprint.route('/api/box/<box_id>/items', methods=['GET'])
+def api_box_items_list(box_id):
+    """
+    List the inventory items stored in a single box, identified by box ID, with optional ordering. ::
+
+        GET /api/box/<box_id>/items?sortby={*<item_attributes>}&direction={ASC,DESC}&limit=<limit>&offset=<offset>
+        GET /api/box/<box_id>/items?sortby={*<item_attributes>}&direction={ASC,DESC}&limit=<limit>&cursor=<cursor>
+
+    Takes the same (all optional) parameters as :py:func:`api_item_routes.api_items_list`, including
+    ``where`` filters. Items are looked up by the index on their box ID, so listing a box's items
+    does not depend on the size of the inventory.
+
+    :return: ``200`` on success with a list of :py:class:`models.Item` s,\n
+             ``400`` if box ID was malformed,\n
+             ``400`` if any listing parameter was malformed or invalid (see :py:func:`db.list_`),\n
+             ``404`` if box was not found
+    """
+    return db.list_(entity_type=models.Item, filters=(db.get_related_filter(models.Box, box_id),))
+
+
+@api_box_blueprint.route('/api/box/<box_id>/items/count', methods=['GET'])
+def api_box_items_count(box_id):
+    """
+    Count the inventory items stored in a single box, identified by box ID. ::
+
+        GET /api/box/<box_id>/items/count
+
+    Counts are cached until the next item is created, updated or deleted.
+    The count is embedded within the standard response body as ::
+
+        { 'count': item_count (int) }
+
+    :return: ``200`` on success with the box's item count (see formatting above),\n
+             ``400`` if box ID was malformed,\n
+             ``400`` if any ``where`` filter was malformed or invalid,\n
+             ``404`` if box was not found
+    """
+    return db.count(entity_type=models.Item, filters=(db.get_related_filter(models.Box, box_id),))
+
+
+@api_box_blueprint.route('/api/boxes/get_many', methods=['GET'])
+def api_boxes_get_many():
+    """
+    Get many boxes by box ID at once. ::
+
+        GET /api/boxes/get_many?box_ids=<box_id>,<box_id>,...
+
+    Up to :py:data:`common.GET_MANY_MAX_IDS` boxes can be retrieved at once, and duplicate IDs are ignored.
+    The response body contains the outcome of every box, in the order requested, identified by box ID
+    (see :py:func:`common.create_outcome`): ::
+
+        { 'code': 200, 'box_id': <box_id>, 'body': [<models.Box>] }
+        { 'code': 404, 'box_id': <box_id>, 'body': [<error name and description>] }
+
+    :return: ``200`` on success with the outcome of every box (see formatting above),\n
+             ``400`` if ``box_ids`` was not found,\n
+             ``400`` if ``box_ids`` was malformed, empty, or had too many IDs
+    """
+    return db.get_many(entity_type=models.Box)
+
+
 @api_box_blueprint.route('/api/boxes/list', methods=['GET'])
 def api_boxes_list():
     """
     List one or more inventory boxes with optional ordering. ::
 
         GET /api/boxes/list?sortby={*<box_attributes>}&direction={ASC,DESC}&limit=<limit>&offset=<offset>
+        GET /api/boxes/list?sortby={*<box_attributes>}&direction={ASC,DESC}&limit=<limit>&cursor=<cursor>
         POST /api/boxes/list [sortby={*<box_attributes>}, <direction={ASC,DESC}>, <limit>, <offset>]
 
     Available (all optional) parameters:
@@ -164,13 +228,20 @@ def api_boxes_list():
         * ``limit``: the (maximum) number of returned boxes. :py:data:`common.RET_ENTITIES_DEF_LIMIT` default,\
                 up to a maximum of :py:data:`common.RET_ENTITIES_MAX_LIMIT`.
         * ``offset``: the index offset within the database to respond with. 0 by default.
+        * ``cursor``: the ``next_cursor`` of a previous response, or empty for the first page.\
+                Enables keyset pagination (see :py:func:`db.list_`) and cannot be combined with ``offset``.
+        * ``where``: a filter formatted as ``<attribute>.<operator>.<value>``, where the operator is one of\
+                ``eq``, ``lt``, ``gt``, ``in`` or ``prefix`` (see :py:func:`db.get_filters`), e.g.\
+                ``where=name.prefix.shelf``. May be repeated, in which case boxes must match every filter.
 
     :return: ``200`` on success with a list of :py:class:`models.Box` es,\n
              ``400`` if any sorting attributes were malformed,\n
              ``400`` if ``sortby`` is present and is not a valid sort key,\n
              ``400`` if ``direction`` is not ``ASC`` or ``DESC``,\n
              ``400`` if ``limit`` is not an integer (digit string), \n
-             ``400`` if ``offset`` is not an integer (digit string)
+             ``400`` if ``offset`` is not an integer (digit string),\n
+             ``400`` if ``cursor`` was malformed or combined with ``offset``,\n
+             ``400`` if any ``where`` filter was malformed or invalid
     """
     return db.list_(entity_type=models.Box)
 
@@ -178,9 +249,12 @@ def api_boxes_list():
 @api_box_blueprint.route('/api/boxes/count', methods=['GET'])
 def api_boxes_count():
     """
-    Count the total number of inventory boxes. ::
+    Count the total number of inventory boxes, or only those matching filters. ::
 
         GET /api/boxes/count
+        GET /api/boxes/count?where=<attribute>.<operator>.<value>&...
+
+    Filters are passed as ``where`` parameters, as in :py:func:`api_boxes_list`.
 
     This endpoint does not follow a standard :py:class:`models.Model` list format.
     Instead, the count is embedded within the standard response body as ::
@@ -188,6 +262,7 @@ def api_boxes_count():
         { 'count': box_count (int) }
 
     :return: ``200`` on success with the total box count (see formatting above),\n
+             ``400`` if any ``where`` filter was malformed or invalid,\n
              ``500`` if the box count returned a non-one number of values
     """
     return db.count(entity_type=models.Box)
@@ -14,9 +14,19 @@ import db
 import flask
 import models
 from identifier import Identifier
+from werkzeug.exceptions import HTTPException
 
 api_item_blueprint = flask.Blueprint('api_item', __name__)
 
+#: Item attributes which cannot be updated. Items must be deleted and re-created to change these attributes.
+ITEM_IMMUTABLE_PROPS = [
+    models.Item.id_name,
+    'created_by',
+    'created_epoch_millis',
+]
+#: Item attributes holding part numbers, each of which items can be looked up by.
+PART_NUMBER_COLUMNS = ('mfg_part_number', 'digikey_part_number', 'mouser_part_number', 'jlcpcb_part_number')
+
 
 @api_item_blueprint.route('/api/item/get/<item_id>', methods=['GET'])
 def api_item_get_static(item_id):
@@ -81,19 +91,11 @@ def api_item_create():
     form = common.FlaskPOSTForm(flask.request.form)
     conn, cursor = common.get_db_connection()
 
-    user_id = db.get_request_user_id(cursor, form)
-    box_id = form.get(models.Box.id_name)
-
-    item = models.Item(
+    user_id = db.get_request_user_id(form)
+    item = _create_item(
+        form,
         item_id=Identifier(length=models.Item.id_length),
-        box_id=Identifier(length=models.Box.id_length, id_=box_id),
-        mfg_part_number=form.get('mfg_part_number'),
-        quantity=form.get('quantity', int),
-        description=form.get('description'),
-        digikey_part_number=form.get('digikey_part_number'),
-        mouser_part_number=form.get('mouser_part_number'),
-        jlcpcb_part_number=form.get('jlcpcb_part_number'),
-        created_by=Identifier(length=models.User.id_length, id_=user_id),
+        user_id=user_id,
         created_epoch_millis=common.time_ms(),
     )
 
@@ -101,6 +103,60 @@ def api_item_create():
     return item.to_response()
 
 
+@api_item_blueprint.route('/api/items/create_bulk', methods=['POST'])
+@auth.route_requires_auth(auth.Scope.ITEM_CREATE)
+def api_items_create_bulk():
+    """
+    Create many inventory items at once, each with provided attributes. ::
+
+        POST /api/items/create_bulk [<items>, <api_key>]
+
+    ``items`` is either a form field containing a JSON array of objects, or an uploaded CSV file
+    with a header row, where each object/row holds the attributes of one item as listed
+    in :py:func:`api_item_create`. At most :py:data:`common.BULK_MAX_ROWS` items can be created at once.
+
+    Every row is validated as if it was sent to :py:func:`api_item_create` on its own.
+    Valid rows are then all created within a single transaction, while invalid rows are skipped.
+    The response body contains the outcome of every row, in order, with ``row`` as its
+    zero-based index within ``items`` (see :py:func:`common.create_outcome`): ::
+
+        { 'code': 200, 'row': 0, 'body': [<created models.Item>] }
+        { 'code': 400, 'row': 1, 'body': [<error name and description>] }
+
+    Requires authentication scope :py:attr:`auth.Scope.ITEM_CREATE`
+
+    :return: ``200`` on success with the outcome of every row (see formatting above),\n
+             ``400`` if ``items`` was not found,\n
+             ``400`` if ``items`` was malformed, empty, or had too many rows,\n
+             ``400`` if API key was malformed,\n
+             ``401`` if API key was invalid,\n
+             ``403`` if user does not have required scope,\n
+             ``500`` if any other error while authenticating
+    """
+    form = common.FlaskPOSTForm(flask.request.form)
+    conn, cursor = common.get_db_connection()
+
+    user_id = db.get_request_user_id(form)
+    rows = common.get_request_rows('items')
+    item_ids = [Identifier(length=models.Item.id_length) for _ in rows]
+    created_epoch_millis = common.time_ms()
+
+    items = []
+    outcomes = []
+    for row_idx, (row, item_id) in enumerate(zip(rows, item_ids)):
+        try:
+            item = _create_item(common.FlaskPOSTForm(row), item_id, user_id, created_epoch_millis)
+        except HTTPException as e:
+            outcomes.append(common.create_error_outcome(e, row=row_idx))
+            continue
+        items.append(item)
+        outcomes.append(common.create_outcome(200, item.to_dict(), row=row_idx))
+
+    if len(items) != 0:
+        db.create_entities(conn, cursor, models.Item, items)
+    return common.create_response(200, outcomes)
+
+
 @api_item_blueprint.route('/api/item/update', methods=['POST'])
 @auth.route_requires_auth(auth.Scope.ITEM_UPDATE)
 def api_item_update():
@@ -130,18 +186,10 @@ def api_item_update():
              ``400`` if API key was malformed,\n
              ``401`` if API key was invalid,\n
              ``403`` if user does not have required scope,\n
-             ``404`` if item was not found before updating,\n
-             ``404`` if item was not found after updating,\n
+             ``404`` if item was not found,\n
              ``500`` if any other error while authenticating
     """
-    return db.update(
-        entity_type=models.Item,
-        immutable_props=[
-            models.Item.id_name,
-            'created_by',
-            'created_epoch_millis',
-        ],
-    )
+    return db.update(entity_type=models.Item, immutable_props=ITEM_IMMUTABLE_PROPS)
 
 
 @api_item_blueprint.route('/api/item/delete', methods=['POST'])
@@ -166,12 +214,159 @@ def api_item_delete():
     return db.delete(entity_type=models.Item)
 
 
+@api_item_blueprint.route('/api/items/get_many', methods=['GET'])
+def api_items_get_many():
+    """
+    Get many inventory items by item ID at once. ::
+
+        GET /api/items/get_many?item_ids=<item_id>,<item_id>,...
+
+    Up to :py:data:`common.GET_MANY_MAX_IDS` inventory items can be retrieved at once, and duplicate IDs are ignored.
+    The response body contains the outcome of every item, in the order requested, identified by item ID
+    (see :py:func:`common.create_outcome`): ::
+
+        { 'code': 200, 'item_id': <item_id>, 'body': [<models.Item>] }
+        { 'code': 404, 'item_id': <item_id>, 'body': [<error name and description>] }
+
+    :return: ``200`` on success with the outcome of every item (see formatting above),\n
+             ``400`` if ``item_ids`` was not found,\n
+             ``400`` if ``item_ids`` was malformed, empty, or had too many IDs
+    """
+    return db.get_many(entity_type=models.Item)
+
+
+@api_item_blueprint.route('/api/items/update_bulk', methods=['POST'])
+@auth.route_requires_auth(auth.Scope.ITEM_UPDATE)
+def api_items_update_bulk():
+    """
+    Update one or more attributes on many inventory items at once, within a single transaction. ::
+
+        POST /api/items/update_bulk [*<item_attributes>, <item_ids>, <api_key>]
+        POST /api/items/update_bulk [<patches>, <api_key>]
+
+    Items are updated either:
+
+        * With the same attributes, passed as in :py:func:`api_item_update`, on every item\
+                in ``item_ids``: comma-separated item IDs, e.g. ``item_ids=<item_id>,<item_id>``.
+        * With their own attributes, passed in ``patches``: either a form field containing\
+                a JSON array of objects, or an uploaded CSV file with a header row,\
+                where each object/row holds the ``item_id`` of one item and the attributes to update on it.
+
+    The same attributes as :py:func:`api_item_update` can be updated.
+    At most :py:data:`common.BULK_MAX_ROWS` items can be updated at once.
+    The response body contains the outcome of every item, in order, identified by item ID
+    (see :py:func:`common.create_outcome`): ::
+
+        { 'code': 200, 'item_id': <item_id>, 'body': [<updated models.Item>] }
+        { 'code': 404, 'item_id': <item_id>, 'body': [<error name and description>] }
+
+    Requires authentication scope :py:attr:`auth.Scope.ITEM_UPDATE`
+
+    :return: ``200`` on success with the outcome of every item (see formatting above),\n
+             ``400`` if neither ``item_ids`` nor ``patches`` were found,\n
+             ``400`` if ``item_ids`` or ``patches`` was malformed, empty, or had too many items,\n
+             ``400`` if no attributes to update were provided with ``item_ids``,\n
+             ``400`` if API key was malformed,\n
+             ``401`` if API key was invalid,\n
+             ``403`` if user does not have required scope,\n
+             ``500`` if any other error while authenticating
+    """
+    return db.update_many(entity_type=models.Item, immutable_props=ITEM_IMMUTABLE_PROPS)
+
+
+@api_item_blueprint.route('/api/items/adjust', methods=['POST'])
+@auth.route_requires_auth(auth.Scope.ITEM_UPDATE)
+def api_items_adjust():
+    """
+    Adjust the quantity of many inventory items at once by a signed amount, within a single transaction. ::
+
+        POST /api/items/adjust [<adjustments>, <api_key>]
+
+    ``adjustments`` is either a form field containing a JSON array of objects, or an uploaded CSV file
+    with a header row, where each object/row holds the ``item_id`` of one item and the ``delta``
+    to add to its quantity, e.g. ``[{"item_id": <item_id>, "delta": -3}]``.
+    At most :py:data:`common.BULK_MAX_ROWS` adjustments can be made at once.
+
+    Quantities are adjusted in the database (``quantity = quantity + delta``) rather than being
+    read and written back, so concurrent adjustments are never lost. Either every adjustment
+    is applied or, if any item does not exist or would have a negative quantity, none are.
+    The response body contains every adjusted item, in order.
+
+    Requires authentication scope :py:attr:`auth.Scope.ITEM_UPDATE`
+
+    :return: ``200`` on success with the adjusted items,\n
+             ``400`` if ``adjustments`` was not found,\n
+             ``400`` if ``adjustments`` was malformed, empty, or had too many rows,\n
+             ``400`` if any adjustment was malformed,\n
+             ``400`` if any adjustment would make an item's quantity negative,\n
+             ``400`` if API key was malformed,\n
+             ``401`` if API key was invalid,\n
+             ``403`` if user does not have required scope,\n
+             ``404`` if any item does not exist,\n
+             ``500`` if any other error while authenticating
+    """
+    rows = common.get_request_rows('adjustments')
+    adjustments = []
+    for row in rows:
+        row_form = common.FlaskPOSTForm(row)
+        adjustments.append((row_form.get(models.Item.id_name), row_form.get('delta', int)))
+
+    conn, cursor = common.get_db_connection()
+    items = []
+    for item_id, delta in adjustments:
+        res = cursor.execute(
+            f'UPDATE {models.Item.table_name} SET quantity=quantity+? '
+            f'WHERE {models.Item.id_name}=? AND quantity+?>=0 RETURNING *',
+            (delta, item_id, delta),
+        )
+        db_item = res.fetchone()
+        if db_item is None:
+            res = cursor.execute(
+                f'SELECT quantity FROM {models.Item.table_name} WHERE {models.Item.id_name}=?', (item_id,),
+            )
+            quantity = res.fetchone()
+            conn.rollback()
+            if quantity is None:
+                flask.abort(404, f'Item {item_id} does not exist')
+            flask.abort(400, f'Insufficient quantity of item {item_id}. Adjusted by {delta}, had {quantity[0]}')
+        items.append(models.Item(*db_item).to_dict())
+    conn.commit()
+    db.invalidate_cache(models.Item)
+    return common.create_response(200, items)
+
+
+@api_item_blueprint.route('/api/items/delete_bulk', methods=['POST'])
+@auth.route_requires_auth(auth.Scope.ITEM_DELETE)
+def api_items_delete_bulk():
+    """
+    Delete many inventory items at once, identified by item IDs, within a single transaction. ::
+
+        POST /api/items/delete_bulk [<item_ids>, <api_key>]
+
+    ``item_ids`` are comma-separated item IDs, e.g. ``item_ids=<item_id>,<item_id>``.
+    At most :py:data:`common.BULK_MAX_ROWS` items can be deleted at once.
+    The response body contains the outcome of every item, in order, as in :py:func:`api_items_update_bulk`.
+
+    Requires authentication scope :py:attr:`auth.Scope.ITEM_DELETE`
+
+    :return: ``200`` on success with the outcome of every item (see formatting above),\n
+             ``400`` if ``item_ids`` was not found,\n
+             ``400`` if ``item_ids`` was malformed, empty, or had too many items,\n
+             ``400`` if API key was malformed,\n
+             ``401`` if API key was invalid,\n
+             ``403`` if user does not have required scope,\n
+             ``500`` if any other error while authenticating
+    """
+    return db.delete_many(entity_type=models.Item)
+
+
 @api_item_blueprint.route('/api/items/list', methods=['GET'])
 def api_items_list():
     """
     List one or more inventory items with optional ordering. ::
 
         GET /api/items/list?sortby={*<item_attributes>}&direction={ASC,DESC}&limit=<limit>&offset=<offset>
+        GET /api/items/list?sortby={*<item_attributes>}&direction={ASC,DESC}&limit=<limit>&cursor=<cursor>
 
     Available (all optional) parameters:
 
@@ -182,23 +377,105 @@ def api_items_list():
         * ``limit``: the (maximum) number of returned items. :py:data:`common.RET_ENTITIES_DEF_LIMIT` default,\
                 up to a maximum of :py:data:`common.RET_ENTITIES_MAX_LIMIT`.
         * ``offset``: the index offset within the database to respond with. 0 by default.
+        * ``cursor``: the ``next_cursor`` of a previous response, or empty for the first page.\
+                Enables keyset pagination (see :py:func:`db.list_`) and cannot be combined with ``offset``.
+        * ``where``: a filter formatted as ``<attribute>.<operator>.<value>``, where the operator is one of\
+                ``eq``, ``lt``, ``gt``, ``in`` or ``prefix`` (see :py:func:`db.get_filters`), e.g.\
+                ``where=quantity.lt.5&where=box_id.eq.<box_id>``.\
+                May be repeated, in which case items must match every filter.
 
     :return: ``200`` on success with a list of :py:class:`models.Item` s,\n
              ``400`` if any sorting attributes were malformed,\n
              ``400`` if ``sortby`` is present and is not a valid sort key,\n
              ``400`` if ``direction`` is not ``ASC`` or ``DESC``,\n
              ``400`` if ``limit`` is not an integer (digit string), \n
-             ``400`` if ``offset`` is not an integer (digit string)
+             ``400`` if ``offset`` is not an integer (digit string),\n
+             ``400`` if ``cursor`` was malformed or combined with ``offset``,\n
+             ``400`` if any ``where`` filter was malformed or invalid
     """
     return db.list_(entity_type=models.Item)
 
 
+@api_item_blueprint.route('/api/items/by_part', methods=['GET'])
+def api_items_by_part():
+    """
+    Get all inventory items with an exact part number, e.g. as scanned from a distributor's barcode. ::
+
+        GET /api/items/by_part?{mfg_part_number,digikey_part_number,mouser_part_number,jlcpcb_part_number}=<value>
+
+    Exactly one of the part number attributes (:py:data:`PART_NUMBER_COLUMNS`) must be passed,
+    and items match if their value of that attribute is exactly equal (case-sensitive). Each part
+    number attribute is indexed, so lookups do not scan the table. For approximate matches,
+    see :py:func:`api_items_search` and :py:func:`api_items_fuzzy`.
+
+    :return: ``200`` on success with a list of matching :py:class:`models.Item` s, ordered by item ID,\n
+             ``400`` if none or more than one part number attribute was passed,\n
+             ``400`` if the part number was malformed
+    """
+    return db.get_by_column(entity_type=models.Item, columns=PART_NUMBER_COLUMNS)
+
+
+@api_item_blueprint.route('/api/items/search', methods=['GET'])
+def api_items_search():
+    """
+    Search inventory items by part number or description, most relevant first. ::
+
+        GET /api/items/search?q=<query>&limit=<limit>&offset=<offset>
+
+    Parameters:
+
+        * ``q``: one or more whitespace-separated search terms (required). Items match if every term\
+                is a prefix of a word in any of their ``mfg_part_number``, ``description``,\
+                ``digikey_part_number``, ``mouser_part_number`` or ``jlcpcb_part_number``,\
+                case-insensitively. Part numbers are split into words at punctuation, so e.g.\
+                ``0710`` matches ``RC0603FR-0710KL``.
+        * ``limit``: the (maximum) number of returned items. :py:data:`common.RET_ENTITIES_DEF_LIMIT` default,\
+                up to a maximum of :py:data:`common.RET_ENTITIES_MAX_LIMIT`.
+        * ``offset``: the number of most relevant items to skip. 0 by default.
+
+    :return: ``200`` on success with a list of matching :py:class:`models.Item` s,\n
+             ``400`` if ``q`` was not found, malformed or empty,\n
+             ``400`` if ``limit`` is not an integer (digit string),\n
+             ``400`` if ``offset`` is not an integer (digit string),\n
+             ``501`` if full-text search is not supported by the database
+    """
+    return db.search(entity_type=models.Item)
+
+
+@api_item_blueprint.route('/api/items/fuzzy', methods=['GET'])
+def api_items_fuzzy():
+    """
+    Look up inventory items by an approximate part number, most similar first. ::
+
+        GET /api/items/fuzzy?q=<part_number>&limit=<limit>
+
+    Parameters:
+
+        * ``q``: a part number, possibly mistyped (required). Items match if any of their ``mfg_part_number``,\
+                ``digikey_part_number``, ``mouser_part_number`` or ``jlcpcb_part_number`` is similar,\
+                ignoring case and :py:data:`common.FUZZY_IGNORED_CHARS`, so e.g.\
+                ``grm188r71h104ka93`` matches ``GRM188R71H104KA93D``. See :py:func:`db.fuzzy_search`.
+        * ``limit``: the (maximum) number of returned items. :py:data:`common.RET_ENTITIES_DEF_LIMIT` default,\
+                up to a maximum of :py:data:`common.RET_ENTITIES_MAX_LIMIT`.
+
+    :return: ``200`` on success with a list of similar :py:class:`models.Item` s,\n
+             ``400`` if ``q`` was not found or malformed,\n
+             ``400`` if ``q`` had fewer than 3 characters (ignoring :py:data:`common.FUZZY_IGNORED_CHARS`),\n
+             ``400`` if ``limit`` is not an integer (digit string),\n
+             ``501`` if fuzzy search is not supported by the database
+    """
+    return db.fuzzy_search(entity_type=models.Item)
+
+
 @api_item_blueprint.route('/api/items/count', methods=['GET'])
 def api_items_count():
     """
-    Count the total number of inventory items. ::
+    Count the total number of inventory items, or only those matching filters. ::
 
         GET /api/items/count
+        GET /api/items/count?where=<attribute>.<operator>.<value>&...
+
+    Filters are passed as ``where`` parameters, as in :py:func:`api_items_list`.
 
     This endpoint does not follow a standard :py:class:`models.Model` list format.
     Instead, the count is embedded within the standard response body as ::
@@ -206,6 +483,70 @@ def api_items_count():
         { 'count': item_count (int) }
 
     :return: ``200`` on success with the total item count (see formatting above),\n
+             ``400`` if any ``where`` filter was malformed or invalid,\n
              ``500`` if the item count returned a non-one number of values
     """
     return db.count(entity_type=models.Item)
+
+
+@api_item_blueprint.route('/api/item/<item_id>/reservations', methods=['GET'])
+def api_item_reservations_list(item_id):
+    """
+    List the reservations of a single inventory item, identified by item ID, with optional ordering. ::
+
+        GET /api/item/<item_id>/reservations?<parameters>
+
+    Takes the same (all optional) ``sortby``, ``direction``, ``limit``, ``offset``, ``cursor`` and ``where``
+    parameters as :py:func:`api_reservation_routes.api_reservations_list` (see :py:func:`db.list_`).
+    Reservations are looked up by the index on their item ID, so listing an item's reservations
+    does not depend on the number of reservations. Expired reservations are listed until they are swept
+    (see :py:func:`db.sweep_expired_reservations`).
+
+    :return: ``200`` on success with a list of :py:class:`models.Reservation` s,\n
+             ``400`` if item ID was malformed,\n
+             ``400`` if any listing parameter was malformed or invalid (see :py:func:`db.list_`),\n
+             ``404`` if item was not found
+    """
+    return db.list_(entity_type=models.Reservation, filters=(db.get_related_filter(models.Item, item_id),))
+
+
+@api_item_blueprint.route('/api/item/<item_id>/reservations/quantity', methods=['GET'])
+def api_item_reservations_quantity(item_id):
+    """
+    Sum the quantity of all unexpired reservations of a single inventory item, identified by item ID.
+    Expired reservations no longer hold any quantity, even before they are swept. ::
+
+        GET /api/item/<item_id>/reservations/quantity
+
+    The sum is read from the index covering the expiry and quantity of each item's reservations,
+    and embedded within the standard response body as ::
+
+        { 'quantity': reserved_quantity (int) }
+
+    :return: ``200`` on success with the item's reserved quantity (see formatting above),\n
+             ``400`` if item ID was malformed,\n
+             ``400`` if any ``where`` filter was malformed or invalid,\n
+             ``404`` if item was not found
+    """
+    return db.sum_(
+        entity_type=models.Reservation, column='quantity', filters=(
+            db.get_related_filter(models.Item, item_id),
+            db.Filter('expires_epoch_millis', 'gt', common.time_ms()),
+        ),
+    )
+
+
+def _create_item(form: common.FlaskPOSTForm, item_id: str, user_id: str, created_epoch_millis: int) -> models.Item:
+    box_id = form.get(models.Box.id_name)
+    return models.Item(
+        item_id=item_id,
+        box_id=Identifier(length=models.Box.id_length, id_=box_id),
+        mfg_part_number=form.get('mfg_part_number'),
+        quantity=form.get('quantity', int),
+        description=form.get('description'),
+        digikey_part_number=form.get('digikey_part_number'),
+        mouser_part_number=form.get('mouser_part_number'),
+        jlcpcb_part_number=form.get('jlcpcb_part_number'),
+        created_by=Identifier(length=models.User.id_length, id_=user_id),
+        created_epoch_millis=created_epoch_millis,
+    )
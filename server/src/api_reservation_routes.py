@@ -4,10 +4,25 @@ import db
 import flask
 import models
 from identifier import Identifier
+from werkzeug.exceptions import HTTPException
 
 
 api_reservation_blueprint = flask.Blueprint('api_reservation', __name__)
 
+#: Quantity of the item in the current row which is not reserved by unexpired reservations yet,
+#: given the current time in epoch milliseconds as a parameter
+_AVAILABLE_QUANTITY_SQL = (
+    f'quantity - (SELECT COALESCE(SUM(quantity), 0) FROM {models.Reservation.table_name} '
+    f'WHERE {models.Reservation.table_name}.{models.Item.id_name}={models.Item.table_name}.{models.Item.id_name} '
+    f'AND expires_epoch_millis > ?)'
+)
+#: Reservation attributes which cannot be updated. Reservations must be deleted and re-created to change these.
+_RESERVATION_IMMUTABLE_PROPS = [
+    models.Reservation.id_name,
+    models.User.id_name,
+    models.Item.id_name,
+]
+
 
 @api_reservation_blueprint.route('/api/reservation/get/<reservation_id>', methods=['GET'])
 def api_reservation_get_static(reservation_id):
@@ -24,44 +39,136 @@ def api_reservation_get_dynamic():
 @api_reservation_blueprint.route('/api/reservation/create', methods=['POST'])
 @auth.route_requires_auth(auth.Scope.RESERVATION_CREATE)
 def api_reservation_create():
-    # TODO documentation
+    """
+    Reserve a quantity of an item for the requesting user. ::
+
+        POST /api/reservation/create
+            item_id=<item_id>&quantity=<quantity>[&expires_epoch_millis=<expires_epoch_millis>]
+
+    Reservations expire at ``expires_epoch_millis``, by default :py:data:`common.RESERVATION_TTL_MILLIS`
+    after being created, after which they no longer hold any quantity and are eventually deleted
+    (see :py:func:`db.sweep_expired_reservations`).
+    The available quantity of the item is its quantity minus the quantity of all its unexpired reservations.
+    The check and the insert run as a single statement within an immediate transaction,
+    so concurrent reservations of the same item can never reserve more than is available.
+
+    :return: ``200`` on success with the reservation,\n
+             ``400`` if the quantity was not positive or more than the available quantity,\n
+             ``400`` if the expiry was not in the future,\n
+             ``404`` if the item does not exist
+    """
     form = common.FlaskPOSTForm(flask.request.form)
     conn, cursor = common.get_db_connection()
 
-    user_id = db.get_request_user_id(cursor, form)
-
+    user_id = db.get_request_user_id(form)
     item_id = form.get(models.Item.id_name)
-    item_res = cursor.execute(f'SELECT * FROM {models.Item.table_name} WHERE {models.Item.id_name}=?', (item_id,))
-    db_item = item_res.fetchone()
-    if db_item is None or len(db_item) == 0:
-        flask.abort(404, 'Item does not exist')
-    item = models.Item(*db_item)
-
     desired_quantity = form.get('quantity', int)
-    if desired_quantity > item.quantity:
-        flask.abort(400, f'Insufficient item quantity. Requested {desired_quantity}, had {item.quantity}')
-
-    reservation = models.Reservation(
-        reservation_id=Identifier(length=models.Reservation.id_length),
-        user_id=Identifier(length=models.User.id_length, id_=user_id),
-        item_id=Identifier(length=models.Item.id_length, id_=item_id),
-        quantity=desired_quantity,
-    )
-    db.create_entity(conn, cursor, reservation)
+    if desired_quantity < 1:
+        flask.abort(400, 'quantity must be positive')
+    now = common.time_ms()
+    expires_epoch_millis = now + common.RESERVATION_TTL_MILLIS
+    if 'expires_epoch_millis' in flask.request.form:
+        expires_epoch_millis = form.get('expires_epoch_millis', int)
+        if expires_epoch_millis <= now:
+            flask.abort(400, 'expires_epoch_millis must be in the future')
+
+    reservation_id = Identifier(length=models.Reservation.id_length)
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        res = cursor.execute(
+            f'INSERT INTO {models.Reservation.table_name} SELECT ?, ?, {models.Item.id_name}, ?, ? '
+            f'FROM {models.Item.table_name} WHERE {models.Item.id_name}=? AND {_AVAILABLE_QUANTITY_SQL} >= ? '
+            f'RETURNING *',
+            (reservation_id, user_id, desired_quantity, expires_epoch_millis, item_id, now, desired_quantity),
+        )
+        db_reservation = res.fetchone()
+        if db_reservation is None:
+            res = cursor.execute(
+                f'SELECT {_AVAILABLE_QUANTITY_SQL} FROM {models.Item.table_name} WHERE {models.Item.id_name}=?',
+                (now, item_id),
+            )
+            available = res.fetchone()
+            if available is None:
+                flask.abort(404, 'Item does not exist')
+            flask.abort(400, f'Insufficient item quantity. Requested {desired_quantity}, had {available[0]}')
+        reservation = models.Reservation(*db_reservation)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    db.invalidate_cache(models.Reservation)
     return reservation.to_response()
 
 
 @api_reservation_blueprint.route('/api/reservation/update', methods=['POST'])
 @auth.route_requires_auth(auth.Scope.RESERVATION_UPDATE)
 def api_reservation_update():
-    return db.update(
-        entity_type=models.Reservation,
-        immutable_props=[
-            models.Reservation.id_name,
-            models.User.id_name,
-            models.Item.id_name,
-        ],
+    """
+    Update the quantity and/or expiry of a single reservation, identified by reservation ID. ::
+
+        POST /api/reservation/update
+            reservation_id=<reservation_id>[&quantity=<quantity>][&expires_epoch_millis=<expires_epoch_millis>]
+
+    As in :py:func:`api_reservation_create`, the reservation is checked against the available quantity
+    of its item, excluding the quantity it already holds itself, and updated within a single statement
+    in an immediate transaction, so updates can never reserve more than is available.
+
+    :return: ``200`` on success with the updated reservation,\n
+             ``400`` if reservation ID was not found or malformed,\n
+             ``400`` if an immutable attribute was present or no attributes to update were provided,\n
+             ``400`` if the quantity was not positive or more than the available quantity,\n
+             ``400`` if the expiry was not in the future,\n
+             ``404`` if the reservation does not exist
+    """
+    form = common.FlaskPOSTForm(flask.request.form)
+    conn, cursor = common.get_db_connection()
+
+    reservation_id = form.get(models.Reservation.id_name)
+    try:
+        values = db.get_update_values(models.Reservation, _RESERVATION_IMMUTABLE_PROPS, form)
+    except HTTPException:
+        # Report a nonexistent reservation over an invalid update to it
+        db.abort_if_not_exists(cursor, models.Reservation, reservation_id)
+        raise
+    now = common.time_ms()
+    if values.get('quantity', 1) < 1:
+        flask.abort(400, 'quantity must be positive')
+    if values.get('expires_epoch_millis', now + 1) <= now:
+        flask.abort(400, 'expires_epoch_millis must be in the future')
+
+    # Available quantity of the reservation's item, excluding what the reservation holds itself if unexpired
+    available_sql = (
+        f'(SELECT {_AVAILABLE_QUANTITY_SQL} FROM {models.Item.table_name} '
+        f'WHERE {models.Item.table_name}.{models.Item.id_name}={models.Reservation.table_name}.{models.Item.id_name}) '
+        f'+ IIF(expires_epoch_millis > ?, quantity, 0)'
     )
+    assignments = ', '.join(f'{prop_name}=?' for prop_name in values)
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        res = cursor.execute(
+            f'UPDATE {models.Reservation.table_name} SET {assignments} '
+            f'WHERE {models.Reservation.id_name}=? AND {available_sql} >= COALESCE(?, quantity) RETURNING *',
+            (*values.values(), reservation_id, now, now, values.get('quantity')),
+        )
+        db_reservation = res.fetchone()
+        if db_reservation is None:
+            res = cursor.execute(
+                f'SELECT {available_sql}, quantity FROM {models.Reservation.table_name} '
+                f'WHERE {models.Reservation.id_name}=?',
+                (now, now, reservation_id),
+            )
+            available = res.fetchone()
+            if available is None:
+                flask.abort(404, 'Reservation does not exist')
+            desired_quantity = values.get('quantity', available[1])
+            flask.abort(400, f'Insufficient item quantity. Requested {desired_quantity}, had {available[0]}')
+        reservation = models.Reservation(*db_reservation)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    db.invalidate_cache(models.Reservation)
+    return reservation.to_response()
 
 
 @api_reservation_blueprint.route('/api/reservation/delete', methods=['POST'])
@@ -71,6 +178,18 @@ def api_reservation_delete():
     return db.delete(entity_type=models.Reservation)
 
 
+@api_reservation_blueprint.route('/api/reservations/get_many', methods=['GET'])
+def api_reservations_get_many():
+    """
+    Get many reservations by reservation ID at once, in the order requested. ::
+
+        GET /api/reservations/get_many?reservation_ids=<reservation_id>,<reservation_id>,...
+
+    :see also: :py:func:`db.get_many`
+    """
+    return db.get_many(entity_type=models.Reservation)
+
+
 @api_reservation_blueprint.route('/api/reservations/list', methods=['GET'])
 def api_reservations_list():
     # TODO documentation
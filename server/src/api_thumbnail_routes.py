@@ -54,7 +54,7 @@ def _get_thumbnail(item_id: str, form: Optional[common.FlaskPOSTForm] = None) ->
 def api_thumbnail_upload():
     # TODO documentation
     form = common.FlaskPOSTForm(flask.request.form)
-    conn, cursor = common.get_db_connection()
+    _, cursor = common.get_db_connection(readonly=True)
 
     if 'image' not in flask.request.files:
         flask.abort(400, 'No image sent')
@@ -95,7 +95,7 @@ def api_thumbnail_upload():
 def api_thumbnail_delete():
     # TODO documentation
     form = common.FlaskPOSTForm(flask.request.form)
-    conn, cursor = common.get_db_connection()
+    _, cursor = common.get_db_connection(readonly=True)
 
     item_id = form.get(models.Item.id_name)
     _verify_item_exists(cursor, item_id)
@@ -1,4 +1,5 @@
 import secrets
+import sqlite3
 
 import auth
 import common
@@ -28,19 +29,22 @@ firebase_admin.initialize_app(cred)
 
 def create_user(user_id: Identifier, name: str, authmask: int) -> models.User:
     conn, cursor = common.get_db_connection()
-    existing_user_res = cursor.execute(f'SELECT * FROM {models.User.table_name} WHERE name=?', (name,))
-    existing_users = existing_user_res.fetchall()
-
-    if len(existing_users) != 0:
-        flask.abort(400, 'A user already exists with that name')
-
     user = models.User(
         user_id=user_id,
         api_key=secrets.token_hex(),
         name=name,
         authmask=authmask,
     )
-    db.create_entity(conn, cursor, user)
+    # User names are unique, so a user with the same name is only found by failing to insert
+    try:
+        db.create_entity(conn, cursor, user)
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        # Only names are reported, API keys are secret
+        db.abort_if_unique_violated(
+            e, models.User, {'name': name}, messages={'name': 'A user already exists with that name'},
+        )
+        raise
     return user
 
 
@@ -75,7 +79,7 @@ def api_user_create():
     user = create_user(
         Identifier(length=models.User.id_length),
         form.get('name'),
-        form.get('authmask'),
+        form.get('authmask', int),
     )
     return user.to_response()
 
@@ -99,3 +103,62 @@ def api_user_update():
 def api_user_delete():
     # TODO documentation
     return db.delete(entity_type=models.User)
+
+
+@api_user_blueprint.route('/api/user/<user_id>/reservations', methods=['POST'])
+@auth.route_requires_auth(auth.Scope.USER_GET)
+def api_user_reservations_list(user_id):
+    """
+    List the reservations of a single user, identified by user ID, with optional ordering. ::
+
+        POST /api/user/<user_id>/reservations?<parameters> [<api_key>]
+
+    Takes the same (all optional) ``sortby``, ``direction``, ``limit``, ``offset``, ``cursor`` and ``where``
+    parameters as :py:func:`api_reservation_routes.api_reservations_list` (see :py:func:`db.list_`).
+    Reservations are looked up by the index on their user ID, so listing a user's reservations
+    does not depend on the number of reservations. Expired reservations are listed until they are swept
+    (see :py:func:`db.sweep_expired_reservations`).
+
+    Requires authentication scope :py:attr:`auth.Scope.USER_GET`
+
+    :return: ``200`` on success with a list of :py:class:`models.Reservation` s,\n
+             ``400`` if API key was not present or malformed,\n
+             ``400`` if user ID was malformed,\n
+             ``400`` if any listing parameter was malformed or invalid (see :py:func:`db.list_`),\n
+             ``401`` if API key was invalid,\n
+             ``403`` if user does not have required scope,\n
+             ``404`` if user was not found
+    """
+    return db.list_(entity_type=models.Reservation, filters=(db.get_related_filter(models.User, user_id),))
+
+
+@api_user_blueprint.route('/api/user/<user_id>/reservations/quantity', methods=['POST'])
+@auth.route_requires_auth(auth.Scope.USER_GET)
+def api_user_reservations_quantity(user_id):
+    """
+    Sum the quantity of all unexpired reservations of a single user, identified by user ID.
+    Expired reservations no longer hold any quantity, even before they are swept. ::
+
+        POST /api/user/<user_id>/reservations/quantity [<api_key>]
+
+    The sum is read from the index covering the expiry and quantity of each user's reservations,
+    and embedded within the standard response body as ::
+
+        { 'quantity': reserved_quantity (int) }
+
+    Requires authentication scope :py:attr:`auth.Scope.USER_GET`
+
+    :return: ``200`` on success with the user's reserved quantity (see formatting above),\n
+             ``400`` if API key was not present or malformed,\n
+             ``400`` if user ID was malformed,\n
+             ``400`` if any ``where`` filter was malformed or invalid,\n
+             ``401`` if API key was invalid,\n
+             ``403`` if user does not have required scope,\n
+             ``404`` if user was not found
+    """
+    return db.sum_(
+        entity_type=models.Reservation, column='quantity', filters=(
+            db.get_related_filter(models.User, user_id),
+            db.Filter('expires_epoch_millis', 'gt', common.time_ms()),
+        ),
+    )
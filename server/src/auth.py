@@ -2,7 +2,14 @@
 Manages authentication for Flask routes and application contexts.
 """
 import enum
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
+from typing import Dict
+from typing import NamedTuple
+from typing import Optional
+from typing import Tuple
 
 import common
 import flask
@@ -10,6 +17,8 @@ import models
 
 
 API_KEY_NAME = 'api_key'
+PRINCIPAL_CACHE_MAX_SIZE = 1024                  #: Maximum number of principals cached at once.
+PRINCIPAL_CACHE_TTL_SEC = 60                     #: Maximum time a principal is cached for.
 
 
 class Scope(enum.IntFlag):
@@ -52,6 +61,68 @@ class Scope(enum.IntFlag):
     THUMBNAIL_DELETE = enum.auto()
 
 
+class Principal(NamedTuple):
+    """The user authenticated by an API key, with the scopes they may access."""
+    user_id: str
+    authmask: int
+
+
+class PrincipalCache:
+    """
+    Bounded, thread-safe LRU cache of API keys to their :py:class:`Principal`,
+    so authenticated routes do not query the users table on every request.
+
+    Entries expire after `ttl_sec`, and the least recently used entry is evicted
+    once more than `max_size` entries are cached. All entries are also invalidated
+    by any write to the users table (see :py:func:`models.bump_generation`), so an
+    updated or deleted user never keeps their previous scopes. Like all caches, this
+    requires the server to run as a single process (see :doc:`database`).
+    """
+
+    def __init__(self, max_size: int = PRINCIPAL_CACHE_MAX_SIZE, ttl_sec: int = PRINCIPAL_CACHE_TTL_SEC):
+        self.max_size = max_size
+        self.ttl_sec = ttl_sec
+        self._map: Dict[str, Tuple[Principal, int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, api_key: str, principal: Principal, generation: int) -> None:
+        """
+        Add a principal to the cache. `generation` must be the generation of
+        :py:class:`models.User` from *before* the principal was read from the database.
+        """
+        with self._lock:
+            self._map[api_key] = (principal, generation, time.monotonic() + self.ttl_sec)
+            self._map.move_to_end(api_key)
+            while len(self._map) > self.max_size:
+                self._map.popitem(last=False)
+
+    def get(self, api_key: str) -> Optional[Principal]:
+        """
+        Get the principal authenticated by an API key if it is cached, has not expired,
+        and no user has been written to since it was read from the database.
+
+        :return: the cached principal if it exists and is valid, else ``None``
+        """
+        with self._lock:
+            entry = self._map.get(api_key)
+            if entry is None:
+                return None
+            principal, generation, expiry_time = entry
+            if generation != models.get_generation(models.User) or expiry_time <= time.monotonic():
+                self._map.pop(api_key)
+                return None
+            self._map.move_to_end(api_key)
+            return principal
+
+    def clear(self) -> None:
+        """Clear all entries from this cache instance."""
+        with self._lock:
+            self._map.clear()
+
+
+_principal_cache = PrincipalCache()
+
+
 def route_requires_auth(scope):
     """
     Function decorator for Flask routes which requires authentication
@@ -68,11 +139,11 @@ def route_requires_auth(scope):
     """
     def for_route(route):
         @wraps(route)
-        def execute():
+        def execute(*args, **kwargs):
             if API_KEY_NAME not in flask.request.form:
                 flask.abort(400, 'API key was not present')
             require_auth(scope, flask.request.form.get(API_KEY_NAME))
-            return route()
+            return route(*args, **kwargs)
         execute.__name__ = route.__name__
         execute.__doc__ = route.__doc__
         return execute
@@ -99,19 +170,44 @@ def require_auth(req_authmask: Scope, api_key: str) -> None:
     if isinstance(req_authmask, Scope):
         req_authmask = req_authmask.value
 
-    if common.is_dirty(api_key):
-        flask.abort(400, 'API key was malformed')
+    principal = get_principal(api_key)
+    if (req_authmask & principal.authmask) != req_authmask:
+        flask.abort(403, 'User was not authorized to access this resource')
 
-    conn, cursor = common.get_db_connection()
 
-    res = cursor.execute(f'SELECT authmask FROM {models.User.table_name} WHERE {API_KEY_NAME}=?', (api_key,))
-    db_authmask = res.fetchone()
+def get_principal(api_key: str) -> Principal:
+    """
+    Get the user authenticated by an API key in the current context.
+
+    The principal is resolved at most once per request (it is stored on :py:data:`flask.g`),
+    and is otherwise served from an in-process cache where possible (see :py:class:`PrincipalCache`).
+
+    :return: the :py:class:`Principal` authenticated by the API key,\n
+             ``400`` if API key was malformed,\n
+             ``401`` if API key was invalid,\n
+             ``500`` if any other error while authenticating
+    """
+    if common.is_dirty(api_key):
+        flask.abort(400, 'API key was malformed')
 
-    if db_authmask is None or len(db_authmask) != 1:
-        flask.abort(401, 'User was not found')
-    try:
-        authmask = int(db_authmask[0])
-        if (req_authmask & authmask) != req_authmask:
-            flask.abort(403, 'User was not authorized to access this resource')
-    except ValueError:
-        flask.abort(500, 'Error while determining user permissions')
+    generation = models.get_generation(models.User)
+    request_api_key, principal, request_generation = getattr(flask.g, '_principal', (None, None, None))
+    if request_api_key != api_key or request_generation != generation:
+        principal = _principal_cache.get(api_key)
+    if principal is None:
+        _, cursor = common.get_db_connection(readonly=True)
+        res = cursor.execute(
+            f'SELECT {models.User.id_name}, authmask FROM {models.User.table_name} WHERE {API_KEY_NAME}=?', (api_key,),
+        )
+        db_principal = res.fetchone()
+
+        if db_principal is None or len(db_principal) != 2:
+            flask.abort(401, 'User was not found')
+        try:
+            principal = Principal(user_id=db_principal[0], authmask=int(db_principal[1]))
+        except ValueError:
+            flask.abort(500, 'Error while determining user permissions')
+        _principal_cache.add(api_key, principal, generation)
+
+    flask.g._principal = (api_key, principal, generation)
+    return principal
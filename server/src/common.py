@@ -1,31 +1,95 @@
 """
 Common tools and utilities, mainly for API routes.
 """
+import csv
+import io
+import json
 import os
 import re
 import sqlite3
+import threading
 import time
 import typing
+import urllib.request
 from sqlite3.dbapi2 import Connection
 from sqlite3.dbapi2 import Cursor
 from typing import Any
 from typing import Dict
 from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Set
 from typing import Tuple
 from typing import Union
 
 import flask
 from identifier import Identifier
+from werkzeug.exceptions import HTTPException
 
 
 DATABASE_PATH = os.path.abspath('inventory.db')
+DATABASE_PROFILE_KEY = 'DATABASE_PROFILE'        #: Environment (``.env``) key selecting the database profile.
+DEFAULT_DATABASE_PROFILE = 'wal'                 #: Database profile used if none is selected.
+DATABASE_CONNECTION_MAX_AGE_SEC = 600            #: Time after which pooled connections are reopened.
 RET_ENTITIES_DEF_LIMIT = 100                     #: Default number of returned entities.
 RET_ENTITIES_MAX_LIMIT = 1000                    #: Maximum number of returned entities.
+BULK_MAX_ROWS = 10000                            #: Maximum number of rows in a single bulk request.
+GET_MANY_MAX_IDS = 500                           #: Maximum number of entities retrieved by ID at once.
+FUZZY_IGNORED_CHARS = '-_./ '                    #: Characters ignored when fuzzy matching values.
+FUZZY_MAX_CANDIDATES = 200                       #: Maximum number of candidates ranked by fuzzy searches.
+FUZZY_MIN_SIMILARITY = 0.3                       #: Minimum trigram similarity of fuzzy search results.
+RESERVATION_TTL_MILLIS = 7 * 24 * 60 * 60 * 1000  #: Default time after which reservations expire.
+SWEEP_INTERVAL_SEC = 60                          #: Time between sweeps of expired reservations.
+SWEEP_BATCH_SIZE = 500                           #: Maximum number of expired reservations deleted at once.
+RESERVATION_SWEEPER_KEY = 'RESERVATION_SWEEPER'  #: Environment (``.env``) key, ``off`` disables the sweeper.
 
 Response = Dict[str, Any]
 T = Union[str, int, Identifier]
 
 
+class DatabaseProfile(NamedTuple):
+    """
+    SQLite settings applied to every connection to the backing database when it is opened.
+
+    :see also: https://www.sqlite.org/pragma.html for the meaning of each setting.
+    """
+    journal_mode: str       #: ``PRAGMA journal_mode``, e.g. ``DELETE`` (rollback journal) or ``WAL``.
+    synchronous: str        #: ``PRAGMA synchronous``, e.g. ``FULL`` or ``NORMAL``.
+    cache_size: int         #: ``PRAGMA cache_size``, in pages if positive or in KiB if negative.
+    mmap_size: int          #: ``PRAGMA mmap_size``, in bytes. ``0`` disables memory-mapped I/O.
+    temp_store: str         #: ``PRAGMA temp_store``, e.g. ``DEFAULT`` (file) or ``MEMORY``.
+    busy_timeout_ms: int    #: Time to wait for a lock held by another connection before failing.
+    cached_statements: int  #: Number of prepared statements cached per connection.
+
+
+#: Named database profiles, selectable with the :py:data:`DATABASE_PROFILE_KEY` environment (``.env``) key.
+#:
+#: * ``compat``: the SQLite defaults. Readers and writers block each other.
+#: * ``wal``: write-ahead logging, so readers never block writers and vice versa, with commits
+#:   only synced at checkpoints, a 64 MiB page cache, 256 MiB of memory-mapped I/O and in-memory
+#:   temporary tables. Committed transactions may roll back on power loss (but not on crashes).
+DATABASE_PROFILES = {
+    'compat': DatabaseProfile(
+        journal_mode='DELETE',
+        synchronous='FULL',
+        cache_size=-2000,
+        mmap_size=0,
+        temp_store='DEFAULT',
+        busy_timeout_ms=5000,
+        cached_statements=128,
+    ),
+    'wal': DatabaseProfile(
+        journal_mode='WAL',
+        synchronous='NORMAL',
+        cache_size=-64 * 1024,
+        mmap_size=256 * 1024 * 1024,
+        temp_store='MEMORY',
+        busy_timeout_ms=5000,
+        cached_statements=256,
+    ),
+}
+
+
 class FlaskPOSTForm:
     """
     Wraps around any key-value map for safety checking.
@@ -65,15 +129,226 @@ class FlaskPOSTForm:
         return value
 
 
-def get_db_connection() -> Tuple[Connection, Cursor]:
-    """Get a connection to the backing SQL database. May be cached/already open."""
-    conn = getattr(flask.g, '_database', None)
+class ConnectionPool:
+    """
+    Pool of long-lived connections to the backing database, holding one connection per thread.
+
+    Connections are checked out with :py:func:`acquire` and checked back in with :py:func:`release`.
+    A thread always gets back the same connection, so its page cache and prepared statements stay warm
+    across requests. On checkout, connections which fail a health check or are older than `max_age_sec`
+    are closed and replaced. On checkin, any transaction left open is rolled back.
+
+    Connections of threads which have exited are closed when the next connection is opened.
+
+    If `readonly`, connections are opened read-only (see :py:func:`connect`).
+    """
+
+    def __init__(
+        self, path: str = DATABASE_PATH, max_age_sec: float = DATABASE_CONNECTION_MAX_AGE_SEC, readonly: bool = False,
+    ):
+        self.path = path
+        self.max_age_sec = max_age_sec
+        self.readonly = readonly
+        self._connections: Dict[threading.Thread, Tuple[Connection, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Connection:
+        """Check out the connection of the current thread, opening a new connection if required."""
+        thread = threading.current_thread()
+        with self._lock:
+            entry = self._connections.get(thread)
+        if entry is not None:
+            conn, expiry_time = entry
+            if expiry_time > time.monotonic() and is_healthy(conn):
+                return conn
+            with self._lock:
+                self._connections.pop(thread, None)
+            conn.close()
+
+        # Connections are only ever used by the thread they belong to,
+        # but may be closed by any thread (see close_all and _close_exited)
+        conn = connect(self.path, check_same_thread=False, readonly=self.readonly)
+        with self._lock:
+            self._close_exited()
+            self._connections[thread] = (conn, time.monotonic() + self.max_age_sec)
+        return conn
+
+    def release(self, conn: Connection) -> None:
+        """Check in a connection previously checked out with :py:func:`acquire`."""
+        if conn.in_transaction:
+            conn.rollback()
+
+    def close_all(self) -> None:
+        """Close all connections in the pool. Connections must not be checked out."""
+        with self._lock:
+            for conn, _ in self._connections.values():
+                conn.close()
+            self._connections.clear()
+
+    def _close_exited(self) -> None:
+        for thread in [thread for thread in self._connections if not thread.is_alive()]:
+            conn, _ = self._connections.pop(thread)
+            conn.close()
+
+
+class SerializedConnection:
+    """
+    Single long-lived connection to the backing database, used by at most one thread at a time.
+
+    The connection is checked out with :py:func:`acquire`, which waits for any other thread
+    to check it back in with :py:func:`release`. Funnelling all writes through one connection
+    serializes them in-process, so writers queue up in order instead of contending for the
+    database's write lock. Checkouts may be nested within the same thread.
+
+    Like :py:class:`ConnectionPool`, the connection is health checked and recycled after
+    `max_age_sec` on checkout, and any transaction left open is rolled back on checkin.
+    """
+
+    def __init__(self, path: str = DATABASE_PATH, max_age_sec: float = DATABASE_CONNECTION_MAX_AGE_SEC):
+        self.path = path
+        self.max_age_sec = max_age_sec
+        self._conn: Optional[Connection] = None
+        self._expiry_time = 0.0
+        self._lock = threading.RLock()
+
+    def acquire(self, timeout: float = -1) -> Connection:
+        """
+        Check out the connection, waiting up to `timeout` seconds (forever by default) for it to be free.
+
+        :raise TimeoutError: if the connection was not checked in by another thread within `timeout`
+        """
+        if not self._lock.acquire(timeout=timeout):
+            raise TimeoutError('Timed out waiting for the database writer')
+        try:
+            if self._conn is not None and (self._expiry_time <= time.monotonic() or not is_healthy(self._conn)):
+                self._conn.close()
+                self._conn = None
+            if self._conn is None:
+                self._conn = connect(self.path, check_same_thread=False)
+                self._expiry_time = time.monotonic() + self.max_age_sec
+        except BaseException:
+            self._lock.release()
+            raise
+        return self._conn
+
+    def release(self, conn: Connection) -> None:
+        """Check in the connection previously checked out with :py:func:`acquire` by the current thread."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        finally:
+            self._lock.release()
+
+    def close(self) -> None:
+        """Close the connection. It must not be checked out by another thread."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_reader_pool = ConnectionPool(readonly=True)
+_writer = SerializedConnection()
+
+
+def get_db_connection(readonly: bool = False) -> Tuple[Connection, Cursor]:
+    """
+    Get a connection to the backing SQL database. May be cached/already open.
+
+    Connections are checked out once per application context, and checked back in by
+    :py:func:`release_db_connection`:
+
+        * If `readonly`, the current thread's read-only connection is checked out of a pool
+          (see :py:class:`ConnectionPool`). Read-only connections never take the write lock,
+          so with the ``wal`` database profile reads never wait on writes. Intended for
+          idempotent routes.
+        * Otherwise, the single writer connection is checked out (see :py:class:`SerializedConnection`)
+          and held until the application context ends, so requests which write run one at a time.
+
+    :return: the connection and a new cursor on success,\n
+             ``503`` if the writer connection was not free within the busy timeout
+    """
+    key = '_database_readonly' if readonly else '_database'
+    conn = getattr(flask.g, key, None)
     if conn is None:
-        conn = flask.g._database = sqlite3.connect(DATABASE_PATH)
+        if readonly:
+            conn = _reader_pool.acquire()
+        else:
+            try:
+                conn = _writer.acquire(timeout=get_db_profile().busy_timeout_ms / 1000)
+            except TimeoutError:
+                if flask.has_request_context():
+                    flask.abort(503, 'Database is busy')
+                raise
+        setattr(flask.g, key, conn)
     cursor = conn.cursor()
     return conn, cursor
 
 
+def release_db_connection() -> None:
+    """Check the connections of the current application context back in, if previously checked out."""
+    conn = flask.g.pop('_database_readonly', None)
+    if conn is not None:
+        _reader_pool.release(conn)
+    conn = flask.g.pop('_database', None)
+    if conn is not None:
+        _writer.release(conn)
+
+
+def is_healthy(conn: Connection) -> bool:
+    """Check if a connection to the backing database is open and usable."""
+    try:
+        conn.execute('SELECT 1').fetchone()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def get_db_profile() -> DatabaseProfile:
+    """
+    Get the database profile selected by the :py:data:`DATABASE_PROFILE_KEY` environment (``.env``) key,
+    or the :py:data:`DEFAULT_DATABASE_PROFILE` if none is selected.
+
+    :raise ValueError: if the selected profile does not exist
+    """
+    profile_name = os.environ.get(DATABASE_PROFILE_KEY, DEFAULT_DATABASE_PROFILE)
+    if profile_name not in DATABASE_PROFILES:
+        raise ValueError(f'Database profile {profile_name} does not exist, expected one of {set(DATABASE_PROFILES)}')
+    return DATABASE_PROFILES[profile_name]
+
+
+def connect(
+    path: str = DATABASE_PATH, profile: Optional[DatabaseProfile] = None, check_same_thread: bool = True,
+    readonly: bool = False,
+) -> Connection:
+    """
+    Open a new connection to the database at `path` with the settings of a database profile
+    (the selected profile by default, see :py:func:`get_db_profile`).
+
+    If `readonly`, the database is opened in read-only mode (``mode=ro``) and ``query_only``
+    is set, so the connection can never write or take the write lock. The database must
+    already exist, and its journal mode is left as set by read-write connections.
+
+    Most routes should use :py:func:`get_db_connection` instead.
+    """
+    if profile is None:
+        profile = get_db_profile()
+    database = f'file:{urllib.request.pathname2url(path)}?mode=ro' if readonly else path
+    conn = sqlite3.connect(
+        database, timeout=profile.busy_timeout_ms / 1000, cached_statements=profile.cached_statements,
+        check_same_thread=check_same_thread, uri=readonly,
+    )
+    if readonly:
+        conn.execute('PRAGMA query_only = 1')
+    else:
+        conn.execute(f'PRAGMA journal_mode = {profile.journal_mode}')
+    conn.execute(f'PRAGMA synchronous = {profile.synchronous}')
+    conn.execute(f'PRAGMA cache_size = {profile.cache_size}')
+    conn.execute(f'PRAGMA mmap_size = {profile.mmap_size}')
+    conn.execute(f'PRAGMA temp_store = {profile.temp_store}')
+    return conn
+
+
 def is_dirty(value: str) -> bool:
     """
     Check if the passed string contains dangerous characters.
@@ -98,6 +373,20 @@ def is_dirty(value: str) -> bool:
     return len(re.findall(r'[^\w\d\s\\\-\=\_\/\.\,]', value)) != 0
 
 
+def normalize_fuzzy(value: str) -> str:
+    """
+    Normalize a value for fuzzy matching, so values which are typically written
+    in several ways (e.g. part numbers) compare equal: all :py:data:`FUZZY_IGNORED_CHARS`
+    are removed and letters are uppercased, e.g. ``grm188r71h-104ka93.d`` becomes ``GRM188R71H104KA93D``.
+    """
+    return value.translate({ord(char): None for char in FUZZY_IGNORED_CHARS}).upper()
+
+
+def get_trigrams(value: str) -> Set[str]:
+    """Get the set of all substrings of length 3 (trigrams) of a value."""
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
 def time_ms() -> int:
     """Get the current time in milliseconds (floor'd from nanosecond-precision)."""
     return int(time.time_ns() * 1e-6)
@@ -125,3 +414,88 @@ def create_response(code: int, body: Union[List[dict], dict]) -> Dict[str, Any]:
         'code': code,
         'body': body,
     }
+
+
+def create_outcome(code: int, body: Union[List[dict], dict], **keys) -> Dict[str, Any]:
+    """
+    Create the outcome of a single row of a bulk request, which responds with
+    a standard response (see :py:func:`create_response`) whose body is a list of outcomes: ::
+
+        {
+            'code': <number>,
+            <zero or more keys identifying the row, e.g. 'row': <number>>
+            'body': [
+                <zero or more of models.Model, or a single error>
+                ...
+            ]
+        }
+
+    The code and body of each outcome follow the same format as a standard response,
+    so errors of a single row are formatted as if that row was sent in its own request.
+    """
+    if not isinstance(body, list):
+        body = [body]
+    return {
+        'code': code,
+        **keys,
+        'body': body,
+    }
+
+
+def create_error_outcome(e: HTTPException, **keys) -> Dict[str, Any]:
+    """Create the outcome of a single row of a bulk request which failed with an HTTP error."""
+    return create_outcome(e.code, {'name': e.name, 'description': e.description}, **keys)
+
+
+def get_request_rows(key: str) -> List[Dict[str, str]]:
+    """
+    Get the rows of a bulk request, sent in the POST data as `key` either:
+
+        - As a form field containing a JSON array of objects, or
+        - As a file upload containing a UTF-8 CSV file with a header row.
+
+    Rows map attribute names to string values, and are intended to be wrapped in a
+    :py:class:`FlaskPOSTForm` so each row is validated as if sent in its own request.
+    JSON numbers are converted to strings, and JSON ``null`` values are treated as missing attributes.
+    Responds with a ``400`` error if:
+
+        - The key was not found in the request
+        - The JSON or CSV was malformed
+        - Any JSON value was an array or an object
+        - There were no rows, or more than :py:data:`BULK_MAX_ROWS` rows
+    """
+    if key in flask.request.files:
+        try:
+            text = flask.request.files[key].read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            flask.abort(400, f'{key} was not UTF-8 encoded')
+        try:
+            rows = [
+                {k: v for k, v in row.items() if k is not None and v is not None}
+                for row in csv.DictReader(io.StringIO(text, newline=''))
+            ]
+        except csv.Error:
+            flask.abort(400, f'{key} was malformed')
+    elif key in flask.request.form:
+        try:
+            rows = json.loads(flask.request.form[key])
+        except ValueError:
+            flask.abort(400, f'{key} was malformed')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            flask.abort(400, f'{key} was not a list of objects')
+        for row_idx, row in enumerate(rows):
+            for k, v in row.items():
+                if isinstance(v, (list, dict)):
+                    flask.abort(400, f'{key} row {row_idx} {k} was not a string or number')
+        # Null values are treated as missing attributes
+        rows = [
+            {k: v if isinstance(v, str) else json.dumps(v) for k, v in row.items() if v is not None} for row in rows
+        ]
+    else:
+        flask.abort(400, f'{key} was not found in request')
+
+    if len(rows) == 0:
+        flask.abort(400, f'{key} was empty')
+    if len(rows) > BULK_MAX_ROWS:
+        flask.abort(400, f'{key} had more than {BULK_MAX_ROWS} rows')
+    return rows
@@ -7,17 +7,27 @@ DB-interfacing functions are parameterized to each :py:class:`models.Model`
 For exceptions, `flask.abort` is called directly instead of returning
 an errant :py:data:`common.Response`.
 """
+import base64
+import json
+import sqlite3
 from sqlite3.dbapi2 import Connection
 from sqlite3.dbapi2 import Cursor
+from typing import Any
+from typing import Dict
 from typing import List
+from typing import NamedTuple
 from typing import Optional
+from typing import Tuple
 from typing import Type
 
 import auth
 import common
 import flask
+import migrations
 import models
 from common import Response
+from werkzeug.exceptions import HTTPException
+from werkzeug.exceptions import NotFound
 
 
 def get(entity_type: Type[models.Model], id_: Optional[str] = None) -> Response:
@@ -43,7 +53,7 @@ def get(entity_type: Type[models.Model], id_: Optional[str] = None) -> Response:
     if common.is_dirty(id_):
         flask.abort(400, f'{entity_type.id_name} was malformed')
 
-    conn, cursor = common.get_db_connection()
+    conn, cursor = common.get_db_connection(readonly=True)
     res = cursor.execute(
         f'SELECT * FROM {entity_type.table_name} WHERE {entity_type.id_name}=?', (id_,),
     )
@@ -54,23 +64,124 @@ def get(entity_type: Type[models.Model], id_: Optional[str] = None) -> Response:
     return entity.to_response()
 
 
+def get_many(entity_type: Type[models.Model]) -> Response:
+    """
+    Get many entities from the database by their type (`entity_type`) and the comma-separated
+    identifiers in the ``<id_name>s`` key of :py:func:`flask.Request.args` (see :py:func:`get_request_ids`),
+    with a single ``SELECT ... WHERE <id_name> IN (...)`` query.
+
+    The response body contains the outcome of every entity, in the order they were requested
+    (see :py:func:`common.create_outcome`), so entities which were not found are reported
+    as ``404`` outcomes instead of failing the whole request.
+
+    :param entity_type: the type of the entities to get (:py:class:`models.Model` subclass)
+    :return: ``200`` on success with the outcome of every entity,\n
+             ``400`` if the identifiers were not found or malformed,\n
+             ``400`` if there were more than :py:data:`common.GET_MANY_MAX_IDS` identifiers
+    """
+    form = common.FlaskPOSTForm(flask.request.args)
+    ids = get_request_ids(entity_type, form, max_ids=common.GET_MANY_MAX_IDS)
+
+    _, cursor = common.get_db_connection(readonly=True)
+    res = cursor.execute(
+        f'SELECT * FROM {entity_type.table_name} WHERE {entity_type.id_name} IN ({", ".join("?" for _ in ids)})',
+        ids,
+    )
+    return common.create_response(200, _get_id_outcomes(entity_type, ids, res.fetchall()))
+
+
+def get_by_column(entity_type: Type[models.Model], columns: Tuple[str, ...]) -> Response:
+    """
+    Get all entities of a single type (`entity_type`) whose value of a column equals a value,
+    where exactly one of `columns` is a key of :py:func:`flask.Request.args` holding the value.
+
+    Lookups are exact (case-sensitive) and intended for indexed columns
+    (see :py:attr:`models.Model.indexed_columns`), so they take a single index lookup.
+    At most :py:data:`common.RET_ENTITIES_MAX_LIMIT` entities are returned, ordered by identifier.
+
+    :param entity_type: the type of the entities to get (:py:class:`models.Model` subclass)
+    :param columns: names of the columns which may be looked up
+    :return: ``200`` on success with a list of matching :py:class:`models.Model` s,\n
+             ``400`` if none or more than one of `columns` were present,\n
+             ``400`` if the value was malformed
+    """
+    form = common.FlaskPOSTForm(flask.request.args)
+    present_columns = [column for column in columns if column in flask.request.args]
+    if len(present_columns) != 1:
+        flask.abort(400, f'Expected exactly one of {", ".join(columns)} in request')
+    column = present_columns[0]
+    value = form.get(column)
+
+    _, cursor = common.get_db_connection(readonly=True)
+    res = cursor.execute(
+        f'SELECT * FROM {entity_type.table_name} WHERE {column}=? ORDER BY {entity_type.id_name} LIMIT ?',
+        (value, common.RET_ENTITIES_MAX_LIMIT),
+    )
+    return common.create_response(200, [entity_type(*db_entity).to_dict() for db_entity in res.fetchall()])
+
+
 def update(entity_type: Type[models.Model], immutable_props: List[str]) -> Response:
-    # TODO documentation
+    """
+    Update one or more attributes of a single entity, identified by the ID in the POST data.
+
+    All attributes in the POST data are set with a single ``UPDATE ... RETURNING`` statement,
+    which also returns the updated entity, so an update takes one round trip to the database.
+
+    :param entity_type: the type of the entity to update (:py:class:`models.Model` subclass)
+    :param immutable_props: names of attributes which cannot be updated
+    :return: ``200`` on success with the updated :py:class:`models.Model`,\n
+             ``400`` if ID was not found or malformed,\n
+             ``400`` if an immutable attribute was present,\n
+             ``400`` if no attributes to update were provided,\n
+             ``400`` if any attribute was malformed,\n
+             ``400`` if another entity already has the value of a unique attribute,\n
+             ``404`` if the entity was not found
+    """
     form = common.FlaskPOSTForm(flask.request.form)
     conn, cursor = common.get_db_connection()
 
-    # Check that entity exists in DB before modifying
     id_ = form.get(entity_type.id_name)
-    res = cursor.execute(
-        f'SELECT 1 FROM {entity_type.table_name} WHERE {entity_type.id_name}=? LIMIT 1', (id_,),
-    )
-    db_entity = res.fetchone()
-    if db_entity is None or len(db_entity) == 0 or db_entity == 0:
+    try:
+        values = get_update_values(entity_type, immutable_props, form)
+    except HTTPException:
+        # Report a nonexistent entity over an invalid update to it
+        abort_if_not_exists(cursor, entity_type, id_)
+        raise
+
+    assignments = ', '.join(f'{prop_name}=?' for prop_name in values)
+    try:
+        res = cursor.execute(
+            f'UPDATE {entity_type.table_name} SET {assignments} WHERE {entity_type.id_name}=? RETURNING *',
+            (*values.values(), id_),
+        )
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        abort_if_unique_violated(e, entity_type, values)
+        raise
+    db_updated_entities = res.fetchall()
+    conn.commit()
+    if len(db_updated_entities) == 0:
         flask.abort(404, f'{entity_type.__name__} does not exist')
+    invalidate_cache(entity_type)
+    updated_entity = entity_type(*db_updated_entities[0])
+    return updated_entity.to_response()
+
 
+def get_update_values(
+    entity_type: Type[models.Model], immutable_props: List[str], form: common.FlaskPOSTForm,
+) -> Dict[str, Any]:
+    """
+    Get the new value of every attribute of an entity to be updated, keyed by attribute name.
+
+    :return: the attributes present in `form`, converted to their type,\n
+             ``400`` if an immutable attribute was present,\n
+             ``400`` if no attributes to update were provided,\n
+             ``400`` if any attribute was malformed
+    """
     entity_properties = models.get_model_attributes(entity_type)
     for immutable_prop_name in immutable_props:
-        if immutable_prop_name in form.form and immutable_prop_name != entity_type.id_name:
+        # The ID identifies the entity to update and the API key authenticates the request
+        if immutable_prop_name in form.form and immutable_prop_name not in (entity_type.id_name, auth.API_KEY_NAME):
             flask.abort(400, f'Immutable property {immutable_prop_name} found in request body')
         entity_properties.pop(immutable_prop_name)
 
@@ -79,22 +190,35 @@ def update(entity_type: Type[models.Model], immutable_props: List[str]) -> Respo
     }
     if len(properties_to_update) <= 0:
         flask.abort(400, 'No attributes to be updated were provided')
+    return {prop_name: form.get(prop_name, prop_type) for prop_name, prop_type in properties_to_update.items()}
 
-    for prop_name, prop_type in properties_to_update.items():
-        query_params = (form.get(prop_name, prop_type), id_)
-        cursor.execute(
-            f'UPDATE {entity_type.table_name} SET {prop_name}=? WHERE {entity_type.id_name}=?', query_params,
-        )
-    conn.commit()
 
-    updated_res = cursor.execute(
-        f'SELECT * FROM {entity_type.table_name} WHERE {entity_type.id_name}=?', (id_,),
+def abort_if_not_exists(cursor: Cursor, entity_type: Type[models.Model], id_: str) -> None:
+    """Respond with a ``404`` error if no entity of a type exists with an ID."""
+    res = cursor.execute(
+        f'SELECT 1 FROM {entity_type.table_name} WHERE {entity_type.id_name}=? LIMIT 1', (id_,),
     )
-    db_updated_entity = updated_res.fetchone()
-    if db_updated_entity is None or len(db_updated_entity) == 0:
-        flask.abort(404, f'{entity_type.__class__.__name__} did not exist after updating')
-    updated_entity = entity_type(*db_updated_entity)
-    return updated_entity.to_response()
+    if res.fetchone() is None:
+        flask.abort(404, f'{entity_type.__name__} does not exist')
+
+
+def abort_if_unique_violated(
+    e: sqlite3.IntegrityError, entity_type: Type[models.Model], values: Dict[str, Any],
+    messages: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    Respond with a ``400`` error if a write of attribute `values` to an entity of a type (`entity_type`)
+    failed its integrity check (`e`) because another entity already has the value of one of the
+    entity type's unique columns (:py:attr:`models.Model.unique_columns`). Returns for any other failure,
+    or if the violated column is not in `values`.
+
+    :param messages: error descriptions replacing the default one, keyed by column name
+    """
+    prefix = f'UNIQUE constraint failed: {entity_type.table_name}.'
+    column = str(e)[len(prefix):] if str(e).startswith(prefix) else None
+    if column in entity_type.unique_columns and column in values:
+        default_message = f'{entity_type.__name__} with {column} {values[column]} already exists'
+        flask.abort(400, (messages or {}).get(column, default_message))
 
 
 def delete(entity_type: Type[models.Model]) -> Response:
@@ -119,18 +243,333 @@ def delete(entity_type: Type[models.Model]) -> Response:
         f'DELETE FROM {entity_type.table_name} WHERE {entity_type.id_name}=?', (id_,),
     )
     conn.commit()
+    invalidate_cache(entity_type)
 
     deleted_entity = entity_type(*db_entity)
     return deleted_entity.to_response()
 
 
-_list_cache = models.EntityCache()
+def update_many(entity_type: Type[models.Model], immutable_props: List[str]) -> Response:
+    """
+    Update one or more attributes of many entities within a single transaction.
 
+    The entities and their updates are read from the POST data, either as:
 
-def list_(entity_type: Type[models.Model]) -> Response:
-    # TODO documentation
+        - ``patches``, rows (see :py:func:`common.get_request_rows`) each holding the ID
+          of one entity and the attributes to update on it, or
+        - ``<id_name>s``, comma-separated IDs (see :py:func:`get_request_ids`) of entities which
+          are all updated with the same attributes, present in the POST data as in :py:func:`update`.
+
+    The same rules as :py:func:`update` apply to every entity. Shared updates are applied
+    with a single ``UPDATE ... WHERE <id_name> IN (...) RETURNING`` statement. The response
+    body contains the outcome of every entity, in order (see :py:func:`common.create_outcome`).
+
+    :param entity_type: the type of the entities to update (:py:class:`models.Model` subclass)
+    :param immutable_props: names of attributes which cannot be updated
+    :return: ``200`` on success with the outcome of every entity,\n
+             ``400`` if neither ``patches`` nor IDs were found, or either was malformed,\n
+             ``400`` if a shared update was invalid (see :py:func:`update`)
+    """
+    form = common.FlaskPOSTForm(flask.request.form)
+    conn, cursor = common.get_db_connection()
+
+    outcomes = []
+    if 'patches' in flask.request.form or 'patches' in flask.request.files:
+        for row in common.get_request_rows('patches'):
+            row_form = common.FlaskPOSTForm(row)
+            try:
+                id_ = row_form.get(entity_type.id_name)
+                values = get_update_values(entity_type, immutable_props, row_form)
+            except HTTPException as e:
+                outcomes.append(common.create_error_outcome(e, **{entity_type.id_name: row.get(entity_type.id_name)}))
+                continue
+            assignments = ', '.join(f'{prop_name}=?' for prop_name in values)
+            try:
+                res = cursor.execute(
+                    f'UPDATE {entity_type.table_name} SET {assignments} WHERE {entity_type.id_name}=? RETURNING *',
+                    (*values.values(), id_),
+                )
+            except sqlite3.IntegrityError as e:
+                # Only the failed statement is rolled back, so other rows are still updated
+                try:
+                    abort_if_unique_violated(e, entity_type, values)
+                except HTTPException as http_e:
+                    outcomes.append(common.create_error_outcome(http_e, **{entity_type.id_name: id_}))
+                    continue
+                raise
+            outcomes.append(_get_id_outcome(entity_type, id_, res.fetchall()))
+    else:
+        ids = get_request_ids(entity_type, form)
+        values = get_update_values(entity_type, immutable_props, form)
+        assignments = ', '.join(f'{prop_name}=?' for prop_name in values)
+        try:
+            res = cursor.execute(
+                f'UPDATE {entity_type.table_name} SET {assignments} '
+                f'WHERE {entity_type.id_name} IN ({", ".join("?" for _ in ids)}) RETURNING *',
+                (*values.values(), *ids),
+            )
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            abort_if_unique_violated(e, entity_type, values)
+            raise
+        outcomes = _get_id_outcomes(entity_type, ids, res.fetchall())
+    conn.commit()
+    invalidate_cache(entity_type)
+    return common.create_response(200, outcomes)
+
+
+def delete_many(entity_type: Type[models.Model]) -> Response:
+    """
+    Delete many entities, identified by the comma-separated IDs in the POST data
+    (see :py:func:`get_request_ids`), with a single ``DELETE ... RETURNING`` statement.
+
+    The response body contains the outcome of every entity, in order (see :py:func:`common.create_outcome`).
+
+    :param entity_type: the type of the entities to delete (:py:class:`models.Model` subclass)
+    :return: ``200`` on success with the outcome of every entity,\n
+             ``400`` if IDs were not found or malformed
+    """
+    form = common.FlaskPOSTForm(flask.request.form)
     conn, cursor = common.get_db_connection()
 
+    ids = get_request_ids(entity_type, form)
+    res = cursor.execute(
+        f'DELETE FROM {entity_type.table_name} '
+        f'WHERE {entity_type.id_name} IN ({", ".join("?" for _ in ids)}) RETURNING *',
+        ids,
+    )
+    outcomes = _get_id_outcomes(entity_type, ids, res.fetchall())
+    conn.commit()
+    invalidate_cache(entity_type)
+    return common.create_response(200, outcomes)
+
+
+def sweep_expired_reservations(batch_size: int = common.SWEEP_BATCH_SIZE) -> int:
+    """
+    Delete one batch of at most `batch_size` reservations which have expired, in their own transaction,
+    so the write lock is only held briefly. Expired reservations are found through the expiry index.
+
+    Must be called within a Flask application context.
+
+    :return: the number of deleted reservations, less than `batch_size` if no expired reservations are left
+    """
+    conn, cursor = common.get_db_connection()
+    table_name = models.Reservation.table_name
+    res = cursor.execute(
+        f'DELETE FROM {table_name} WHERE rowid IN '
+        f'(SELECT rowid FROM {table_name} WHERE expires_epoch_millis <= ? LIMIT ?)',
+        (common.time_ms(), batch_size),
+    )
+    conn.commit()
+    if res.rowcount > 0:
+        invalidate_cache(models.Reservation)
+    return res.rowcount
+
+
+def get_request_ids(
+    entity_type: Type[models.Model], form: common.FlaskPOSTForm, max_ids: int = common.BULK_MAX_ROWS,
+) -> List[str]:
+    """
+    Get the IDs of many entities from the comma-separated ``<id_name>s`` key of a request,
+    e.g. ``item_ids=<item_id>,<item_id>``. Duplicate IDs are dropped, keeping the first.
+
+    :return: the IDs in the order they were requested,\n
+             ``400`` if the key was not found or malformed,\n
+             ``400`` if there were no IDs, or more than `max_ids` IDs
+    """
+    key = f'{entity_type.id_name}s'
+    ids = list(dict.fromkeys(id_ for id_ in form.get(key).split(',') if id_ != ''))
+    if len(ids) == 0:
+        flask.abort(400, f'{key} was empty')
+    if len(ids) > max_ids:
+        flask.abort(400, f'{key} had more than {max_ids} IDs')
+    return ids
+
+
+def _get_id_outcome(entity_type: Type[models.Model], id_: str, db_entities: List[tuple]) -> Response:
+    if len(db_entities) == 0:
+        e = NotFound(f'{entity_type.__name__} does not exist')
+        return common.create_error_outcome(e, **{entity_type.id_name: id_})
+    return common.create_outcome(200, entity_type(*db_entities[0]).to_dict(), **{entity_type.id_name: id_})
+
+
+def _get_id_outcomes(entity_type: Type[models.Model], ids: List[str], db_entities: List[tuple]) -> List[Response]:
+    id_idx = list(models.get_model_attributes(entity_type)).index(entity_type.id_name)
+    db_entities_by_id = {db_entity[id_idx]: db_entity for db_entity in db_entities}
+    return [
+        _get_id_outcome(entity_type, id_, [db_entities_by_id[id_]] if id_ in db_entities_by_id else [])
+        for id_ in ids
+    ]
+
+
+_list_cache = models.EntityCache()
+_count_cache = models.EntityCache()
+
+
+def invalidate_cache(entity_type: Type[models.Model]) -> None:
+    """
+    Invalidate all cached lists and counts of an entity type (:py:class:`models.Model`).
+
+    Must be called after every committed write (create, update, delete) to the entity type's table,
+    so the next :py:func:`list_` or :py:func:`count` call reads from the database
+    instead of returning stale entities.
+
+    :see also: :py:func:`models.bump_generation`
+    """
+    models.bump_generation(entity_type)
+    _list_cache.evict(entity_type)
+    _count_cache.evict(entity_type)
+
+
+class Filter(NamedTuple):
+    """A single filter on listed or counted entities, parsed from a ``where`` parameter by :py:func:`get_filters`."""
+    column: str     #: Name of the filtered attribute.
+    operator: str   #: One of :py:data:`FILTER_OPERATORS`.
+    value: Any      #: Value converted to the attribute's type, or a tuple of values for ``in``.
+
+
+#: Operators of ``where`` filters, mapped to the SQL condition of an attribute they compile to.
+FILTER_OPERATORS = {
+    'eq': '{column} = ?',
+    'lt': '{column} < ?',
+    'gt': '{column} > ?',
+    'in': '{column} IN ({placeholders})',
+    'prefix': '{column} >= ? AND {column} < ?',
+}
+
+
+def get_filters(entity_type: Type[models.Model], request_parameters) -> Tuple[Filter, ...]:
+    """
+    Get the filters on entities of a single type (`entity_type`) from the ``where`` keys of a request.
+
+    Each ``where`` key is formatted as ``<attribute>.<operator>.<value>``, where the attribute is
+    the name of any attribute in the model and the operator is one of:
+
+        * ``eq``: the attribute equals the value, e.g. ``where=box_id.eq.<box_id>``
+        * ``lt`` or ``gt``: the attribute is less or greater than the value, e.g. ``where=quantity.lt.5``
+        * ``in``: the attribute equals any of the comma-separated values, e.g. ``where=box_id.in.<box_id>,<box_id>``
+          (up to :py:data:`common.GET_MANY_MAX_IDS` values)
+        * ``prefix``: the attribute starts with the non-empty value (case-sensitive), only for text attributes,
+          e.g. ``where=mfg_part_number.prefix.GRM``
+
+    Values are converted to the type of the attribute. ``where`` may be repeated, and entities must match every filter.
+    Filters compile to parameterized SQL conditions (see :py:func:`compile_filters`) which can use an index
+    on the attribute, including ``prefix``, which is compiled to a range of values.
+
+    :return: the filters in the order they were passed,\n
+             ``400`` if any filter was malformed,\n
+             ``400`` if any filter attribute or operator was not valid, or the operator not valid on the attribute,\n
+             ``400`` if any filter value could not be converted to the attribute's type
+    """
+    attributes = models.get_model_attributes(entity_type)
+    filters = []
+    for expression in request_parameters.getlist('where'):
+        if common.is_dirty(expression):
+            flask.abort(400, 'where is malformed')
+        parts = expression.split('.', 2)
+        if len(parts) != 3:
+            flask.abort(400, f'{expression} is not a valid filter, expected <attribute>.<operator>.<value>')
+        column, operator, raw_value = parts
+        if column not in attributes:
+            flask.abort(400, f'{column} is not a valid filter key')
+        if operator not in FILTER_OPERATORS:
+            operators = ', '.join(FILTER_OPERATORS)
+            flask.abort(400, f'{operator} is not a valid filter operator, expected one of {operators}')
+
+        value_type = attributes[column] if attributes[column] in (int, float) else str
+        if operator == 'prefix' and value_type is not str:
+            flask.abort(400, f'{column} filter operator prefix is only valid on text attributes')
+        if operator == 'prefix' and raw_value == '':
+            flask.abort(400, f'{column} filter prefix cannot be empty')
+        raw_values = raw_value.split(',') if operator == 'in' else [raw_value]
+        if len(raw_values) > common.GET_MANY_MAX_IDS:
+            flask.abort(400, f'{column} filter had more than {common.GET_MANY_MAX_IDS} values')
+        try:
+            values = tuple(value_type(value) for value in raw_values)
+        except ValueError:
+            flask.abort(400, f'{column} filter value could not be converted to type {value_type.__name__}')
+        filters.append(Filter(column, operator, values if operator == 'in' else values[0]))
+    return tuple(filters)
+
+
+def compile_filters(filters: Tuple[Filter, ...]) -> Tuple[List[str], List[Any]]:
+    """
+    Compile filters (see :py:func:`get_filters`) into SQL conditions, all of which must hold,
+    and their parameters.
+
+    :return: the ``(conditions, parameters)`` pair
+    """
+    conditions = []
+    params = []
+    for column, operator, value in filters:
+        if operator == 'in':
+            placeholders = ', '.join('?' for _ in value)
+            conditions.append(FILTER_OPERATORS[operator].format(column=column, placeholders=placeholders))
+            params.extend(value)
+        elif operator == 'prefix':
+            if value == '':
+                continue
+            # Every string starting with the prefix sorts before the prefix with its last character incremented
+            conditions.append(FILTER_OPERATORS[operator].format(column=column))
+            params.extend((value, value[:-1] + chr(ord(value[-1]) + 1)))
+        else:
+            conditions.append(FILTER_OPERATORS[operator].format(column=column))
+            params.append(value)
+    return conditions, params
+
+
+def get_related_filter(entity_type: Type[models.Model], id_: str) -> Filter:
+    """
+    Get a filter matching the entities related to a single entity of a type (`entity_type`),
+    i.e. those whose attribute named after the entity type's ID equals the entity's ID (`id_`),
+    e.g. the items in a box or the reservations of a user.
+
+    :return: the filter, to pass to :py:func:`list_`, :py:func:`count` or :py:func:`sum_`,\n
+             ``400`` if the ID was malformed,\n
+             ``404`` if the entity does not exist
+    """
+    if common.is_dirty(id_):
+        flask.abort(400, f'{entity_type.id_name} was malformed')
+    _, cursor = common.get_db_connection(readonly=True)
+    abort_if_not_exists(cursor, entity_type, id_)
+    return Filter(entity_type.id_name, 'eq', id_)
+
+
+def list_(entity_type: Type[models.Model], filters: Tuple[Filter, ...] = ()) -> Response:
+    """
+    List a window of entities of a single type (`entity_type`) from the database, with optional ordering.
+
+    Only the requested window (``limit`` rows starting at ``offset``) is read from the database:
+    ordering, limit and offset are all applied by SQL. Windows are cached per ordering and position
+    until the next write to the entity type (see :py:func:`invalidate_cache`).
+
+    Entities are listed in insertion order unless ``sortby`` is provided. Entities with equal
+    ``sortby`` values are ordered by identifier, so windows never overlap or skip entities.
+
+    Passing a ``cursor`` parameter (empty for the first page) switches to keyset pagination:
+    the response contains a ``next_cursor`` to pass to the next call (``None`` on the last page),
+    and each page resumes directly after the last entity of the previous one instead of skipping
+    ``offset`` rows, so every page costs the same regardless of depth. Entities are ordered by
+    identifier in this mode unless ``sortby`` is provided, and ``offset`` may not be combined with it.
+
+    Passing one or more ``where`` parameters only lists entities matching every filter
+    (see :py:func:`get_filters`), which are applied by SQL and combine with ordering and either pagination mode.
+
+    :param entity_type: the type of the entities to list (:py:class:`models.Model` subclass)
+    :param filters: filters which listed entities must match in addition to any ``where`` filters,
+                    e.g. to list the entities related to another entity
+    :return: ``200`` on success with a list of :py:class:`models.Model` s,\n
+             ``400`` if any ``where`` filter was malformed or invalid,\n
+             ``400`` if any sorting attributes were malformed,\n
+             ``400`` if ``sortby`` is present and is not a valid sort key,\n
+             ``400`` if ``direction`` is not ``ASC`` or ``DESC``,\n
+             ``400`` if ``limit`` is not an integer (digit string), \n
+             ``400`` if ``offset`` is not an integer (digit string),\n
+             ``400`` if ``cursor`` was malformed,\n
+             ``400`` if ``cursor`` and ``offset`` were both present
+    """
+    conn, cursor = common.get_db_connection(readonly=True)
+
     limit = get_int_parameter(
         'limit', common.RET_ENTITIES_DEF_LIMIT, flask.request.args,
     )
@@ -150,33 +589,274 @@ def list_(entity_type: Type[models.Model]) -> Response:
         if sortby not in models.get_model_attributes(entity_type).keys():
             flask.abort(400, f'{sortby} is not a valid sort key')
 
-        query = f'SELECT * FROM {entity_type.table_name} ORDER BY {sortby} {direction}'
-    else:
-        query = f'SELECT * FROM {entity_type.table_name}'
-
-    cache_key = models.EntityCacheKey(entity_type, direction=direction, sortby=sortby)
+    page_cursor = None
+    if 'cursor' in flask.request.args:
+        if 'offset' in flask.request.args:
+            flask.abort(400, 'offset cannot be combined with cursor')
+        page_cursor = flask.request.args.get('cursor')
+        if common.is_dirty(page_cursor):
+            flask.abort(400, 'cursor is malformed')
+        if sortby is None:
+            sortby = entity_type.id_name
+
+    filters = (*filters, *get_filters(entity_type, flask.request.args))
+
+    cache_key = models.EntityCacheKey(
+        entity_type, direction=direction, sortby=sortby, limit=limit, offset=offset, cursor=page_cursor,
+        filters=filters,
+    )
     cached_result = _list_cache.get(cache_key)
     if cached_result is not None:
         entities = cached_result
+    elif page_cursor is None:
+        if sortby is not None:
+            order = f'{sortby} {direction}, {entity_type.id_name} {direction}'
+        else:
+            order = 'rowid'
+        conditions, params = compile_filters(filters)
+        where = f'WHERE {" AND ".join(conditions)}' if len(conditions) != 0 else ''
+        query = f'SELECT * FROM {entity_type.table_name} {where} ORDER BY {order} LIMIT ? OFFSET ?'
+        res = cursor.execute(query, (*params, limit, offset))
+        entities = [entity_type(*db_entity) for db_entity in res.fetchall()]
+        _list_cache.add(cache_key, entities)
     else:
-        res = cursor.execute(query)
-        db_entities = res.fetchall()
-        entities = [entity_type(*db_entity) for db_entity in db_entities]
+        # Fetch one extra entity to know whether there is a next page
+        entities = _list_after_cursor(cursor, entity_type, sortby, direction, limit + 1, page_cursor, filters)
         _list_cache.add(cache_key, entities)
 
-    cut_entities = models.EntityCache.cut(entities, limit, offset)
-    return common.create_response(200, [item.to_dict() for item in cut_entities])
+    response = common.create_response(200, [entity.to_dict() for entity in entities[:limit]])
+    if page_cursor is not None:
+        has_next_page = len(entities) > limit > 0
+        response['next_cursor'] = encode_cursor(entities[limit - 1], sortby) if has_next_page else None
+    return response
 
 
-def count(entity_type: Type[models.Model]) -> Response:
-    # TODO documentation
-    _, cursor = common.get_db_connection()
-    query = f'SELECT COUNT(*) FROM {entity_type.table_name}'
-    res = cursor.execute(query)
-    entity_count = res.fetchone()
+def _list_after_cursor(
+    cursor: Cursor, entity_type: Type[models.Model], sortby: str, direction: str, limit: int, page_cursor: str,
+    filters: Tuple[Filter, ...] = (),
+) -> List[models.Model]:
+    """
+    List up to `limit` entities matching `filters` ordered by ``(sortby, id)`` which come strictly after `page_cursor`.
+
+    The ``WHERE (sortby, id) > (?, ?)`` row-value comparison lets SQLite seek straight to the
+    position of the cursor in an index on `sortby` (or the primary key) rather than scanning
+    and discarding every entity before it, as ``OFFSET`` does.
+
+    SQLite orders ``NULL`` before every other value, and comparisons with ``NULL`` are never true,
+    so ``NULL`` `sortby` values on either side of the cursor are matched with explicit ``IS NULL`` checks.
+    """
+    id_name = entity_type.id_name
+    order = f'{sortby} {direction}, {id_name} {direction}' if sortby != id_name else f'{id_name} {direction}'
+    conditions, params = compile_filters(filters)
+    if page_cursor != '':
+        sort_value, id_ = decode_cursor(page_cursor)
+        comparison = '>' if direction == 'ASC' else '<'
+        if sortby == id_name:
+            conditions.append(f'{id_name} {comparison} ?')
+            params.append(id_)
+        elif sort_value is None:
+            # NULLs come first in ascending order, so every non-NULL value is after the cursor
+            null_check = f'{sortby} IS NOT NULL OR' if direction == 'ASC' else f'{sortby} IS NULL AND'
+            conditions.append(f'({null_check} {id_name} {comparison} ?)')
+            params.append(id_)
+        else:
+            # NULLs come last in descending order, so they are always after a non-NULL cursor
+            null_check = f' OR {sortby} IS NULL' if direction == 'DESC' else ''
+            conditions.append(f'(({sortby}, {id_name}) {comparison} (?, ?){null_check})')
+            params.extend((sort_value, id_))
+    where = f'WHERE {" AND ".join(conditions)}' if len(conditions) != 0 else ''
+    query = f'SELECT * FROM {entity_type.table_name} {where} ORDER BY {order} LIMIT ?'
+    res = cursor.execute(query, (*params, limit))
+    return [entity_type(*db_entity) for db_entity in res.fetchall()]
+
+
+def encode_cursor(entity: models.Model, sortby: str) -> str:
+    """
+    Encode the position of an entity within a list sorted by `sortby` as an opaque cursor.
+
+    :see also: :py:func:`decode_cursor`
+    """
+    position = [entity.to_dict()[sortby], entity.to_dict()[entity.id_name]]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(page_cursor: str) -> Tuple[Any, str]:
+    """
+    Decode an opaque cursor created by :py:func:`encode_cursor` into a ``(sortby value, id)`` pair.
+
+    :return: the ``(sortby value, id)`` pair on success, where the sortby value may be ``None``,\n
+             ``400`` if the cursor was malformed
+    """
+    try:
+        sort_value, id_ = json.loads(base64.urlsafe_b64decode(page_cursor.encode()))
+    except (ValueError, TypeError):
+        flask.abort(400, 'cursor is malformed')
+    if not isinstance(id_, str) or not (sort_value is None or isinstance(sort_value, (str, int, float))):
+        flask.abort(400, 'cursor is malformed')
+    return sort_value, id_
+
+
+def search(entity_type: Type[models.Model]) -> Response:
+    """
+    Search the searchable columns (:py:attr:`models.Model.search_columns`) of entities of a single type
+    (`entity_type`) for the ``q`` parameter of :py:func:`flask.Request.args`, using the full-text index
+    created by :py:func:`migrations.create_search_table`.
+
+    Each whitespace-separated term of ``q`` is matched as a token prefix in any searchable column,
+    and entities must match every term. Matches are ordered by relevance (BM25), most relevant first,
+    and paginated by ``limit`` and ``offset`` as in :py:func:`list_`. Only the index and the matching
+    rows are read, so searches do not scan the table.
+
+    :param entity_type: the type of the entities to search (:py:class:`models.Model` subclass)
+    :return: ``200`` on success with a list of matching :py:class:`models.Model` s,\n
+             ``400`` if ``q`` was not found, malformed or empty,\n
+             ``400`` if ``limit`` or ``offset`` is not an integer (digit string),\n
+             ``501`` if full-text search is not supported by the database
+    """
+    if len(entity_type.search_columns) == 0 or not migrations.FULL_TEXT_SEARCH:
+        flask.abort(501, f'Searching {entity_type.table_name} is not supported')
+    form = common.FlaskPOSTForm(flask.request.args)
+    terms = form.get('q').split()
+    if len(terms) == 0:
+        flask.abort(400, 'q was empty')
+    match_query = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+    limit = get_int_parameter('limit', common.RET_ENTITIES_DEF_LIMIT, flask.request.args)
+    limit = min(limit, common.RET_ENTITIES_MAX_LIMIT)
+    offset = get_int_parameter('offset', 0, flask.request.args)
+
+    table_name = entity_type.table_name
+    search_table_name = models.get_search_table_name(entity_type)
+    _, cursor = common.get_db_connection(readonly=True)
+    res = cursor.execute(
+        f'SELECT {table_name}.* FROM {search_table_name} '
+        f'JOIN {table_name} ON {table_name}.rowid = {search_table_name}.rowid '
+        f'WHERE {search_table_name} MATCH ? ORDER BY {search_table_name}.rank LIMIT ? OFFSET ?',
+        (match_query, limit, offset),
+    )
+    return common.create_response(200, [entity_type(*db_entity).to_dict() for db_entity in res.fetchall()])
+
+
+def fuzzy_search(entity_type: Type[models.Model]) -> Response:
+    """
+    Search the fuzzy searchable columns (:py:attr:`models.Model.fuzzy_columns`) of entities of a single type
+    (`entity_type`) for values similar to the ``q`` parameter of :py:func:`flask.Request.args`, using the
+    trigram index created by :py:func:`migrations.create_fuzzy_table`.
+
+    Values are compared after normalization (see :py:func:`common.normalize_fuzzy`) by their trigram
+    similarity: the number of trigrams (see :py:func:`common.get_trigrams`) two values share, divided by
+    the number of distinct trigrams in either. Candidates sharing any trigram with ``q`` are looked up in
+    the index, of which only the :py:data:`common.FUZZY_MAX_CANDIDATES` sharing the most trigrams are ranked.
+    Entities are then ordered by the similarity of their most similar column, most similar first, and entities
+    less similar than :py:data:`common.FUZZY_MIN_SIMILARITY` are dropped.
+
+    :param entity_type: the type of the entities to search (:py:class:`models.Model` subclass)
+    :return: ``200`` on success with a list of similar :py:class:`models.Model` s,\n
+             ``400`` if ``q`` was not found or malformed,\n
+             ``400`` if ``q`` had fewer than 3 characters after normalization,\n
+             ``400`` if ``limit`` is not an integer (digit string),\n
+             ``501`` if fuzzy search is not supported by the database
+    """
+    if len(entity_type.fuzzy_columns) == 0 or not migrations.FUZZY_SEARCH:
+        flask.abort(501, f'Fuzzy searching {entity_type.table_name} is not supported')
+    form = common.FlaskPOSTForm(flask.request.args)
+    trigrams = common.get_trigrams(common.normalize_fuzzy(form.get('q')))
+    if len(trigrams) == 0:
+        flask.abort(400, f'q must have at least 3 characters other than {common.FUZZY_IGNORED_CHARS!r}')
+    match_query = ' OR '.join(f'"{trigram}"' for trigram in sorted(trigrams))
+
+    limit = get_int_parameter('limit', common.RET_ENTITIES_DEF_LIMIT, flask.request.args)
+    limit = min(limit, common.RET_ENTITIES_MAX_LIMIT)
+
+    table_name = entity_type.table_name
+    fuzzy_table_name = models.get_fuzzy_table_name(entity_type)
+    fuzzy_columns = ', '.join(f'{fuzzy_table_name}.{column}' for column in entity_type.fuzzy_columns)
+    _, cursor = common.get_db_connection(readonly=True)
+    res = cursor.execute(
+        f'SELECT {table_name}.*, {fuzzy_columns} FROM {fuzzy_table_name} '
+        f'JOIN {table_name} ON {table_name}.rowid = {fuzzy_table_name}.rowid '
+        f'WHERE {fuzzy_table_name} MATCH ? ORDER BY {fuzzy_table_name}.rank LIMIT ?',
+        (match_query, common.FUZZY_MAX_CANDIDATES),
+    )
+
+    attribute_count = len(models.get_model_attributes(entity_type))
+    ranked_entities = []
+    for db_candidate in res.fetchall():
+        similarity = max(
+            len(trigrams & value_trigrams) / len(trigrams | value_trigrams)
+            for value_trigrams in (common.get_trigrams(value or '') for value in db_candidate[attribute_count:])
+        )
+        if similarity >= common.FUZZY_MIN_SIMILARITY:
+            ranked_entities.append((similarity, entity_type(*db_candidate[:attribute_count])))
+    ranked_entities.sort(key=lambda ranked_entity: ranked_entity[0], reverse=True)
+    return common.create_response(200, [entity.to_dict() for _, entity in ranked_entities[:limit]])
+
+
+def count(entity_type: Type[models.Model], filters: Tuple[Filter, ...] = ()) -> Response:
+    """
+    Count the entities of a single type (`entity_type`) in the database, optionally only those
+    matching every ``where`` filter in :py:func:`flask.Request.args` (see :py:func:`get_filters`).
+
+    Counts without filters, or with a single ``eq`` filter on one of the entity type's counted columns
+    (:py:attr:`models.Model.counted_columns`), are read from the counters kept by the database
+    (see :py:func:`migrations.create_counters`). Other counts scan the matching entities.
+    Counts are cached per filters until the next write to the entity type (see :py:func:`invalidate_cache`).
+
+    :param entity_type: the type of the entities to count (:py:class:`models.Model` subclass)
+    :param filters: filters which counted entities must match in addition to any ``where`` filters
+    :return: ``200`` on success with the count, formatted as ``{'count': <count>}``,\n
+             ``400`` if any ``where`` filter was malformed or invalid,\n
+             ``500`` if the count returned a non-one number of values
+    """
+    filters = (*filters, *get_filters(entity_type, flask.request.args))
+    cache_key = models.EntityCacheKey(entity_type, filters=filters)
+    cached_result = _count_cache.get(cache_key)
+    if cached_result is not None:
+        return common.create_response(200, cached_result)
+
+    _, cursor = common.get_db_connection(readonly=True)
+    if len(filters) == 0:
+        counter = ('', '')
+    elif len(filters) == 1 and filters[0].operator == 'eq' and filters[0].column in entity_type.counted_columns:
+        counter = (filters[0].column, filters[0].value)
+    else:
+        counter = None
+    if counter is not None:
+        query = f'SELECT count FROM {models.COUNTS_TABLE_NAME} WHERE table_name=? AND column_name=? AND value=?'
+        res = cursor.execute(query, (entity_type.table_name, *counter))
+        # Values without a counter are not held by any entity
+        entity_count = res.fetchone() or (0,)
+    else:
+        conditions, params = compile_filters(filters)
+        where = f'WHERE {" AND ".join(conditions)}' if len(conditions) != 0 else ''
+        query = f'SELECT COUNT(*) FROM {entity_type.table_name} {where}'
+        res = cursor.execute(query, params)
+        entity_count = res.fetchone()
     if len(entity_count) != 1:
         flask.abort(500, f'could not count {entity_type.table_name}')
-    return common.create_response(200, [{'count': int(entity_count[0])}])
+    body = [{'count': int(entity_count[0])}]
+    _count_cache.add(cache_key, body)
+    return common.create_response(200, body)
+
+
+def sum_(entity_type: Type[models.Model], column: str, filters: Tuple[Filter, ...] = ()) -> Response:
+    """
+    Sum a numeric attribute (`column`) of the entities of a single type (`entity_type`) in the database,
+    optionally only those matching every ``where`` filter in :py:func:`flask.Request.args`
+    (see :py:func:`get_filters`). Entities are selected through the same indexes as :py:func:`count`.
+
+    :param entity_type: the type of the entities to sum (:py:class:`models.Model` subclass)
+    :param column: the name of the attribute to sum
+    :param filters: filters which summed entities must match in addition to any ``where`` filters
+    :return: ``200`` on success with the sum, formatted as ``{<column>: <sum>}``, ``0`` if no entities matched,\n
+             ``400`` if any ``where`` filter was malformed or invalid
+    """
+    filters = (*filters, *get_filters(entity_type, flask.request.args))
+    conditions, params = compile_filters(filters)
+    where = f'WHERE {" AND ".join(conditions)}' if len(conditions) != 0 else ''
+    _, cursor = common.get_db_connection(readonly=True)
+    res = cursor.execute(f'SELECT COALESCE(SUM({column}), 0) FROM {entity_type.table_name} {where}', params)
+    return common.create_response(200, [{column: int(res.fetchone()[0])}])
 
 
 def get_int_parameter(key: str, default: int, request_parameters) -> int:
@@ -194,19 +874,20 @@ def get_int_parameter(key: str, default: int, request_parameters) -> int:
     return value
 
 
-def get_request_user_id(cursor: Cursor, form: common.FlaskPOSTForm) -> str:
-    # TODO documentation
-    user_query = f'SELECT {models.User.id_name} FROM {models.User.table_name} WHERE {auth.API_KEY_NAME}=?'
-    user_res = cursor.execute(user_query, (form.get(auth.API_KEY_NAME),))
-    db_user = user_res.fetchone()
-    if db_user is None or len(db_user) == 0:
-        flask.abort(404, 'User does not exist')
-    user_id = db_user[0]
-    return user_id
+def get_request_user_id(form: common.FlaskPOSTForm) -> str:
+    """
+    Get the ID of the user authenticated by the API key of the current request.
+
+    Does not query the database if the request has already been authenticated,
+    e.g. by :py:func:`auth.route_requires_auth`.
+
+    :see also: :py:func:`auth.get_principal`
+    """
+    return auth.get_principal(form.get(auth.API_KEY_NAME)).user_id
 
 
 def get_user_id_exists(user_id: str) -> bool:
-    conn, cursor = common.get_db_connection()
+    conn, cursor = common.get_db_connection(readonly=True)
     user_query = f"SELECT {models.User.id_name} FROM {models.User.table_name} WHERE user_id='{user_id}'"
     user_res = cursor.execute(user_query)
     db_user = user_res.fetchone()
@@ -219,3 +900,25 @@ def create_entity(conn: Connection, cursor: Cursor, entity: models.Model) -> Non
     query = f'INSERT INTO {entity.table_name} VALUES ({query_placeholders})'
     cursor.execute(query, (*entity,))
     conn.commit()
+    invalidate_cache(type(entity))
+
+
+def create_entities(
+    conn: Connection, cursor: Cursor, entity_type: Type[models.Model], entities: List[models.Model],
+) -> None:
+    """
+    Insert many entities of the same type within a single transaction, with a single prepared statement.
+
+    Either every entity is inserted or, if any insert fails, none are.
+
+    :raise sqlite3.Error: if any entity could not be inserted
+    """
+    query_placeholders = ', '.join('?' for _ in models.get_model_attributes(entity_type))
+    query = f'INSERT INTO {entity_type.table_name} VALUES ({query_placeholders})'
+    try:
+        cursor.executemany(query, [(*entity,) for entity in entities])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    invalidate_cache(entity_type)
@@ -0,0 +1,481 @@
+"""
+Creates and migrates the schema of the backing database.
+
+The schema of every table is derived from its :py:class:`models.Model`. New databases are created
+directly at the latest schema, while existing databases are brought up to date by applying every
+pending migration step in :py:data:`MIGRATIONS`, in order, within a single transaction.
+
+The version of the schema is stored in the database itself (``PRAGMA user_version``) and is the
+number of migration steps applied to it. Migrations run automatically at startup (see :py:mod:`wsgi`),
+or may be run ahead of time from the command line: ::
+
+    python src/migrations.py [--database <path>] [--status]
+"""
+import argparse
+import inspect
+import sqlite3
+from sqlite3.dbapi2 import Connection
+from sqlite3.dbapi2 import Cursor
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Type
+
+import common
+import models
+
+
+MIGRATED_MODELS = (models.Item, models.User, models.Reservation, models.Box)  #: Models with a backing table.
+REBUILD_BATCH_SIZE = 1000                                                     #: Rows copied per batch in rebuilds.
+STRICT_TABLES = sqlite3.sqlite_version_info >= (3, 37, 0)                     #: If ``STRICT`` tables are supported.
+
+#: SQLite column types of :py:class:`models.Model` attribute types.
+COLUMN_TYPES = {
+    int: 'INTEGER',
+    float: 'REAL',
+    str: 'TEXT',
+    bytes: 'BLOB',
+}
+
+
+def _is_fts5_supported(tokenizer: str = 'unicode61') -> bool:
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute(f"CREATE VIRTUAL TABLE fts5_test USING fts5(value, tokenize='{tokenizer}')")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+FULL_TEXT_SEARCH = _is_fts5_supported()          #: If full-text search (the FTS5 extension) is supported.
+FUZZY_SEARCH = _is_fts5_supported('trigram')     #: If fuzzy search (the FTS5 ``trigram`` tokenizer) is supported.
+
+
+class MigrationError(Exception):
+    """Raised if the database could not be migrated. No migration step is applied if this is raised."""
+
+
+def get_column_type(annotation: Type) -> str:
+    """
+    Get the SQLite column type storing values of a :py:class:`models.Model` attribute's type annotation.
+
+    Subclasses map to the type of their closest mapped parent, so :py:class:`identifier.Identifier`
+    is stored as ``TEXT``. Annotations without a mapped type are stored as ``ANY``.
+    """
+    for type_ in inspect.getmro(annotation) if inspect.isclass(annotation) else ():
+        if type_ in COLUMN_TYPES:
+            return COLUMN_TYPES[type_]
+    return 'ANY' if STRICT_TABLES else ''
+
+
+def get_create_table_sql(entity_type: Type[models.Model], table_name: Optional[str] = None) -> str:
+    """
+    Get the statement which creates the table (named `table_name`, or the model's table name
+    by default) representing a store for a passed model type.
+
+    Column types are derived from the type annotations of the model's attributes
+    (see :py:func:`get_column_type`), and the model's ID is made the primary key.
+    Tables are ``STRICT`` if supported (see :py:data:`STRICT_TABLES`), so values which
+    cannot be losslessly converted to the column's type are rejected instead of stored as-is.
+    """
+    model_keys = models.get_model_attributes(entity_type).items()
+    table_keys = ', '.join([
+        f'{k} {get_column_type(v)}'
+        f'{" NOT NULL PRIMARY KEY" if k == entity_type.id_name else ""}' for k, v in model_keys
+    ])
+    strict = ' STRICT' if STRICT_TABLES else ''
+    return f'CREATE TABLE IF NOT EXISTS {table_name or entity_type.table_name}({table_keys}){strict}'
+
+
+def create_indexes(cursor: Cursor, entity_type: Type[models.Model]) -> None:
+    """
+    Create all unique columns and secondary indexes declared by a model type
+    (see :py:func:`models.get_model_indexes`) which do not exist yet.
+    """
+    for index_name, (unique, columns) in models.get_model_indexes(entity_type).items():
+        cursor.execute(
+            f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {index_name} '
+            f'ON {entity_type.table_name}({", ".join(columns)})',
+        )
+
+
+def create_search_table(cursor: Cursor, entity_type: Type[models.Model]) -> None:
+    """
+    Create the full-text index of the searchable columns declared by a model type
+    (:py:attr:`models.Model.search_columns`) and the triggers keeping it in sync
+    with the model's table, if they do not exist yet.
+
+    The index is an FTS5 external content table (see :py:func:`models.get_search_table_name`),
+    so it only stores the index itself and reads column values from the model's table by ``rowid``.
+    A newly created index is populated from the rows already in the model's table.
+
+    Nothing is done if the model has no searchable columns or if full-text search
+    is not supported (see :py:data:`FULL_TEXT_SEARCH`).
+    """
+    if len(entity_type.search_columns) == 0 or not FULL_TEXT_SEARCH:
+        return
+    table_name = entity_type.table_name
+    search_table_name = models.get_search_table_name(entity_type)
+    columns = ', '.join(entity_type.search_columns)
+    new_values = ', '.join(f'new.{column}' for column in entity_type.search_columns)
+    old_values = ', '.join(f'old.{column}' for column in entity_type.search_columns)
+
+    is_new = not table_exists(cursor, search_table_name)
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {search_table_name} USING fts5({columns}, content='{table_name}')",
+    )
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {search_table_name}_insert AFTER INSERT ON {table_name} BEGIN '
+        f'INSERT INTO {search_table_name}(rowid, {columns}) VALUES (new.rowid, {new_values}); '
+        f'END',
+    )
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {search_table_name}_delete AFTER DELETE ON {table_name} BEGIN '
+        f"INSERT INTO {search_table_name}({search_table_name}, rowid, {columns}) "
+        f"VALUES ('delete', old.rowid, {old_values}); "
+        f'END',
+    )
+    # Only searchable columns are reindexed, so e.g. updating quantities does not touch the index
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {search_table_name}_update AFTER UPDATE OF {columns} ON {table_name} BEGIN '
+        f"INSERT INTO {search_table_name}({search_table_name}, rowid, {columns}) "
+        f"VALUES ('delete', old.rowid, {old_values}); "
+        f'INSERT INTO {search_table_name}(rowid, {columns}) VALUES (new.rowid, {new_values}); '
+        f'END',
+    )
+    if is_new:
+        cursor.execute(f"INSERT INTO {search_table_name}({search_table_name}) VALUES ('rebuild')")
+
+
+def get_normalize_fuzzy_sql(value: str) -> str:
+    """Get an SQL expression normalizing a value for fuzzy matching, as :py:func:`common.normalize_fuzzy` does."""
+    for char in common.FUZZY_IGNORED_CHARS:
+        value = f"replace({value}, '{char}', '')"
+    return f'upper({value})'
+
+
+def create_fuzzy_table(cursor: Cursor, entity_type: Type[models.Model]) -> None:
+    """
+    Create the trigram index of the fuzzy searchable columns declared by a model type
+    (:py:attr:`models.Model.fuzzy_columns`) and the triggers keeping it in sync
+    with the model's table, if they do not exist yet.
+
+    The index is an FTS5 table using the ``trigram`` tokenizer (see :py:func:`models.get_fuzzy_table_name`),
+    keyed by the ``rowid`` of the model's table, which stores the normalized value of every column
+    (see :py:func:`common.normalize_fuzzy`), so values can be matched by any substring of 3 or more characters
+    regardless of punctuation. A newly created index is populated from the rows already in the model's table.
+
+    Nothing is done if the model has no fuzzy searchable columns or if fuzzy search
+    is not supported (see :py:data:`FUZZY_SEARCH`).
+    """
+    if len(entity_type.fuzzy_columns) == 0 or not FUZZY_SEARCH:
+        return
+    table_name = entity_type.table_name
+    fuzzy_table_name = models.get_fuzzy_table_name(entity_type)
+    columns = ', '.join(entity_type.fuzzy_columns)
+    new_values = ', '.join(get_normalize_fuzzy_sql(f'new.{column}') for column in entity_type.fuzzy_columns)
+
+    is_new = not table_exists(cursor, fuzzy_table_name)
+    cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fuzzy_table_name} USING fts5({columns}, tokenize='trigram')")
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {fuzzy_table_name}_insert AFTER INSERT ON {table_name} BEGIN '
+        f'INSERT INTO {fuzzy_table_name}(rowid, {columns}) VALUES (new.rowid, {new_values}); '
+        f'END',
+    )
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {fuzzy_table_name}_delete AFTER DELETE ON {table_name} BEGIN '
+        f'DELETE FROM {fuzzy_table_name} WHERE rowid = old.rowid; '
+        f'END',
+    )
+    cursor.execute(
+        f'CREATE TRIGGER IF NOT EXISTS {fuzzy_table_name}_update AFTER UPDATE OF {columns} ON {table_name} BEGIN '
+        f'DELETE FROM {fuzzy_table_name} WHERE rowid = old.rowid; '
+        f'INSERT INTO {fuzzy_table_name}(rowid, {columns}) VALUES (new.rowid, {new_values}); '
+        f'END',
+    )
+    if is_new:
+        values = ', '.join(get_normalize_fuzzy_sql(column) for column in entity_type.fuzzy_columns)
+        cursor.execute(
+            f'INSERT INTO {fuzzy_table_name}(rowid, {columns}) SELECT rowid, {values} FROM {table_name}',
+        )
+
+
+def trigger_exists(cursor: Cursor, trigger_name: str) -> bool:
+    """Check if a trigger exists in the backing database."""
+    res = cursor.execute("SELECT 1 FROM sqlite_master WHERE type='trigger' AND name=?", (trigger_name,))
+    return res.fetchone() is not None
+
+
+def create_counters(cursor: Cursor, entity_type: Type[models.Model]) -> None:
+    """
+    Create the counters of a model type in the counts table (see :py:data:`models.COUNTS_TABLE_NAME`),
+    counting its entities in total and per value of each of its counted columns
+    (:py:attr:`models.Model.counted_columns`), and the triggers keeping them up to date
+    on every insert, delete and update, if they do not exist yet.
+
+    Counters are recounted from the model's table whenever their triggers are created,
+    so counters are also correct after the model's table is rebuilt.
+    """
+    table_name = entity_type.table_name
+    trigger_name = f'{table_name}_counts'
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {models.COUNTS_TABLE_NAME}('
+        f'table_name TEXT NOT NULL, column_name TEXT NOT NULL, value {get_column_type(object)} NOT NULL, '
+        f'count INTEGER NOT NULL, PRIMARY KEY (table_name, column_name, value)'
+        f') WITHOUT ROWID{", STRICT" if STRICT_TABLES else ""}',
+    )
+    if trigger_exists(cursor, f'{trigger_name}_insert'):
+        return
+
+    def increment(column: str, value: str, delta: int) -> str:
+        return (
+            f"INSERT INTO {models.COUNTS_TABLE_NAME} SELECT '{table_name}', '{column}', {value}, {delta} "
+            f'WHERE {value} IS NOT NULL '
+            f'ON CONFLICT(table_name, column_name, value) DO UPDATE SET count = count + {delta}; '
+        )
+
+    # The total is counted with an empty column name and value
+    inserted = increment('', "''", 1) + ''.join(
+        increment(column, f'new.{column}', 1) for column in entity_type.counted_columns
+    )
+    deleted = increment('', "''", -1) + ''.join(
+        increment(column, f'old.{column}', -1) for column in entity_type.counted_columns
+    )
+    cursor.execute(f'CREATE TRIGGER {trigger_name}_insert AFTER INSERT ON {table_name} BEGIN {inserted}END')
+    cursor.execute(f'CREATE TRIGGER {trigger_name}_delete AFTER DELETE ON {table_name} BEGIN {deleted}END')
+    if len(entity_type.counted_columns) != 0:
+        columns = ', '.join(entity_type.counted_columns)
+        moved = ''.join(
+            increment(column, f'old.{column}', -1) + increment(column, f'new.{column}', 1)
+            for column in entity_type.counted_columns
+        )
+        cursor.execute(
+            f'CREATE TRIGGER {trigger_name}_update AFTER UPDATE OF {columns} ON {table_name} BEGIN {moved}END',
+        )
+
+    cursor.execute(f'DELETE FROM {models.COUNTS_TABLE_NAME} WHERE table_name=?', (table_name,))
+    cursor.execute(
+        f"INSERT INTO {models.COUNTS_TABLE_NAME} SELECT '{table_name}', '', '', COUNT(*) FROM {table_name}",
+    )
+    for column in entity_type.counted_columns:
+        cursor.execute(
+            f"INSERT INTO {models.COUNTS_TABLE_NAME} SELECT '{table_name}', '{column}', {column}, COUNT(*) "
+            f'FROM {table_name} WHERE {column} IS NOT NULL GROUP BY {column}',
+        )
+
+
+def create_table(cursor: Cursor, entity_type: Type[models.Model]) -> None:
+    """
+    Creates a single table in the backing database representing a store for a passed model type,
+    along with its indexes, full-text index, trigram index and counters, if they do not exist yet.
+
+    :see also: :py:func:`get_create_table_sql`
+    """
+    cursor.execute(get_create_table_sql(entity_type))
+    create_indexes(cursor, entity_type)
+    create_search_table(cursor, entity_type)
+    create_fuzzy_table(cursor, entity_type)
+    create_counters(cursor, entity_type)
+
+
+def create_tables(cursor: Cursor) -> None:
+    """
+    Creates all tables in the backing database representing
+    stores for all model types (:py:data:`MIGRATED_MODELS`).
+    """
+    for entity_type in MIGRATED_MODELS:
+        create_table(cursor, entity_type)
+
+
+def table_exists(cursor: Cursor, table_name: str) -> bool:
+    """Check if a table exists in the backing database."""
+    res = cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+    return res.fetchone() is not None
+
+
+def get_table_columns(cursor: Cursor, table_name: str) -> List[tuple]:
+    """Get the ``(name, type, notnull, default, pk)`` definition of every column in a table, in order."""
+    res = cursor.execute(f'PRAGMA table_info({table_name})')
+    return [tuple(column[1:]) for column in res.fetchall()]
+
+
+def is_strict_table(cursor: Cursor, table_name: str) -> bool:
+    """Check if a table is a ``STRICT`` table. Always ``False`` if ``STRICT`` tables are not supported."""
+    if not STRICT_TABLES:
+        return False
+    res = cursor.execute(f'PRAGMA table_list({table_name})').fetchone()
+    return res is not None and bool(res[5])
+
+
+def rebuild_table(cursor: Cursor, entity_type: Type[models.Model], batch_size: int = REBUILD_BATCH_SIZE) -> bool:
+    """
+    Rebuild the table of a model type so it matches the latest schema of the model.
+
+    This is the only way to change the primary key or the types of columns in SQLite.
+    A new table is created at the latest schema, all rows are copied over in batches of
+    `batch_size` rows (by ascending ``rowid``, which is preserved), then the old table is
+    dropped and replaced by the new one and indexes and triggers are recreated. Columns which only exist
+    in the new table are left ``NULL``, columns which only exist in the old table are dropped.
+    Values are converted to the type of their new column where this can be done losslessly,
+    otherwise the rebuild fails (for ``STRICT`` tables).
+
+    Nothing is done if the table does not exist or already matches the latest schema.
+
+    :return: ``True`` if the table was rebuilt, else ``False``
+    """
+    table_name = entity_type.table_name
+    new_table_name = f'{table_name}__rebuild'
+    if not table_exists(cursor, table_name):
+        return False
+
+    cursor.execute(f'DROP TABLE IF EXISTS {new_table_name}')
+    cursor.execute(get_create_table_sql(entity_type, new_table_name))
+    old_columns = get_table_columns(cursor, table_name)
+    if old_columns == get_table_columns(cursor, new_table_name) \
+            and is_strict_table(cursor, table_name) == is_strict_table(cursor, new_table_name):
+        cursor.execute(f'DROP TABLE {new_table_name}')
+        return False
+
+    old_column_names = {column[0] for column in old_columns}
+    column_names = ', '.join(k for k in models.get_model_attributes(entity_type) if k in old_column_names)
+    last_rowid = -(1 << 63)
+    while True:
+        res = cursor.execute(
+            f'INSERT INTO {new_table_name}(rowid, {column_names}) '
+            f'SELECT rowid, {column_names} FROM {table_name} WHERE rowid > ? ORDER BY rowid LIMIT ?',
+            (last_rowid, batch_size),
+        )
+        if res.rowcount < batch_size:
+            break
+        last_rowid = cursor.execute(f'SELECT MAX(rowid) FROM {new_table_name}').fetchone()[0]
+
+    cursor.execute(f'DROP TABLE {table_name}')
+    cursor.execute(f'ALTER TABLE {new_table_name} RENAME TO {table_name}')
+    create_indexes(cursor, entity_type)
+    # Row IDs are preserved, so the full-text and trigram indexes are still in sync with the new table
+    create_search_table(cursor, entity_type)
+    create_fuzzy_table(cursor, entity_type)
+    create_counters(cursor, entity_type)
+    return True
+
+
+def _migrate_legacy_schema(cursor: Cursor) -> None:
+    """
+    Rebuild the tables of the legacy schema (version 0), created before models declared primary keys
+    and column types, in which every column (including numeric columns) is ``TEXT`` and there are no indexes.
+
+    Tables are rebuilt directly at the latest schema (see :py:func:`rebuild_table`), with the latest indexes,
+    full-text and trigram indexes and counters. Reservations created before reservations expired expire
+    one default time to live (:py:data:`common.RESERVATION_TTL_MILLIS`) after migrating.
+    """
+    for entity_type in MIGRATED_MODELS:
+        rebuild_table(cursor, entity_type)
+    if table_exists(cursor, models.Reservation.table_name):
+        cursor.execute(
+            f'UPDATE {models.Reservation.table_name} SET expires_epoch_millis=? WHERE expires_epoch_millis IS NULL',
+            (common.time_ms() + common.RESERVATION_TTL_MILLIS,),
+        )
+
+
+#: All migration steps, in order. The version of a database is the number of steps applied to it,
+#: so new steps must only ever be appended to this list.
+MIGRATIONS: List[Callable[[Cursor], None]] = [
+    _migrate_legacy_schema,
+]
+
+
+def get_version(cursor: Cursor) -> int:
+    """Get the schema version of the backing database (the number of migration steps applied to it)."""
+    return cursor.execute('PRAGMA user_version').fetchone()[0]
+
+
+def check_unique_columns(cursor: Cursor) -> None:
+    """
+    Check that no two entities of any migrated model share the value of their ID or of one of the model's
+    unique columns (:py:attr:`models.Model.unique_columns`), which would otherwise fail to migrate once
+    a migration step creates the latest primary keys and unique indexes (see :py:func:`rebuild_table`).
+
+    :raise MigrationError: naming the first duplicate value found
+    """
+    for entity_type in MIGRATED_MODELS:
+        if not table_exists(cursor, entity_type.table_name):
+            continue
+        column_names = {column[0] for column in get_table_columns(cursor, entity_type.table_name)}
+        for column in (entity_type.id_name, *entity_type.unique_columns):
+            if column not in column_names:
+                continue
+            res = cursor.execute(
+                f'SELECT {column} FROM {entity_type.table_name} '
+                f'WHERE {column} IS NOT NULL GROUP BY {column} HAVING COUNT(*) > 1 LIMIT 1',
+            )
+            duplicate = res.fetchone()
+            if duplicate is not None:
+                raise MigrationError(
+                    f'{entity_type.__name__} {column} {duplicate[0]} is not unique, rename or delete duplicates first',
+                )
+
+
+def migrate(conn: Connection) -> int:
+    """
+    Bring the backing database up to the latest schema version.
+
+    A database without any tables is created directly at the latest schema. Otherwise, every
+    pending migration step is applied in order. Any tables or indexes missing afterwards are
+    then created. All of this happens within a single transaction, so a failed migration
+    leaves the database untouched.
+
+    :return: the version of the database before migrating
+    :raise MigrationError: if the database is newer than the latest version,
+                           if any ID or unique column holds duplicate values (see :py:func:`check_unique_columns`),
+                           or if any migration step failed
+    """
+    cursor = conn.cursor()
+    latest_version = len(MIGRATIONS)
+    # Read the version under the write lock, so concurrent migrations never apply the same steps twice
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        version = get_version(cursor)
+        if version > latest_version:
+            raise MigrationError(f'Database version {version} is newer than the latest version {latest_version}')
+        is_new = not any(table_exists(cursor, entity_type.table_name) for entity_type in MIGRATED_MODELS)
+        if not is_new:
+            if version < latest_version:
+                check_unique_columns(cursor)
+            for step in MIGRATIONS[version:]:
+                step(cursor)
+        create_tables(cursor)
+        cursor.execute(f'PRAGMA user_version = {latest_version}')
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        raise MigrationError(f'Could not migrate database from version {version}: {e}') from e
+    except MigrationError:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    return version
+
+
+def main() -> None:
+    """Migrate a database from the command line. See :py:mod:`migrations` for usage."""
+    parser = argparse.ArgumentParser(description='Migrate the inventory database to the latest schema version.')
+    parser.add_argument('--database', default=common.DATABASE_PATH, help='path to the database to migrate')
+    parser.add_argument('--status', action='store_true', help='only print the schema version of the database')
+    args = parser.parse_args()
+
+    conn = common.connect(args.database)
+    try:
+        if args.status:
+            print(f'{args.database}: version {get_version(conn.cursor())} (latest {len(MIGRATIONS)})')
+        else:
+            version = migrate(conn)
+            print(f'{args.database}: migrated from version {version} to {len(MIGRATIONS)}')
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -4,22 +4,53 @@ Defines models for all database entries and associated helpers.
 Contains required attribute names and types for each model.
 """
 import inspect
-import sched
+import itertools
+import threading
 import time
 from abc import ABC
 from abc import abstractmethod
+from collections import OrderedDict
 from typing import Any
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Tuple
 from typing import Type
 
 import common
 from identifier import Identifier
 
 
+#: Table holding the number of entities of every model, in total and per value of each counted column
+#: (:py:attr:`Model.counted_columns`), as ``(table_name, column_name, value, count)`` rows. Totals are
+#: stored with an empty column name and value.
+COUNTS_TABLE_NAME = 'entity_counts'
+
+ENTITY_CACHE_MAX_SIZE = 1024                     #: Maximum number of entries held by each :py:class:`EntityCache`.
+
+
 class Model(ABC):
-    """Parent (abstract) class for all database models which defines common helpers."""
+    """
+    Parent (abstract) class for all database models which defines common helpers.
+
+    The ID field (:py:attr:`id_name`) of each model is the primary key of its table.
+    Models may additionally declare unique columns, secondary indexes, full-text or fuzzy searchable
+    columns and counted columns, which are created alongside the table.
+    """
+
+    #: Names of columns whose values must be unique within the table, each backed by a unique index.
+    unique_columns: Tuple[str, ...] = ()
+    #: Secondary indexes on the table, each a tuple of one or more (composite) column names.
+    indexed_columns: Tuple[Tuple[str, ...], ...] = ()
+    #: Names of text columns searchable by full-text search, backed by a full-text index
+    #: (see :py:func:`get_search_table_name`). Not searchable if empty.
+    search_columns: Tuple[str, ...] = ()
+    #: Names of text columns searchable by fuzzy (approximate) matching, backed by a trigram index
+    #: (see :py:func:`get_fuzzy_table_name`). Not searchable if empty.
+    fuzzy_columns: Tuple[str, ...] = ()
+    #: Names of columns for which the number of entities with each value is counted in the counts table
+    #: (see :py:data:`COUNTS_TABLE_NAME`), in addition to the total number of entities.
+    counted_columns: Tuple[str, ...] = ()
 
     def to_dict(self) -> Dict[str, Any]:
         """Get a map of all properties for this model."""
@@ -72,6 +103,18 @@ class Item(Model):
     id_name = 'item_id'
     id_length = 8
     table_name = 'items'
+    indexed_columns = (
+        ('box_id',),
+        ('mfg_part_number',),
+        ('digikey_part_number',),
+        ('mouser_part_number',),
+        ('jlcpcb_part_number',),
+    )
+    search_columns = (
+        'mfg_part_number', 'description', 'digikey_part_number', 'mouser_part_number', 'jlcpcb_part_number',
+    )
+    fuzzy_columns = ('mfg_part_number', 'digikey_part_number', 'mouser_part_number', 'jlcpcb_part_number')
+    counted_columns = ('box_id', 'created_by')
 
     def __init__(
         self, item_id: Identifier, box_id: Identifier, mfg_part_number: str, quantity: int,
@@ -96,6 +139,7 @@ class User(Model):
     id_name = 'user_id'
     id_length = 28
     table_name = 'users'
+    unique_columns = ('api_key', 'name')
 
     def __init__(self, user_id: Identifier, api_key: str, name: str, authmask: int):
         super().__init__()
@@ -110,13 +154,24 @@ class Reservation(Model):
     id_name = 'reservation_id'
     id_length = 32
     table_name = 'reservations'
+    # The first and last indexes cover the unexpired reserved quantity of an item and of a user, summed
+    # when checking available quantities. The second finds expired reservations to be swept.
+    indexed_columns = (
+        ('item_id', 'expires_epoch_millis', 'quantity'), ('expires_epoch_millis',),
+        ('user_id', 'expires_epoch_millis', 'quantity'),
+    )
+    counted_columns = ('user_id', 'item_id')
 
-    def __init__(self, reservation_id: Identifier, user_id: Identifier, item_id: Identifier, quantity: int):
+    def __init__(
+        self, reservation_id: Identifier, user_id: Identifier, item_id: Identifier, quantity: int,
+        expires_epoch_millis: int,
+    ):
         super().__init__()
         self.reservation_id = Identifier(length=Reservation.id_length, id_=reservation_id)
         self.user_id = Identifier(length=User.id_length, id_=user_id)
         self.item_id = Identifier(length=Item.id_length, id_=item_id)
         self.quantity = int(quantity)
+        self.expires_epoch_millis = int(expires_epoch_millis)
 
 
 class Box(Model):
@@ -124,12 +179,47 @@ class Box(Model):
     id_name = 'box_id'
     id_length = 8
     table_name = 'boxes'
+    unique_columns = ('name',)
 
     def __init__(self, box_id: Identifier, name: str):
         self.box_id = Identifier(length=Box.id_length, id_=box_id)
         self.name = name
 
 
+_generation_counter = itertools.count(1)
+_generations: Dict[Type[Model], int] = {}
+
+
+def get_generation(entity_type: Type[Model]) -> int:
+    """
+    Get the current write generation of an entity type (:py:class:`Model`).
+
+    The generation changes every time :py:func:`bump_generation` is called for the entity type,
+    and is ``0`` if the entity type has never been written to since startup.
+    """
+    return _generations.get(entity_type, 0)
+
+
+def bump_generation(entity_type: Type[Model]) -> int:
+    """
+    Move an entity type (:py:class:`Model`) to a new write generation.
+
+    Must be called *after* a write to the entity type's table has been committed,
+    such that any :py:class:`EntityCacheKey` created beforehand no longer matches
+    new keys and the (possibly stale) data stored at it is never returned again.
+
+    Generations are drawn from a single global counter so concurrent bumps
+    always produce distinct values. Generations only exist in the current process,
+    so the server must run as a single process (any number of threads): a write
+    in one process never invalidates the caches of another.
+
+    :return: the new generation of the entity type
+    """
+    generation = next(_generation_counter)
+    _generations[entity_type] = generation
+    return generation
+
+
 class EntityCacheKey:
     """
     Key class for :py:class:`EntityCache` representing some entity type (:py:class:`Model`)
@@ -137,10 +227,15 @@ class EntityCacheKey:
 
     Expiry of the data stored in the cache at this key is determined by the time the key
     is created, plus some TTL (`ttl_sec`). Expiry time is ignored in comparisons.
+
+    The key also captures the write generation of the entity type when it is created
+    (see :py:func:`get_generation`). Keys from different generations never compare equal,
+    so any write to the entity type invalidates all keys created before it.
     """
 
     def __init__(self, entity_type: Type[Model], ttl_sec: int = 3600, **kwargs):
         self.entity_type = entity_type
+        self.generation = get_generation(entity_type)
         self.expiry_time = int(time.time()) + ttl_sec
         self.kwargs = kwargs
 
@@ -148,42 +243,38 @@ class EntityCacheKey:
         # Ignore expiry time in equality comparisons
         return isinstance(other, EntityCacheKey) \
             and (self.entity_type is other.entity_type) \
+            and (self.generation == other.generation) \
             and (self.kwargs == other.kwargs)
 
     def __hash__(self):
-        return hash((self.entity_type, *self.kwargs.values()))
+        return hash((self.entity_type, self.generation, *self.kwargs.values()))
 
 
 class EntityCache:
     """
-    Simple L1 cache system for lists of entities (models),
+    Bounded, thread-safe LRU cache for lists of entities (models),
     keyed by :py:class:`EntityCacheKey`.
 
     Entries are added to the cache with :py:func:`add`
     and retrieved with :py:func:`get`.
 
-    Entries are automatically evicted after their key's TTL has expired.
-    Expiry time is set when the cache key is created.
+    Entries expire after their key's TTL, which is set when the cache key is created,
+    and the least recently used entry is evicted once more than `max_size` entries are cached.
     """
 
-    def __init__(self):
-        self._map: Dict[EntityCacheKey, List[Model]] = {}
-        self._scheduler: sched.scheduler = sched.scheduler()
+    def __init__(self, max_size: int = ENTITY_CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._map: Dict[EntityCacheKey, List[Model]] = OrderedDict()
+        self._lock = threading.Lock()
 
     def add(self, key: EntityCacheKey, entities: List[Model]) -> None:
-        """
-        Add an entry (list of entities) to the cache if the entry contains at least 1 entity.
-
-        Schedules an event at the key's expiry time to expire the entry automatically.
-        """
+        """Add an entry (list of entities) to the cache if the entry contains at least 1 entity."""
         if len(entities) > 0:
-            self._map[key] = entities
-            self._scheduler.enterabs(key.expiry_time, 1, self._map.pop, key)
-            # Only run if (len(scheduler queue) == 1) since:
-            # - if (== 0): the queue is empty (edge case)
-            # - if (> 1): the scheduler is still running from another add()
-            if len(self._scheduler.queue) == 1:
-                self._scheduler.run(blocking=False)
+            with self._lock:
+                self._map[key] = entities
+                self._map.move_to_end(key)
+                while len(self._map) > self.max_size:
+                    self._map.popitem(last=False)
 
     def get(self, key: EntityCacheKey) -> Optional[List[Model]]:
         """
@@ -191,41 +282,71 @@ class EntityCache:
         key from the cache if it exists.
 
         Will expire the cache entry corresponding to the key if
-        it exists and is over its expiry TTL. This functions as
-        an additional check to the scheduler's expiry event.
+        it exists and is over its expiry TTL.
 
         :return: an entry (list of entities) if the key matched
                  a cache entry, else ``None``.
         """
-        if key in self._map:
+        with self._lock:
+            entities = self._map.get(key)
+            if entities is None:
+                return None
             if key.expiry_time <= time.time():
                 self._map.pop(key)
-            else:
-                return self._map[key]
-        return None
-
-    def clear(self) -> None:
-        """Clear all entries from this cache instance, and cancel all scheduled expiry events."""
-        self._map.clear()
-        for e in self._scheduler.queue:
-            self._scheduler.cancel(e)
+                return None
+            self._map.move_to_end(key)
+            return entities
 
-    @staticmethod
-    def cut(entities: List[Model], limit: int, offset: int):
+    def evict(self, entity_type: Type[Model]) -> None:
         """
-        Cut a list of entities down using a limit and offset.
+        Evict all entries for an entity type (:py:class:`Model`) from this cache instance.
 
-        Guarantees the start and indices used for retrieval will
-        be within the bounds of the list of ``entities`` passed.
-
-        :return: ``entities[offset:(limit+offset)]``
+        Entries of older generations can no longer be retrieved after :py:func:`bump_generation`,
+        so this only frees the memory held by them ahead of their expiry time.
         """
-        start_idx = max(min(offset, len(entities)), 0)
-        end_idx = min(offset + limit, len(entities))
-        return entities[start_idx:end_idx]
+        with self._lock:
+            for key in [k for k in self._map.keys() if k.entity_type is entity_type]:
+                self._map.pop(key)
+
+    def clear(self) -> None:
+        """Clear all entries from this cache instance."""
+        with self._lock:
+            self._map.clear()
 
 
 def get_model_attributes(entity_type: Type[Model]) -> Dict[str, Type]:
     """Get a mapping of names to types of a :py:class:`Model` 's attributes using inspection."""
     raw_params = inspect.signature(entity_type.__init__).parameters
     return {k: v.annotation for k, v in raw_params.items() if k != 'self'}
+
+
+def get_model_indexes(entity_type: Type[Model]) -> Dict[str, Tuple[bool, Tuple[str, ...]]]:
+    """
+    Get a mapping of index names to ``(unique, columns)`` pairs for all unique columns
+    (:py:attr:`Model.unique_columns`) and secondary indexes (:py:attr:`Model.indexed_columns`)
+    declared by a :py:class:`Model`.
+
+    Unique indexes are named ``ux_<table>_<column>`` and secondary indexes ``ix_<table>_<columns>``.
+    """
+    indexes = {}
+    for column in entity_type.unique_columns:
+        indexes[f'ux_{entity_type.table_name}_{column}'] = (True, (column,))
+    for columns in entity_type.indexed_columns:
+        indexes[f'ix_{entity_type.table_name}_{"_".join(columns)}'] = (False, columns)
+    return indexes
+
+
+def get_search_table_name(entity_type: Type[Model]) -> str:
+    """
+    Get the name of the table holding the full-text index of the searchable columns
+    (:py:attr:`Model.search_columns`) of a :py:class:`Model`, named ``<table>_fts``.
+    """
+    return f'{entity_type.table_name}_fts'
+
+
+def get_fuzzy_table_name(entity_type: Type[Model]) -> str:
+    """
+    Get the name of the table holding the trigram index of the fuzzy searchable columns
+    (:py:attr:`Model.fuzzy_columns`) of a :py:class:`Model`, named ``<table>_trigram``.
+    """
+    return f'{entity_type.table_name}_trigram'
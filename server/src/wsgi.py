@@ -1,9 +1,12 @@
-from typing import Type
+import os
+import threading
+import time
 
 import common
+import db
 import dotenv
 import flask
-import models
+import migrations
 from api_box_routes import api_box_blueprint
 from api_item_routes import api_item_blueprint
 from api_reservation_routes import api_reservation_blueprint
@@ -13,30 +16,50 @@ from flask_cors import CORS
 from werkzeug.exceptions import HTTPException
 
 
-def _create_table(entity_type: Type[models.Model]):
+def _create_tables():
     """
-    Creates a single table in the backing database
-    representing a store for a passed model type.
+    Creates all tables in the backing database representing stores for all model types
+    (:py:class:`models.Box`), or migrates existing tables to the latest schema.
 
-    Assumes an ``INTEGER`` data type if the backing data is of type ``int``,
-    otherwise assumes type ``TEXT`` (i.e. ``VARCHAR``).
+    :see also: :py:func:`migrations.migrate`
     """
-    model_keys = models.get_model_attributes(entity_type).items()
-    table_keys = ', '.join([f'{k} {"INTEGER" if isinstance(v, int) else "TEXT"}' for k, v in model_keys])
-    conn, cursor = common.get_db_connection()
-    cursor.execute(f'CREATE TABLE IF NOT EXISTS {entity_type.table_name}({table_keys})').close()
+    with app.app_context():
+        conn, _ = common.get_db_connection()
+        try:
+            migrations.migrate(conn)
+        finally:
+            # Tables are created before the teardown releasing connections is registered
+            common.release_db_connection()
 
 
-def _create_tables():
+def _sweep_expired_reservations():
     """
-    Creates all tables in the backing database
-    representing stores for all model types (:py:class:`models.Box`).
+    Delete expired reservations every :py:data:`common.SWEEP_INTERVAL_SEC`, in batches which each
+    take the write connection for one short transaction. If the database is busy or the sweep fails,
+    the failure is logged and the sweep is retried at the next interval instead of waiting for requests.
+
+    :see also: :py:func:`db.sweep_expired_reservations`
     """
-    with app.app_context():
-        _create_table(models.Item)
-        _create_table(models.User)
-        _create_table(models.Reservation)
-        _create_table(models.Box)
+    while True:
+        time.sleep(common.SWEEP_INTERVAL_SEC)
+        deleted = common.SWEEP_BATCH_SIZE
+        while deleted == common.SWEEP_BATCH_SIZE:
+            try:
+                with app.app_context():
+                    deleted = db.sweep_expired_reservations()
+            except Exception:
+                app.logger.exception('Could not sweep expired reservations, retrying at the next interval')
+                break
+
+
+def start_reservation_sweeper():
+    """
+    Start sweeping expired reservations in a background thread (see :py:func:`_sweep_expired_reservations`),
+    unless disabled by setting the :py:data:`common.RESERVATION_SWEEPER_KEY` environment (``.env``) key to ``off``.
+    """
+    if os.environ.get(common.RESERVATION_SWEEPER_KEY, 'on') == 'off':
+        return
+    threading.Thread(target=_sweep_expired_reservations, name='reservation-sweeper', daemon=True).start()
 
 
 dotenv.load_dotenv()
@@ -44,6 +67,7 @@ app = flask.Flask(__name__)
 CORS(app)
 
 _create_tables()
+start_reservation_sweeper()
 
 app.register_blueprint(api_item_blueprint)
 app.register_blueprint(api_user_blueprint)
@@ -54,10 +78,8 @@ app.register_blueprint(api_thumbnail_blueprint)
 
 @app.teardown_appcontext
 def close_connection(exception):
-    """Close database connection, if previously opened."""
-    db = getattr(flask.g, '_database', None)
-    if db is not None:
-        db.close()
+    """Return database connection to the pool, if previously opened."""
+    common.release_db_connection()
 
 
 @app.errorhandler(HTTPException)
@@ -9,3 +9,6 @@ sys.path.append(_source_path)
 
 _test_path = os.path.join(_project_path, 'tst')
 sys.path.append(_test_path)
+
+# Tests must not race against expired reservations being swept in the background
+os.environ['RESERVATION_SWEEPER'] = 'off'
@@ -129,6 +129,21 @@ class TestBoxUpdate(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.IdTests):
         }
         self.call_route_assert_code(400, attrs, 'No attributes to be updated were provided')
 
+    def test_400_duplicate_name(self):
+        create_attrs = {
+            'name': 'tst-box-update-taken',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/box/create', data=create_attrs)
+        attrs = {
+            'box_id': self.box.box_id,
+            'name': create_attrs['name'],
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, f'Box with name {attrs["name"]} already exists')
+        resp_json = json.loads(self.client.get(f'/api/box/get/{self.box.box_id}').data)
+        self.assertEqual(self.box.name, resp_json['body'][0]['name'])
+
     def test_400_malformed_update_properties(self):
         attrs = {
             'box_id': self.box.box_id,
@@ -172,25 +187,72 @@ class TestBoxDelete(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.IdTests):
             },
         )
 
-    def test_500_duplicate_id(self):
-        self._insert_duplicate_box()
-        self.call_route_assert_code(
-            500, self.attrs,
-            f'Expected 1 item with matching {models.Box.__name__.lower()} ID, got 2',
-        )
+    def test_duplicate_id_rejected(self):
+        # Box ID is the primary key, so a second box with the same ID cannot exist to be deleted
+        with self.assertRaises(sqlite3.IntegrityError):
+            self._insert_duplicate_box()
+        self.call_route_assert_code(200, self.attrs)
 
     def _insert_duplicate_box(self):
         conn = sqlite3.connect(common.DATABASE_PATH)
         cursor = conn.cursor()
-        cursor.execute(f'INSERT INTO {models.Box.table_name} VALUES ({self.box.to_insert_str()})')
-        conn.commit()
-        cursor.close()
-        conn.close()
+        try:
+            cursor.execute(f'INSERT INTO {models.Box.table_name} VALUES ({self.box.to_insert_str()})')
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
 
     def call_route(self, attrs: Dict[str, str]):
         return self.client.post('/api/box/delete', data=attrs)
 
 
+class TestBoxesGetMany(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.boxes = []
+        for k in range(3):
+            create_attrs = {
+                'name': f'tst-box-get-many-{k}',
+                auth.API_KEY_NAME: self.superuser.api_key,
+            }
+            create_response = self.client.post('/api/box/create', data=create_attrs)
+            self.boxes.append(models.Box(*json.loads(create_response.data)['body'][0].values()))
+
+    def test_200(self):
+        missing_id = Identifier(length=models.Box.id_length)
+        box_ids = [self.boxes[2].box_id, missing_id, self.boxes[0].box_id, self.boxes[2].box_id]
+        attrs = {
+            'box_ids': ','.join(box_ids),
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        outcomes = resp_json['body']
+        self.assertListEqual(box_ids[:3], [outcome[models.Box.id_name] for outcome in outcomes])
+        self.assertListEqual([200, 404, 200], [outcome['code'] for outcome in outcomes])
+        self.assertEqual(self.boxes[2].to_dict(), outcomes[0]['body'][0])
+        self.assertEqual('Box does not exist', outcomes[1]['body'][0]['description'])
+        self.assertEqual(self.boxes[0].to_dict(), outcomes[2]['body'][0])
+
+    def test_400_no_ids(self):
+        self.call_route_assert_code(400, {}, 'box_ids was not found in request')
+
+    def test_400_malformed_ids(self):
+        attrs = {
+            'box_ids': '*',
+        }
+        self.call_route_assert_code(400, attrs, 'box_ids was malformed')
+
+    def test_400_too_many_ids(self):
+        attrs = {
+            'box_ids': ','.join(str(k).zfill(models.Box.id_length) for k in range(common.GET_MANY_MAX_IDS + 1)),
+        }
+        self.call_route_assert_code(400, attrs, f'box_ids had more than {common.GET_MANY_MAX_IDS} IDs')
+
+    def call_route(self, attrs: Dict[str, str]):
+        params = tstutil.attrs_to_params(attrs)
+        return self.client.get(f'/api/boxes/get_many?{params}')
+
+
 class TestBoxesList(tstutil.TestBase):
     def _create_n_boxes(self, n: int) -> List[models.Box]:
         boxes = []
@@ -252,6 +314,101 @@ class TestBoxesList(tstutil.TestBase):
         desc_sorted_boxes = sorted(boxes, key=lambda box: box.name, reverse=True)
         self.assertListEqual(resp_entities, desc_sorted_boxes)
 
+    def test_200_sortby_desc_window(self):
+        boxes = self._create_n_boxes(20)
+        attrs = {
+            'sortby': 'name',
+            'direction': 'DESC',
+            'limit': 5,
+            'offset': 5,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        resp_entities = [models.Box(*entity_json.values()) for entity_json in resp_json['body']]
+        desc_sorted_boxes = sorted(boxes, key=lambda box: box.name, reverse=True)
+        self.assertListEqual(resp_entities, desc_sorted_boxes[5:10])
+
+    def test_200_cursor(self):
+        boxes = self._create_n_boxes(12)
+        desc_sorted_boxes = sorted(boxes, key=lambda box: box.name, reverse=True)
+        attrs = {
+            'sortby': 'name',
+            'direction': 'DESC',
+            'limit': 5,
+            'cursor': '',
+        }
+        resp_entities = []
+        for _ in range(3):
+            resp_json = self.call_route_assert_code(200, attrs)
+            resp_entities.extend(models.Box(*entity_json.values()) for entity_json in resp_json['body'])
+            attrs['cursor'] = resp_json['next_cursor']
+        self.assertIsNone(attrs['cursor'])
+        self.assertListEqual(resp_entities, desc_sorted_boxes)
+
+    def test_200_cursor_stable_after_insert(self):
+        self._create_n_boxes(4)
+        attrs = {
+            'limit': 2,
+            'cursor': '',
+        }
+        first_json = self.call_route_assert_code(200, attrs)
+        first_page = [entity_json[models.Box.id_name] for entity_json in first_json['body']]
+
+        # Insert a box that sorts before the whole first page
+        conn, cursor = common.get_db_connection()
+        cursor.execute(f'INSERT INTO {models.Box.table_name} VALUES (?, ?)', ('00000000', 'tst-box-list-first'))
+        conn.commit()
+
+        attrs['cursor'] = first_json['next_cursor']
+        second_json = self.call_route_assert_code(200, attrs)
+        second_page = [entity_json[models.Box.id_name] for entity_json in second_json['body']]
+        self.assertEqual(2, len(second_page))
+        self.assertTrue(all(box_id > first_page[-1] for box_id in second_page))
+
+    def test_400_cursor_malformed(self):
+        attrs = {
+            'cursor': 'bm90LWpzb24',
+        }
+        self.call_route_assert_code(400, attrs, 'cursor is malformed')
+
+    def test_400_cursor_with_offset(self):
+        attrs = {
+            'cursor': '',
+            'offset': 5,
+        }
+        self.call_route_assert_code(400, attrs, 'offset cannot be combined with cursor')
+
+    def test_200_after_writes(self):
+        boxes = self._create_n_boxes(3)
+        attrs = {
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(200, attrs)
+
+        create_attrs = {
+            'name': 'tst-box-list-created',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        create_response = self.client.post('/api/box/create', data=create_attrs)
+        boxes.append(models.Box(*json.loads(create_response.data)['body'][0].values()))
+        update_attrs = {
+            models.Box.id_name: boxes[0].box_id,
+            'name': 'tst-box-list-updated',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/box/update', data=update_attrs)
+        boxes[0].name = update_attrs['name']
+        delete_attrs = {
+            models.Box.id_name: boxes[1].box_id,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/box/delete', data=delete_attrs)
+        boxes.pop(1)
+
+        resp_json = self.call_route_assert_code(200, attrs)
+        resp_entities = [models.Box(*entity_json.values()) for entity_json in resp_json['body']]
+        self.assertListEqual(resp_entities, boxes)
+
     def test_400_limit_malformed(self):
         attrs = {
             'limit': '*',
@@ -308,5 +465,78 @@ class TestBoxesList(tstutil.TestBase):
         return self.client.get(url)
 
 
+class TestBoxItems(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.boxes = []
+        for k in range(2):
+            create_attrs = {
+                'name': f'tst-box-items-{k}',
+                auth.API_KEY_NAME: self.superuser.api_key,
+            }
+            create_response = self.client.post('/api/box/create', data=create_attrs)
+            self.boxes.append(models.Box(*json.loads(create_response.data)['body'][0].values()))
+        self.items = [tstutil.create_item(self.superuser, k, box_id=self.boxes[k % 2].box_id) for k in range(5)]
+
+    def _count(self, box_id: str) -> int:
+        resp = self.client.get(f'/api/box/{box_id}/items/count')
+        self.assertEqual(200, resp.status_code, resp.data)
+        return json.loads(resp.data)['body'][0]['count']
+
+    def test_200(self):
+        resp_json = self.call_route_assert_code(200)
+        self.assertListEqual([self.items[k].to_dict() for k in (0, 2, 4)], resp_json['body'])
+
+    def test_200_paginated(self):
+        resp_json = self.call_route_assert_code(200, {'sortby': 'quantity', 'direction': 'DESC', 'limit': 2})
+        self.assertListEqual([self.items[4].item_id, self.items[2].item_id], [
+            item_json[models.Item.id_name] for item_json in resp_json['body']
+        ])
+
+    def test_200_where(self):
+        resp_json = self.call_route_assert_code(200, {'where': 'quantity.lt.3'})
+        self.assertListEqual([self.items[k].to_dict() for k in (0, 2)], resp_json['body'])
+
+    def test_200_count(self):
+        self.assertEqual(3, self._count(self.boxes[0].box_id))
+        self.assertEqual(2, self._count(self.boxes[1].box_id))
+
+    def test_200_count_after_writes(self):
+        self.assertEqual(3, self._count(self.boxes[0].box_id))
+        tstutil.create_item(self.superuser, 5, box_id=self.boxes[0].box_id)
+        self.assertEqual(4, self._count(self.boxes[0].box_id))
+
+        update_attrs = {
+            models.Item.id_name: self.items[0].item_id,
+            models.Box.id_name: self.boxes[1].box_id,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/item/update', data=update_attrs)
+        self.assertEqual(3, self._count(self.boxes[0].box_id))
+        self.assertEqual(3, self._count(self.boxes[1].box_id))
+
+        delete_attrs = {
+            models.Item.id_name: self.items[1].item_id,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/item/delete', data=delete_attrs)
+        self.assertEqual(2, self._count(self.boxes[1].box_id))
+
+    def test_400_malformed_id(self):
+        resp = self.client.get('/api/box/*/items')
+        self.assertEqual(400, resp.status_code)
+
+    def test_404_nonexistent_box(self):
+        box_id = Identifier(length=models.Box.id_length)
+        for url in (f'/api/box/{box_id}/items', f'/api/box/{box_id}/items/count'):
+            resp = self.client.get(url)
+            self.assertEqual(404, resp.status_code)
+            self.assertEqual('Box does not exist', json.loads(resp.data)['body'][0]['description'])
+
+    def call_route(self, attrs: Optional[Dict[str, str]] = None):
+        params = tstutil.attrs_to_params(attrs or {})
+        return self.client.get(f'/api/box/{self.boxes[0].box_id}/items?{params}')
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,17 @@
+import io
+import json
+import unittest
 from typing import Dict
+from typing import Optional
 
 import auth
+import common
+import db
+import migrations
 import models
 import tstutil
+import werkzeug.datastructures
+from identifier import Identifier
 
 
 class TestItemCreate(tstutil.TestBase, tstutil.AuthorizedTests):
@@ -15,6 +24,117 @@ class TestItemCreate(tstutil.TestBase, tstutil.AuthorizedTests):
         return self.client.post('/api/item/create', data=attrs)
 
 
+class TestItemsCreateBulk(tstutil.TestBase, tstutil.AuthorizedTests):
+    scope = auth.Scope.ITEM_CREATE
+
+    def _item_attrs(self, k: int) -> Dict[str, str]:
+        return {
+            models.Box.id_name: 'box00000',
+            'mfg_part_number': f'tst-mfg-{k}',
+            'quantity': str(k),
+            'description': f'tst item {k}',
+            'digikey_part_number': f'tst-digikey-{k}',
+            'mouser_part_number': f'tst-mouser-{k}',
+            'jlcpcb_part_number': f'tst-jlcpcb-{k}',
+        }
+
+    def _count_items(self) -> int:
+        _, cursor = common.get_db_connection()
+        return cursor.execute(f'SELECT COUNT(*) FROM {models.Item.table_name}').fetchone()[0]
+
+    def test_200(self):
+        items = [self._item_attrs(k) for k in range(3)]
+        items[1]['quantity'] = 1  # Non-string JSON values are accepted
+        attrs = {
+            'items': json.dumps(items),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        self.assertEqual(3, len(resp_json['body']))
+        item_ids = set()
+        for row_idx, outcome in enumerate(resp_json['body']):
+            self.assertEqual(200, outcome['code'])
+            self.assertEqual(row_idx, outcome['row'])
+            item_json = outcome['body'][0]
+            self.assertEqual(f'tst-mfg-{row_idx}', item_json['mfg_part_number'])
+            self.assertEqual(row_idx, item_json['quantity'])
+            self.assertEqual(self.superuser.user_id, item_json['created_by'])
+            item_ids.add(Identifier(length=models.Item.id_length, id_=item_json[models.Item.id_name]))
+        self.assertEqual(3, len(item_ids))
+        self.assertEqual(3, self._count_items())
+
+    def test_200_csv(self):
+        items = [self._item_attrs(k) for k in range(2)]
+        csv_text = ','.join(items[0].keys()) + '\n' + '\n'.join(','.join(item.values()) for item in items)
+        attrs = {
+            'items': (io.BytesIO(csv_text.encode()), 'items.csv'),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        self.assertListEqual([200, 200], [outcome['code'] for outcome in resp_json['body']])
+        self.assertEqual(2, self._count_items())
+
+    def test_200_invalid_rows_skipped(self):
+        items = [self._item_attrs(k) for k in range(3)]
+        items[0].pop('description')
+        items[2]['quantity'] = 'many'
+        attrs = {
+            'items': json.dumps(items),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        outcomes = resp_json['body']
+        self.assertListEqual([400, 200, 400], [outcome['code'] for outcome in outcomes])
+        self.assertEqual('description was not found in request', outcomes[0]['body'][0]['description'])
+        self.assertEqual('quantity could not be converted to type int', outcomes[2]['body'][0]['description'])
+        self.assertEqual(1, self._count_items())
+
+    def test_200_null_missing(self):
+        items = [self._item_attrs(k) for k in range(2)]
+        items[0]['description'] = None
+        attrs = {
+            'items': json.dumps(items),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        outcomes = resp_json['body']
+        self.assertListEqual([400, 200], [outcome['code'] for outcome in outcomes])
+        self.assertEqual('description was not found in request', outcomes[0]['body'][0]['description'])
+
+    def test_400_nested_value(self):
+        items = [self._item_attrs(k) for k in range(2)]
+        items[1]['description'] = {'text': 'tst'}
+        attrs = {
+            'items': json.dumps(items),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'items row 1 description was not a string or number')
+        self.assertEqual(0, self._count_items())
+
+    def test_400_no_items(self):
+        attrs = {
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'items was not found in request')
+
+    def test_400_malformed_items(self):
+        attrs = {
+            'items': '[{',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'items was malformed')
+
+    def test_400_empty_items(self):
+        attrs = {
+            'items': '[]',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'items was empty')
+
+    def call_route(self, attrs: Dict[str, str]):
+        return self.client.post('/api/items/create_bulk', data=attrs)
+
+
 class ItemGetTestBase(tstutil.IdTests):
     entity_type = models.Item
 
@@ -45,12 +165,199 @@ class TestItemUpdate(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.IdTests)
     entity_type = models.Item
 
     def test_200(self):
-        pass
+        create_attrs = {
+            models.Box.id_name: 'box00000',
+            'mfg_part_number': 'tst-mfg',
+            'quantity': 1,
+            'description': 'tst item',
+            'digikey_part_number': 'tst-digikey',
+            'mouser_part_number': 'tst-mouser',
+            'jlcpcb_part_number': 'tst-jlcpcb',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        response = self.client.post('/api/item/create', data=create_attrs)
+        item_json = json.loads(response.data)['body'][0]
+
+        attrs = {
+            models.Item.id_name: item_json[models.Item.id_name],
+            'quantity': 5,
+            'description': 'tst item updated',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        self.assert_single_entity(
+            resp_json, {
+                **item_json,
+                'quantity': attrs['quantity'],
+                'description': attrs['description'],
+            },
+        )
 
     def call_route(self, attrs: Dict[str, str]):
         return self.client.post('/api/item/update', data=attrs)
 
 
+class TestItemsUpdateBulk(tstutil.TestBase, tstutil.AuthorizedTests):
+    scope = auth.Scope.ITEM_UPDATE
+
+    def setUp(self):
+        super().setUp()
+        self.items = [tstutil.create_item(self.superuser, k) for k in range(3)]
+
+    def test_200(self):
+        missing_id = Identifier(length=models.Item.id_length)
+        item_ids = [self.items[2].item_id, missing_id, self.items[0].item_id]
+        attrs = {
+            'item_ids': ','.join(item_ids),
+            models.Box.id_name: 'box00001',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        outcomes = resp_json['body']
+        self.assertListEqual(item_ids, [outcome[models.Item.id_name] for outcome in outcomes])
+        self.assertListEqual([200, 404, 200], [outcome['code'] for outcome in outcomes])
+        self.assertEqual('box00001', outcomes[0]['body'][0][models.Box.id_name])
+        self.assertEqual('Item does not exist', outcomes[1]['body'][0]['description'])
+        self.assertEqual('box00000', self._get_item(self.items[1].item_id)[models.Box.id_name])
+
+    def test_200_patches(self):
+        patches = [
+            {models.Item.id_name: self.items[0].item_id, 'quantity': 10},
+            {models.Item.id_name: self.items[1].item_id, 'created_by': 'u' * models.User.id_length},
+            {
+                models.Item.id_name: self.items[2].item_id,
+                'description': 'tst item moved',
+                models.Box.id_name: 'box00002',
+            },
+        ]
+        attrs = {
+            'patches': json.dumps(patches),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        outcomes = resp_json['body']
+        self.assertListEqual([200, 400, 200], [outcome['code'] for outcome in outcomes])
+        self.assertEqual(10, outcomes[0]['body'][0]['quantity'])
+        self.assertEqual('Immutable property created_by found in request body', outcomes[1]['body'][0]['description'])
+        self.assertEqual('tst item moved', outcomes[2]['body'][0]['description'])
+        self.assertEqual('box00002', outcomes[2]['body'][0][models.Box.id_name])
+
+    def test_400_no_item_ids(self):
+        attrs = {
+            'quantity': 1,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'item_ids was not found in request')
+
+    def test_400_no_update_properties(self):
+        attrs = {
+            'item_ids': self.items[0].item_id,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'No attributes to be updated were provided')
+
+    def test_400_immutable_property(self):
+        attrs = {
+            'item_ids': self.items[0].item_id,
+            'created_epoch_millis': 0,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'Immutable property created_epoch_millis found in request body')
+
+    def _get_item(self, item_id: str):
+        return json.loads(self.client.get(f'/api/item/get/{item_id}').data)['body'][0]
+
+    def call_route(self, attrs: Dict[str, str]):
+        return self.client.post('/api/items/update_bulk', data=attrs)
+
+
+class TestItemsDeleteBulk(tstutil.TestBase, tstutil.AuthorizedTests):
+    scope = auth.Scope.ITEM_DELETE
+
+    def test_200(self):
+        items = [tstutil.create_item(self.superuser, k) for k in range(3)]
+        missing_id = Identifier(length=models.Item.id_length)
+        item_ids = [items[0].item_id, missing_id, items[2].item_id]
+        attrs = {
+            'item_ids': ','.join(item_ids),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        outcomes = resp_json['body']
+        self.assertListEqual([200, 404, 200], [outcome['code'] for outcome in outcomes])
+        self.assertEqual(items[0].to_dict(), outcomes[0]['body'][0])
+        self.assertEqual(404, self.client.get(f'/api/item/get/{items[0].item_id}').status_code)
+        self.assertEqual(200, self.client.get(f'/api/item/get/{items[1].item_id}').status_code)
+
+    def test_400_malformed_item_ids(self):
+        attrs = {
+            'item_ids': '*',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'item_ids was malformed')
+
+    def test_400_empty_item_ids(self):
+        attrs = {
+            'item_ids': ',',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'item_ids was empty')
+
+    def call_route(self, attrs: Dict[str, str]):
+        return self.client.post('/api/items/delete_bulk', data=attrs)
+
+
+class TestItemsAdjust(tstutil.TestBase, tstutil.AuthorizedTests):
+    scope = auth.Scope.ITEM_UPDATE
+
+    def setUp(self):
+        super().setUp()
+        self.items = [tstutil.create_item(self.superuser, k) for k in (5, 2)]
+
+    def _adjust(self, adjustments):
+        rows = [{models.Item.id_name: item_id, 'delta': delta} for item_id, delta in adjustments]
+        return {
+            'adjustments': json.dumps(rows),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+
+    def _get_quantity(self, item: models.Item) -> int:
+        return json.loads(self.client.get(f'/api/item/get/{item.item_id}').data)['body'][0]['quantity']
+
+    def test_200(self):
+        resp_json = self.call_route_assert_code(200, self._adjust([
+            (self.items[0].item_id, -5),
+            (self.items[1].item_id, 3),
+        ]))
+        self.assertListEqual([0, 5], [item_json['quantity'] for item_json in resp_json['body']])
+        self.assertListEqual([0, 5], [self._get_quantity(item) for item in self.items])
+
+    def test_400_negative_quantity(self):
+        self.call_route_assert_code(400, self._adjust([
+            (self.items[0].item_id, -1),
+            (self.items[1].item_id, -3),
+        ]), f'Insufficient quantity of item {self.items[1].item_id}. Adjusted by -3, had 2')
+        self.assertListEqual([5, 2], [self._get_quantity(item) for item in self.items])
+
+    def test_400_malformed_delta(self):
+        attrs = {
+            'adjustments': json.dumps([{models.Item.id_name: self.items[0].item_id, 'delta': 'many'}]),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'delta could not be converted to type int')
+
+    def test_404_nonexistent_item(self):
+        missing_id = Identifier(length=models.Item.id_length)
+        self.call_route_assert_code(404, self._adjust([
+            (self.items[0].item_id, 1),
+            (missing_id, 1),
+        ]), f'Item {missing_id} does not exist')
+        self.assertEqual(5, self._get_quantity(self.items[0]))
+
+    def call_route(self, attrs: Dict[str, str]):
+        return self.client.post('/api/items/adjust', data=attrs)
+
+
 class TestItemDelete(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.IdTests):
     scope = auth.Scope.ITEM_DELETE
     entity_type = models.Item
@@ -62,6 +369,262 @@ class TestItemDelete(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.IdTests)
         return self.client.post('/api/item/delete', data=attrs)
 
 
+class TestItemReservations(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.items = [tstutil.create_item(self.superuser, 10) for _ in range(2)]
+        self.reservations = [
+            tstutil.create_reservation(self.superuser, self.items[k % 2], k + 1) for k in range(3)
+        ]
+
+    def test_200(self):
+        resp_json = self.call_route_assert_code(200)
+        self.assertListEqual([self.reservations[k].to_dict() for k in (0, 2)], resp_json['body'])
+
+    def test_200_quantity(self):
+        resp = self.client.get(f'/api/item/{self.items[0].item_id}/reservations/quantity')
+        self.assertEqual(200, resp.status_code, resp.data)
+        self.assertEqual(4, json.loads(resp.data)['body'][0]['quantity'])
+
+    def test_200_quantity_expired(self):
+        tstutil.create_reservation(self.superuser, self.items[0], 5, expires_epoch_millis=common.time_ms() - 1)
+        resp = self.client.get(f'/api/item/{self.items[0].item_id}/reservations/quantity')
+        self.assertEqual(4, json.loads(resp.data)['body'][0]['quantity'])
+
+    def test_400_malformed_id(self):
+        self.assertEqual(400, self.client.get('/api/item/*/reservations/quantity').status_code)
+
+    def test_404_nonexistent_item(self):
+        item_id = Identifier(length=models.Item.id_length)
+        self.assertEqual(404, self.client.get(f'/api/item/{item_id}/reservations').status_code)
+
+    def call_route(self, attrs: Optional[Dict[str, str]] = None):
+        params = tstutil.attrs_to_params(attrs or {})
+        return self.client.get(f'/api/item/{self.items[0].item_id}/reservations?{params}')
+
+
+class TestItemsByPart(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.items = [tstutil.create_item(self.superuser, k) for k in range(2)]
+
+    def test_200(self):
+        for column in ('mfg', 'digikey', 'mouser', 'jlcpcb'):
+            resp_json = self.call_route_assert_code(200, {f'{column}_part_number': f'tst-{column}-1'})
+            self.assertListEqual([self.items[1].to_dict()], resp_json['body'])
+
+    def test_200_many(self):
+        item = tstutil.create_item(self.superuser, 1)
+        resp_json = self.call_route_assert_code(200, {'digikey_part_number': 'tst-digikey-1'})
+        self.assertListEqual(
+            sorted([self.items[1].item_id, item.item_id]),
+            [item_json[models.Item.id_name] for item_json in resp_json['body']],
+        )
+
+    def test_200_exact(self):
+        for part_number in ('tst-digikey', 'TST-DIGIKEY-1', 'tst-digikey-10'):
+            resp_json = self.call_route_assert_code(200, {'digikey_part_number': part_number})
+            self.assertListEqual([], resp_json['body'])
+
+    def test_400_no_part_number(self):
+        self.call_route_assert_code(
+            400, {}, 'Expected exactly one of mfg_part_number, digikey_part_number, mouser_part_number, '
+                     'jlcpcb_part_number in request',
+        )
+
+    def test_400_many_part_numbers(self):
+        attrs = {
+            'mfg_part_number': 'tst-mfg-1',
+            'mouser_part_number': 'tst-mouser-1',
+        }
+        self.call_route_assert_code(
+            400, attrs, 'Expected exactly one of mfg_part_number, digikey_part_number, mouser_part_number, '
+                        'jlcpcb_part_number in request',
+        )
+
+    def test_400_malformed_part_number(self):
+        self.call_route_assert_code(400, {'mouser_part_number': '*'}, 'mouser_part_number was malformed')
+
+    def test_indexed(self):
+        _, cursor = common.get_db_connection()
+        res = cursor.execute(
+            f'EXPLAIN QUERY PLAN SELECT * FROM {models.Item.table_name} WHERE digikey_part_number=?', ('',),
+        )
+        self.assertIn('USING INDEX ix_items_digikey_part_number', ' '.join(row[-1] for row in res.fetchall()))
+
+    def call_route(self, attrs: Dict[str, str]):
+        params = tstutil.attrs_to_params(attrs)
+        return self.client.get(f'/api/items/by_part?{params}')
+
+
+@unittest.skipUnless(migrations.FULL_TEXT_SEARCH, 'Full-text search is not supported')
+class TestItemsSearch(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.items = [tstutil.create_item(self.superuser, k) for k in range(3)]
+
+    def _search(self, q: str, **attrs) -> Dict:
+        return self.call_route_assert_code(200, {'q': q, **attrs})
+
+    def _search_ids(self, q: str, **attrs):
+        return [item_json[models.Item.id_name] for item_json in self._search(q, **attrs)['body']]
+
+    def test_200(self):
+        resp_json = self._search('tst-mouser-1')
+        self.assertListEqual([self.items[1].to_dict()], resp_json['body'])
+
+    def test_200_prefix(self):
+        self.assertCountEqual([item.item_id for item in self.items], self._search_ids('tst-jlc'))
+
+    def test_200_all_terms_match(self):
+        self.assertListEqual([self.items[2].item_id], self._search_ids('item 2'))
+        self.assertListEqual([], self._search_ids('item 3'))
+
+    def test_200_ranked(self):
+        # Matches in every part number rank above a single match in the description
+        item = tstutil.create_item(self.superuser, 3)
+        update_attrs = {
+            models.Item.id_name: self.items[0].item_id,
+            'description': 'tst item 0 replaces tst-mfg-3',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/item/update', data=update_attrs)
+        self.assertListEqual([item.item_id, self.items[0].item_id], self._search_ids('3'))
+
+    def test_200_limit_offset(self):
+        item_ids = self._search_ids('tst')
+        self.assertEqual(3, len(item_ids))
+        self.assertListEqual(item_ids[1:2], self._search_ids('tst', limit=1, offset=1))
+
+    def test_200_after_update(self):
+        update_attrs = {
+            models.Item.id_name: self.items[0].item_id,
+            'mfg_part_number': 'RC0603FR-0710KL',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/item/update', data=update_attrs)
+        self.assertListEqual([self.items[0].item_id], self._search_ids('0710'))
+        self.assertListEqual([], self._search_ids('tst-mfg-0'))
+
+    def test_200_after_delete(self):
+        delete_attrs = {
+            models.Item.id_name: self.items[1].item_id,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/item/delete', data=delete_attrs)
+        self.assertListEqual([], self._search_ids('tst-mfg-1'))
+
+    def test_400_no_q(self):
+        self.call_route_assert_code(400, {}, 'q was not found in request')
+
+    def test_400_malformed_q(self):
+        self.call_route_assert_code(400, {'q': '"tst"'}, 'q was malformed')
+
+    def call_route(self, attrs: Dict[str, str]):
+        params = tstutil.attrs_to_params(attrs)
+        return self.client.get(f'/api/items/search?{params}')
+
+
+@unittest.skipUnless(migrations.FUZZY_SEARCH, 'Fuzzy search is not supported')
+class TestItemsFuzzy(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.items = [tstutil.create_item(self.superuser, k) for k in range(2)]
+        update_attrs = {
+            models.Item.id_name: self.items[0].item_id,
+            'mfg_part_number': 'GRM188R71H104KA93D',
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/item/update', data=update_attrs)
+
+    def _fuzzy_ids(self, q: str, **attrs):
+        resp_json = self.call_route_assert_code(200, {'q': q, **attrs})
+        return [item_json[models.Item.id_name] for item_json in resp_json['body']]
+
+    def test_200(self):
+        self.assertListEqual([self.items[0].item_id], self._fuzzy_ids('GRM188R71H104KA93'))
+
+    def test_200_normalized(self):
+        self.assertListEqual([self.items[0].item_id], self._fuzzy_ids('grm188r71h-104ka93.d'))
+
+    def test_200_swapped_characters(self):
+        self.assertListEqual([self.items[0].item_id], self._fuzzy_ids('GRM188R17H104KA93D'))
+
+    def test_200_ranked(self):
+        item_ids = self._fuzzy_ids('TSTMOUSER0')
+        self.assertListEqual([self.items[0].item_id, self.items[1].item_id], item_ids)
+
+    def test_200_dissimilar(self):
+        self.assertListEqual([], self._fuzzy_ids('GRM155R61A105KE15D'))
+
+    def test_200_after_delete(self):
+        delete_attrs = {
+            models.Item.id_name: self.items[0].item_id,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/item/delete', data=delete_attrs)
+        self.assertListEqual([], self._fuzzy_ids('GRM188R71H104KA93'))
+
+    def test_400_no_q(self):
+        self.call_route_assert_code(400, {}, 'q was not found in request')
+
+    def test_400_short_q(self):
+        self.call_route_assert_code(400, {'q': 'G-R'}, "q must have at least 3 characters other than '-_./ '")
+
+    def call_route(self, attrs: Dict[str, str]):
+        params = tstutil.attrs_to_params(attrs)
+        return self.client.get(f'/api/items/fuzzy?{params}')
+
+
+class TestItemsGetMany(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.items = [tstutil.create_item(self.superuser, k) for k in range(3)]
+
+    def test_200(self):
+        missing_id = Identifier(length=models.Item.id_length)
+        item_ids = [self.items[2].item_id, missing_id, self.items[0].item_id, self.items[2].item_id]
+        attrs = {
+            'item_ids': ','.join(item_ids),
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        outcomes = resp_json['body']
+        self.assertListEqual(item_ids[:3], [outcome[models.Item.id_name] for outcome in outcomes])
+        self.assertListEqual([200, 404, 200], [outcome['code'] for outcome in outcomes])
+        self.assertEqual(self.items[2].to_dict(), outcomes[0]['body'][0])
+        self.assertEqual('Item does not exist', outcomes[1]['body'][0]['description'])
+        self.assertEqual(self.items[0].to_dict(), outcomes[2]['body'][0])
+
+    def test_200_without_scope(self):
+        # Like getting a single item, getting many items requires no scope
+        user = tstutil.create_user(auth.Scope.BOX_GET)
+        attrs = {
+            'item_ids': self.items[0].item_id,
+            auth.API_KEY_NAME: user.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        self.assertEqual(self.items[0].to_dict(), resp_json['body'][0]['body'][0])
+
+    def test_400_no_ids(self):
+        self.call_route_assert_code(400, {}, 'item_ids was not found in request')
+
+    def test_400_malformed_ids(self):
+        attrs = {
+            'item_ids': '*',
+        }
+        self.call_route_assert_code(400, attrs, 'item_ids was malformed')
+
+    def test_400_too_many_ids(self):
+        attrs = {
+            'item_ids': ','.join(str(k).zfill(models.Item.id_length) for k in range(common.GET_MANY_MAX_IDS + 1)),
+        }
+        self.call_route_assert_code(400, attrs, f'item_ids had more than {common.GET_MANY_MAX_IDS} IDs')
+
+    def call_route(self, attrs: Dict[str, str]):
+        params = tstutil.attrs_to_params(attrs)
+        return self.client.get(f'/api/items/get_many?{params}')
+
+
 class TestItemsList(tstutil.TestBase):
     def test_200(self):
         pass
@@ -75,3 +638,136 @@ class TestItemsListGET(TestItemsList):
         params = tstutil.attrs_to_params(attrs)
         url = f'/api/items/list?{params}'
         return self.client.get(url)
+
+
+class TestItemsListWhere(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        self.items = [tstutil.create_item(self.superuser, k, box_id=f'box0000{k % 2}') for k in range(8)]
+
+    def _list_ids(self, params: str):
+        resp = self.client.get(f'/api/items/list?{params}')
+        self.assertEqual(200, resp.status_code, resp.data)
+        return [item_json[models.Item.id_name] for item_json in json.loads(resp.data)['body']]
+
+    def _expected_ids(self, predicate):
+        return [item.item_id for item in self.items if predicate(item)]
+
+    def test_200(self):
+        self.assertListEqual(
+            self._expected_ids(lambda item: item.quantity < 5 and item.box_id == 'box00001'),
+            self._list_ids('where=quantity.lt.5&where=box_id.eq.box00001'),
+        )
+
+    def test_200_gt(self):
+        self.assertListEqual(self._expected_ids(lambda item: item.quantity > 5), self._list_ids('where=quantity.gt.5'))
+
+    def test_200_in(self):
+        self.assertListEqual(
+            self._expected_ids(lambda item: item.quantity in (1, 4, 6)),
+            self._list_ids('where=quantity.in.1,4,6'),
+        )
+
+    def test_200_prefix(self):
+        item = tstutil.create_item(self.superuser, 10)
+        self.items.append(item)
+        self.assertListEqual(
+            self._expected_ids(lambda item: item.mfg_part_number.startswith('tst-mfg-1')),
+            self._list_ids('where=mfg_part_number.prefix.tst-mfg-1'),
+        )
+
+    def test_200_sorted_cursor(self):
+        params = 'where=box_id.eq.box00000&sortby=quantity&direction=DESC&limit=2&cursor='
+        expected_ids = self._expected_ids(lambda item: item.box_id == 'box00000')[::-1]
+        resp_json = json.loads(self.client.get(f'/api/items/list?{params}').data)
+        item_ids = [item_json[models.Item.id_name] for item_json in resp_json['body']]
+        resp_json = json.loads(self.client.get(f'/api/items/list?{params}{resp_json["next_cursor"]}').data)
+        item_ids += [item_json[models.Item.id_name] for item_json in resp_json['body']]
+        self.assertListEqual(expected_ids, item_ids)
+        self.assertIsNone(resp_json['next_cursor'])
+
+    def test_200_sorted_cursor_null(self):
+        conn, cursor = common.get_db_connection()
+        null_ids = [item.item_id for item in self.items[::3]]
+        cursor.executemany(
+            f'UPDATE {models.Item.table_name} SET mfg_part_number=NULL WHERE item_id=?', [(id_,) for id_ in null_ids],
+        )
+        conn.commit()
+        expected_ids = [item.item_id for item in sorted(self.items, key=lambda item: (
+            item.item_id not in null_ids, '' if item.item_id in null_ids else item.mfg_part_number, item.item_id,
+        ))]
+        for direction, expected in (('ASC', expected_ids), ('DESC', expected_ids[::-1])):
+            item_ids, next_cursor = [], ''
+            while next_cursor is not None:
+                params = f'sortby=mfg_part_number&direction={direction}&limit=2&cursor={next_cursor}'
+                resp = self.client.get(f'/api/items/list?{params}')
+                self.assertEqual(200, resp.status_code, resp.data)
+                resp_json = json.loads(resp.data)
+                item_ids += [item_json[models.Item.id_name] for item_json in resp_json['body']]
+                next_cursor = resp_json['next_cursor']
+            self.assertListEqual(expected, item_ids)
+
+    def test_200_count(self):
+        resp_json = json.loads(self.client.get('/api/items/count?where=quantity.lt.5&where=box_id.eq.box00001').data)
+        self.assertEqual(2, resp_json['body'][0]['count'])
+
+    def test_200_count_counted_column(self):
+        resp_json = json.loads(self.client.get(f'/api/items/count?where=created_by.eq.{self.superuser.user_id}').data)
+        self.assertEqual(8, resp_json['body'][0]['count'])
+        resp_json = json.loads(self.client.get('/api/items/count?where=box_id.eq.box00009').data)
+        self.assertEqual(0, resp_json['body'][0]['count'])
+
+    def test_200_count_after_bulk_writes(self):
+        delete_attrs = {
+            'item_ids': ','.join(item.item_id for item in self.items[:3]),
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.client.post('/api/items/delete_bulk', data=delete_attrs)
+        self.assertEqual(5, json.loads(self.client.get('/api/items/count').data)['body'][0]['count'])
+        resp_json = json.loads(self.client.get('/api/items/count?where=box_id.eq.box00000').data)
+        self.assertEqual(2, resp_json['body'][0]['count'])
+
+    def test_200_after_writes(self):
+        self.assertEqual(4, len(self._list_ids('where=box_id.eq.box00001')))
+        tstutil.create_item(self.superuser, 9, box_id='box00001')
+        self.assertEqual(5, len(self._list_ids('where=box_id.eq.box00001')))
+
+    def test_400_prefix_not_text(self):
+        self.call_route_assert_code(400, {'where': 'quantity.prefix.5'}, (
+            'quantity filter operator prefix is only valid on text attributes'
+        ))
+
+    def test_400_prefix_empty(self):
+        self.call_route_assert_code(400, {'where': 'description.prefix.'}, 'description filter prefix cannot be empty')
+
+    def test_400_malformed(self):
+        self.call_route_assert_code(400, {'where': 'quantity.lt'}, (
+            'quantity.lt is not a valid filter, expected <attribute>.<operator>.<value>'
+        ))
+
+    def test_400_invalid_key(self):
+        self.call_route_assert_code(400, {'where': 'rowid.eq.1'}, 'rowid is not a valid filter key')
+
+    def test_400_invalid_operator(self):
+        self.call_route_assert_code(400, {'where': 'quantity.ne.1'}, (
+            'ne is not a valid filter operator, expected one of eq, lt, gt, in, prefix'
+        ))
+
+    def test_400_invalid_value(self):
+        self.call_route_assert_code(400, {'where': 'quantity.lt.few'}, (
+            'quantity filter value could not be converted to type int'
+        ))
+
+    def test_indexed(self):
+        _, cursor = common.get_db_connection()
+        conditions, params = db.compile_filters(db.get_filters(models.Item, werkzeug.datastructures.MultiDict([
+            ('where', 'mfg_part_number.prefix.GRM'),
+        ])))
+        res = cursor.execute(
+            f'EXPLAIN QUERY PLAN SELECT * FROM {models.Item.table_name} WHERE {" AND ".join(conditions)}', params,
+        )
+        self.assertIn('USING INDEX ix_items_mfg_part_number', ' '.join(row[-1] for row in res.fetchall()))
+
+    def call_route(self, attrs: Dict[str, str]):
+        params = tstutil.attrs_to_params(attrs)
+        return self.client.get(f'/api/items/list?{params}')
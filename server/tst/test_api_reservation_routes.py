@@ -1,15 +1,81 @@
+import json
 from typing import Dict
 
 import auth
+import common
+import db
 import models
 import tstutil
+from identifier import Identifier
 
 
 class TestReservationCreate(tstutil.TestBase, tstutil.AuthorizedTests):
     scope = auth.Scope.RESERVATION_CREATE
 
+    def setUp(self):
+        super().setUp()
+        self.item = tstutil.create_item(self.superuser, 5)
+
+    def _reserve(self, quantity: int, item_id: str = None):
+        return {
+            models.Item.id_name: item_id or self.item.item_id,
+            'quantity': quantity,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+
     def test_200(self):
-        pass
+        resp_json = self.call_route_assert_code(200, self._reserve(3))
+        reservation_json = resp_json['body'][0]
+        self.assertEqual(self.superuser.user_id, reservation_json['user_id'])
+        self.assertEqual(self.item.item_id, reservation_json['item_id'])
+        self.assertEqual(3, reservation_json['quantity'])
+
+    def test_200_all_available(self):
+        self.call_route_assert_code(200, self._reserve(3))
+        self.call_route_assert_code(200, self._reserve(2))
+
+    def test_400_insufficient_quantity(self):
+        self.call_route_assert_code(400, self._reserve(6), 'Insufficient item quantity. Requested 6, had 5')
+
+    def test_400_already_reserved(self):
+        self.call_route_assert_code(200, self._reserve(3))
+        self.call_route_assert_code(400, self._reserve(3), 'Insufficient item quantity. Requested 3, had 2')
+        resp_json = json.loads(self.client.get('/api/reservations/count').data)
+        self.assertEqual(1, resp_json['body'][0]['count'])
+
+    def test_200_expired_ignored(self):
+        tstutil.create_reservation(self.superuser, self.item, 5, expires_epoch_millis=common.time_ms() - 1)
+        self.call_route_assert_code(200, self._reserve(5))
+
+    def test_200_expiry(self):
+        before = common.time_ms()
+        resp_json = self.call_route_assert_code(200, self._reserve(1))
+        self.assertGreaterEqual(resp_json['body'][0]['expires_epoch_millis'], before + common.RESERVATION_TTL_MILLIS)
+        attrs = {**self._reserve(1), 'expires_epoch_millis': before + 1000}
+        resp_json = self.call_route_assert_code(200, attrs)
+        self.assertEqual(before + 1000, resp_json['body'][0]['expires_epoch_millis'])
+
+    def test_400_not_positive(self):
+        self.call_route_assert_code(400, self._reserve(0), 'quantity must be positive')
+
+    def test_400_expired(self):
+        attrs = {**self._reserve(1), 'expires_epoch_millis': common.time_ms() - 1}
+        self.call_route_assert_code(400, attrs, 'expires_epoch_millis must be in the future')
+
+    def test_sweep_expired(self):
+        now = common.time_ms()
+        for _ in range(3):
+            tstutil.create_reservation(self.superuser, self.item, 1, expires_epoch_millis=now - 1)
+        tstutil.create_reservation(self.superuser, self.item, 1)
+        self.assertEqual(2, db.sweep_expired_reservations(batch_size=2))
+        self.assertEqual(1, db.sweep_expired_reservations(batch_size=2))
+        self.assertEqual(0, db.sweep_expired_reservations(batch_size=2))
+        resp_json = json.loads(self.client.get('/api/reservations/count').data)
+        self.assertEqual(1, resp_json['body'][0]['count'])
+
+    def test_404_nonexistent_item(self):
+        item_id = Identifier(length=models.Item.id_length)
+        self.call_route_assert_code(404, self._reserve(1, item_id), 'Item does not exist')
 
     def call_route(self, attrs: Dict[str, str]):
         return self.client.post('/api/reservation/create', data=attrs)
@@ -44,8 +110,50 @@ class TestReservationUpdate(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.I
     scope = auth.Scope.RESERVATION_UPDATE
     entity_type = models.Reservation
 
+    def setUp(self):
+        super().setUp()
+        self.item = tstutil.create_item(self.superuser, 5)
+        self.reservation = tstutil.create_reservation(self.superuser, self.item, 3)
+
+    def _update(self, **values):
+        return {
+            models.Reservation.id_name: self.reservation.reservation_id,
+            **values,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+
     def test_200(self):
-        pass
+        resp_json = self.call_route_assert_code(200, self._update(quantity=5))
+        self.assertEqual(5, resp_json['body'][0]['quantity'])
+
+    def test_200_expiry(self):
+        expires_epoch_millis = common.time_ms() + 1000
+        resp_json = self.call_route_assert_code(200, self._update(expires_epoch_millis=expires_epoch_millis))
+        self.assertEqual(expires_epoch_millis, resp_json['body'][0]['expires_epoch_millis'])
+        self.assertEqual(3, resp_json['body'][0]['quantity'])
+
+    def test_400_insufficient_quantity(self):
+        tstutil.create_reservation(self.superuser, self.item, 1)
+        self.call_route_assert_code(400, self._update(quantity=5), 'Insufficient item quantity. Requested 5, had 4')
+        resp_json = json.loads(self.client.get(f'/api/reservation/get/{self.reservation.reservation_id}').data)
+        self.assertEqual(3, resp_json['body'][0]['quantity'])
+
+    def test_400_extend_expired_past_available(self):
+        expired = tstutil.create_reservation(self.superuser, self.item, 3, expires_epoch_millis=common.time_ms() - 1)
+        attrs = {
+            models.Reservation.id_name: expired.reservation_id,
+            'expires_epoch_millis': common.time_ms() + 1000,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(400, attrs, 'Insufficient item quantity. Requested 3, had 2')
+
+    def test_400_immutable(self):
+        self.call_route_assert_code(400, self._update(item_id=self.item.item_id), (
+            'Immutable property item_id found in request body'
+        ))
+
+    def test_400_not_positive(self):
+        self.call_route_assert_code(400, self._update(quantity=0), 'quantity must be positive')
 
     def call_route(self, attrs: Dict[str, str]):
         return self.client.post('/api/reservation/update', data=attrs)
@@ -62,6 +170,61 @@ class TestReservationDelete(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.I
         return self.client.post('/api/reservation/delete', data=attrs)
 
 
+class TestReservationsGetMany(tstutil.TestBase):
+    def setUp(self):
+        super().setUp()
+        item = tstutil.create_item(self.superuser, 10)
+        self.reservations = [tstutil.create_reservation(self.superuser, item) for _ in range(3)]
+
+    def test_200(self):
+        missing_id = Identifier(length=models.Reservation.id_length)
+        reservation_ids = [
+            self.reservations[2].reservation_id, missing_id, self.reservations[0].reservation_id,
+            self.reservations[2].reservation_id,
+        ]
+        attrs = {
+            'reservation_ids': ','.join(reservation_ids),
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        outcomes = resp_json['body']
+        self.assertListEqual(reservation_ids[:3], [outcome[models.Reservation.id_name] for outcome in outcomes])
+        self.assertListEqual([200, 404, 200], [outcome['code'] for outcome in outcomes])
+        self.assertEqual(self.reservations[2].to_dict(), outcomes[0]['body'][0])
+        self.assertEqual('Reservation does not exist', outcomes[1]['body'][0]['description'])
+        self.assertEqual(self.reservations[0].to_dict(), outcomes[2]['body'][0])
+
+    def test_200_without_scope(self):
+        # Like getting a single reservation, getting many reservations requires no scope
+        user = tstutil.create_user(auth.Scope.ITEM_GET)
+        attrs = {
+            'reservation_ids': self.reservations[0].reservation_id,
+            auth.API_KEY_NAME: user.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        self.assertEqual(self.reservations[0].to_dict(), resp_json['body'][0]['body'][0])
+
+    def test_400_no_ids(self):
+        self.call_route_assert_code(400, {}, 'reservation_ids was not found in request')
+
+    def test_400_malformed_ids(self):
+        attrs = {
+            'reservation_ids': '*',
+        }
+        self.call_route_assert_code(400, attrs, 'reservation_ids was malformed')
+
+    def test_400_too_many_ids(self):
+        attrs = {
+            'reservation_ids': ','.join(
+                str(k).zfill(models.Reservation.id_length) for k in range(common.GET_MANY_MAX_IDS + 1)
+            ),
+        }
+        self.call_route_assert_code(400, attrs, f'reservation_ids had more than {common.GET_MANY_MAX_IDS} IDs')
+
+    def call_route(self, attrs: Dict[str, str]):
+        params = tstutil.attrs_to_params(attrs)
+        return self.client.get(f'/api/reservations/get_many?{params}')
+
+
 class TestReservationsList(tstutil.TestBase):
     def test_200(self):
         pass
@@ -1,6 +1,9 @@
+import json
 from typing import Dict
+from typing import Optional
 
 import auth
+import common
 import models
 import tstutil
 from identifier import Identifier
@@ -30,7 +33,12 @@ class TestUserCreate(tstutil.TestBase, tstutil.AuthorizedTests):
         pass
 
     def test_400_duplicate_name(self):
-        pass
+        attrs = {
+            auth.API_KEY_NAME: self.superuser.api_key,
+            'name': self.superuser.name,
+            'authmask': tstutil.max_authmask(),
+        }
+        self.call_route_assert_code(400, attrs, 'A user already exists with that name')
 
     def test_400_no_authmask(self):
         pass
@@ -60,7 +68,20 @@ class TestUserUpdate(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.IdTests)
     entity_type = models.User
 
     def test_200(self):
-        pass
+        user = tstutil.create_user(auth.Scope.BOX_CREATE)
+        attrs = {
+            models.User.id_name: user.user_id,
+            'authmask': auth.Scope.BOX_UPDATE.value,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        resp_json = self.call_route_assert_code(200, attrs)
+        self.assert_single_entity(
+            resp_json, {
+                models.User.id_name: user.user_id,
+                'name': user.name,
+                'authmask': attrs['authmask'],
+            },
+        )
 
     def test_400_no_update_properties(self):
         pass
@@ -74,6 +95,23 @@ class TestUserUpdate(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.IdTests)
     def test_500_duplicate_id(self):
         pass
 
+    def test_200_authmask_revoked(self):
+        user = tstutil.create_user(auth.Scope.BOX_CREATE)
+        box_attrs = {
+            'name': 'tst-user-update-box',
+            auth.API_KEY_NAME: user.api_key,
+        }
+        self.assertEqual(200, self.client.post('/api/box/create', data=box_attrs).status_code)
+
+        attrs = {
+            models.User.id_name: user.user_id,
+            'authmask': 0,
+            auth.API_KEY_NAME: self.superuser.api_key,
+        }
+        self.call_route_assert_code(200, attrs)
+        box_attrs['name'] = 'tst-user-update-box-revoked'
+        self.assertEqual(403, self.client.post('/api/box/create', data=box_attrs).status_code)
+
     def call_route(self, attrs: Dict[str, str]):
         return self.client.post('/api/user/update', data=attrs)
 
@@ -93,3 +131,71 @@ class TestUserDelete(tstutil.TestBase, tstutil.AuthorizedTests, tstutil.IdTests)
 
     def call_route(self, attrs: Dict[str, str]):
         return self.client.post('/api/user/delete', data=attrs)
+
+
+class TestUserReservations(tstutil.TestBase, tstutil.AuthorizedTests):
+    scope = auth.Scope.USER_GET
+
+    def setUp(self):
+        super().setUp()
+        # Users created by the authorization tests are named after their scope, so use the route's scope
+        self.user = tstutil.create_user(auth.Scope.USER_GET)
+        self.items = [tstutil.create_item(self.superuser, 10) for _ in range(2)]
+        self.reservations = [
+            tstutil.create_reservation(self.user, self.items[0], 2),
+            tstutil.create_reservation(self.superuser, self.items[0], 3),
+            tstutil.create_reservation(self.user, self.items[1], 4),
+        ]
+
+    def _get_quantity(self, user_id: str, api_key: Optional[str] = None):
+        return self.client.post(
+            f'/api/user/{user_id}/reservations/quantity',
+            data={auth.API_KEY_NAME: api_key or self.superuser.api_key},
+        )
+
+    def test_200(self):
+        resp_json = self.call_route_assert_code(200, {auth.API_KEY_NAME: self.superuser.api_key})
+        self.assertListEqual([self.reservations[k].to_dict() for k in (0, 2)], resp_json['body'])
+
+    def test_200_paginated(self):
+        resp_json = self.call_route_assert_code(200, {
+            'sortby': 'quantity', 'direction': 'DESC', 'limit': 1, auth.API_KEY_NAME: self.superuser.api_key,
+        })
+        self.assertListEqual([self.reservations[2].to_dict()], resp_json['body'])
+
+    def test_200_quantity(self):
+        resp = self._get_quantity(self.user.user_id)
+        self.assertEqual(200, resp.status_code, resp.data)
+        self.assertEqual(6, json.loads(resp.data)['body'][0]['quantity'])
+        tstutil.create_reservation(self.user, self.items[1], 1)
+        resp = self._get_quantity(self.user.user_id)
+        self.assertEqual(7, json.loads(resp.data)['body'][0]['quantity'])
+
+    def test_200_quantity_expired(self):
+        tstutil.create_reservation(self.user, self.items[1], 5, expires_epoch_millis=common.time_ms() - 1)
+        resp = self._get_quantity(self.user.user_id)
+        self.assertEqual(6, json.loads(resp.data)['body'][0]['quantity'])
+
+    def test_400_malformed_id(self):
+        resp = self.client.post('/api/user/*/reservations', data={auth.API_KEY_NAME: self.superuser.api_key})
+        self.assertEqual(400, resp.status_code)
+
+    def test_400_quantity_no_apikey(self):
+        self.assertEqual(400, self.client.post(f'/api/user/{self.user.user_id}/reservations/quantity').status_code)
+
+    def test_403_quantity_user_unauthorized(self):
+        api_key = tstutil.create_user(auth.Scope.RESERVATION_CREATE).api_key
+        self.assertEqual(403, self._get_quantity(self.user.user_id, api_key).status_code)
+
+    def test_404_nonexistent_user(self):
+        user_id = Identifier(length=models.User.id_length)
+        resp = self.client.post(f'/api/user/{user_id}/reservations', data={auth.API_KEY_NAME: self.superuser.api_key})
+        self.assertEqual(404, resp.status_code)
+        self.assertEqual(404, self._get_quantity(user_id).status_code)
+
+    def call_route(self, attrs: Optional[Dict[str, str]] = None):
+        params = dict(attrs or {})
+        data = {auth.API_KEY_NAME: params.pop(auth.API_KEY_NAME)} if auth.API_KEY_NAME in params else {}
+        return self.client.post(
+            f'/api/user/{self.user.user_id}/reservations?{tstutil.attrs_to_params(params)}', data=data,
+        )
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+import common
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'inventory.db')
+        self.pool = common.ConnectionPool(self.path)
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.directory.cleanup()
+
+    def test_reused_within_thread(self):
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+        self.assertIs(conn, self.pool.acquire())
+
+    def test_separate_between_threads(self):
+        conn = self.pool.acquire()
+        thread_conns = []
+        thread = threading.Thread(target=lambda: thread_conns.append(self.pool.acquire()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(conn, thread_conns[0])
+
+    def test_release_rolls_back(self):
+        conn = self.pool.acquire()
+        conn.execute('CREATE TABLE tst(value INTEGER)')
+        conn.execute('INSERT INTO tst VALUES (1)')
+        self.pool.release(conn)
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(0, self.pool.acquire().execute('SELECT COUNT(*) FROM tst').fetchone()[0])
+
+    def test_recycled_after_max_age(self):
+        self.pool.max_age_sec = 0
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+        self.assertIsNot(conn, self.pool.acquire())
+
+    def test_unhealthy_replaced(self):
+        conn = self.pool.acquire()
+        self.pool.release(conn)
+        conn.close()
+        new_conn = self.pool.acquire()
+        self.assertIsNot(conn, new_conn)
+        self.assertEqual(1, new_conn.execute('SELECT 1').fetchone()[0])
+
+    def test_readonly_rejects_writes(self):
+        conn = self.pool.acquire()
+        conn.execute('CREATE TABLE tst(value INTEGER)')
+        conn.commit()
+        readonly_pool = common.ConnectionPool(self.path, readonly=True)
+        try:
+            readonly_conn = readonly_pool.acquire()
+            self.assertEqual(0, readonly_conn.execute('SELECT COUNT(*) FROM tst').fetchone()[0])
+            with self.assertRaises(sqlite3.OperationalError):
+                readonly_conn.execute('INSERT INTO tst VALUES (1)')
+        finally:
+            readonly_pool.close_all()
+
+
+class TestSerializedConnection(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.writer = common.SerializedConnection(os.path.join(self.directory.name, 'inventory.db'))
+
+    def tearDown(self):
+        self.writer.close()
+        self.directory.cleanup()
+
+    def test_reentrant_within_thread(self):
+        conn = self.writer.acquire()
+        self.assertIs(conn, self.writer.acquire(timeout=0))
+        self.writer.release(conn)
+        self.writer.release(conn)
+
+    def test_serialized_between_threads(self):
+        conn = self.writer.acquire()
+        errors = []
+
+        def acquire_in_thread():
+            try:
+                self.writer.acquire(timeout=0.01)
+            except TimeoutError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=acquire_in_thread)
+        thread.start()
+        thread.join()
+        self.assertEqual(1, len(errors))
+
+        self.writer.release(conn)
+        thread_conns = []
+
+        def acquire_release_in_thread():
+            thread_conns.append(self.writer.acquire(timeout=1))
+            self.writer.release(thread_conns[0])
+
+        thread = threading.Thread(target=acquire_release_in_thread)
+        thread.start()
+        thread.join()
+        self.assertIs(conn, thread_conns[0])
+
+    def test_release_rolls_back(self):
+        conn = self.writer.acquire()
+        conn.execute('CREATE TABLE tst(value INTEGER)')
+        conn.execute('INSERT INTO tst VALUES (1)')
+        self.writer.release(conn)
+        self.assertFalse(conn.in_transaction)
+        self.assertEqual(0, self.writer.acquire().execute('SELECT COUNT(*) FROM tst').fetchone()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+
+import common
+import migrations
+import models
+
+
+LEGACY_TABLES = {
+    models.Item: 'item_id TEXT, box_id TEXT, mfg_part_number TEXT, quantity TEXT, description TEXT, '
+                 'digikey_part_number TEXT, mouser_part_number TEXT, jlcpcb_part_number TEXT, '
+                 'created_by TEXT, created_epoch_millis TEXT',
+    models.User: 'user_id TEXT, api_key TEXT, name TEXT, authmask TEXT',
+    models.Reservation: 'reservation_id TEXT, user_id TEXT, item_id TEXT, quantity TEXT',
+    models.Box: 'box_id TEXT, name TEXT',
+}
+
+
+class TestMigrate(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.conn = sqlite3.connect(self.path)
+
+    def tearDown(self):
+        self.conn.close()
+        os.remove(self.path)
+
+    def _create_legacy_tables(self):
+        cursor = self.conn.cursor()
+        for entity_type, table_keys in LEGACY_TABLES.items():
+            cursor.execute(f'CREATE TABLE {entity_type.table_name}({table_keys})')
+        self.conn.commit()
+
+    def _insert_boxes(self, n: int):
+        boxes = [(f'box{str(k).zfill(5)}', f'tst-box-{k}') for k in range(n)]
+        self.conn.executemany(f'INSERT INTO {models.Box.table_name} VALUES (?, ?)', boxes)
+        self.conn.commit()
+        return boxes
+
+    def _get_version(self):
+        return migrations.get_version(self.conn.cursor())
+
+    def _get_index_names(self, table_name: str):
+        res = self.conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=?", (table_name,))
+        return {row[0] for row in res.fetchall()}
+
+    def test_new_database(self):
+        self.assertEqual(0, migrations.migrate(self.conn))
+        self.assertEqual(len(migrations.MIGRATIONS), self._get_version())
+        for entity_type in migrations.MIGRATED_MODELS:
+            self.assertTrue(migrations.table_exists(self.conn.cursor(), entity_type.table_name))
+            self.assertLessEqual(models.get_model_indexes(entity_type).keys(), self._get_index_names(
+                entity_type.table_name,
+            ))
+
+    def test_legacy_database(self):
+        self._create_legacy_tables()
+        boxes = self._insert_boxes(2 * migrations.REBUILD_BATCH_SIZE + 3)
+
+        self.assertEqual(0, migrations.migrate(self.conn))
+        self.assertEqual(len(migrations.MIGRATIONS), self._get_version())
+        res = self.conn.execute(f'SELECT * FROM {models.Box.table_name} ORDER BY rowid')
+        self.assertListEqual(boxes, res.fetchall())
+        pk_columns = [
+            column[0] for column in migrations.get_table_columns(self.conn.cursor(), models.Box.table_name)
+            if column[4]
+        ]
+        self.assertListEqual([models.Box.id_name], pk_columns)
+        self.assertIn('ux_boxes_name', self._get_index_names(models.Box.table_name))
+
+    def test_legacy_column_types_converted(self):
+        self._create_legacy_tables()
+        items = [
+            (f'item000{k}', 'box00000', 'mfg', str(quantity), 'desc', 'dk', 'mouser', 'jlc', 'u' * 28, '1722000000000')
+            for k, quantity in enumerate((10, 9, 100))
+        ]
+        self.conn.executemany(f'INSERT INTO {models.Item.table_name} VALUES ({", ".join("?" * 10)})', items)
+        self.conn.commit()
+
+        migrations.migrate(self.conn)
+        res = self.conn.execute(
+            f'SELECT quantity, typeof(quantity), typeof(created_epoch_millis) '
+            f'FROM {models.Item.table_name} ORDER BY quantity',
+        )
+        self.assertListEqual(
+            [(9, 'integer', 'integer'), (10, 'integer', 'integer'), (100, 'integer', 'integer')],
+            res.fetchall(),
+        )
+        if migrations.STRICT_TABLES:
+            with self.assertRaises(sqlite3.IntegrityError):
+                self.conn.execute(f'UPDATE {models.Item.table_name} SET quantity=?', ('many',))
+
+    def test_legacy_unconvertible_value(self):
+        if not migrations.STRICT_TABLES:
+            self.skipTest('Values are only type checked in STRICT tables')
+        self._create_legacy_tables()
+        self.conn.execute(f'INSERT INTO {models.User.table_name} VALUES (?, ?, ?, ?)', ('u' * 28, 'key', 'tst', 'all'))
+        self.conn.commit()
+        with self.assertRaises(migrations.MigrationError):
+            migrations.migrate(self.conn)
+        self.assertEqual(0, self._get_version())
+
+    @unittest.skipUnless(migrations.FULL_TEXT_SEARCH, 'Full-text search is not supported')
+    def test_search_table_populated(self):
+        self._create_legacy_tables()
+        self.conn.execute(
+            f'INSERT INTO {models.Item.table_name} VALUES ({", ".join("?" * 10)})',
+            ('item0000', 'box00000', 'RC0603FR-0710KL', '1', 'desc', 'dk', 'mouser', 'jlc', 'u' * 28, '0'),
+        )
+        self.conn.commit()
+
+        migrations.migrate(self.conn)
+        search_table_name = models.get_search_table_name(models.Item)
+        res = self.conn.execute(f'SELECT rowid FROM {search_table_name} WHERE {search_table_name} MATCH ?', ('0710*',))
+        self.assertEqual(1, len(res.fetchall()))
+        self.conn.execute(f'DELETE FROM {models.Item.table_name}')
+        res = self.conn.execute(f'SELECT rowid FROM {search_table_name} WHERE {search_table_name} MATCH ?', ('0710*',))
+        self.assertEqual(0, len(res.fetchall()))
+
+    @unittest.skipUnless(migrations.FUZZY_SEARCH, 'Fuzzy search is not supported')
+    def test_fuzzy_table_populated(self):
+        self._create_legacy_tables()
+        self.conn.execute(
+            f'INSERT INTO {models.Item.table_name} VALUES ({", ".join("?" * 10)})',
+            ('item0000', 'box00000', 'rc0603fr-0710kl', '1', 'desc', 'dk', 'mouser', 'jlc', 'u' * 28, '0'),
+        )
+        self.conn.commit()
+
+        migrations.migrate(self.conn)
+        fuzzy_table_name = models.get_fuzzy_table_name(models.Item)
+        res = self.conn.execute(f'SELECT mfg_part_number FROM {fuzzy_table_name}')
+        self.assertListEqual([('RC0603FR0710KL',)], res.fetchall())
+
+    def test_counters_populated(self):
+        self._create_legacy_tables()
+        items = [
+            (f'item000{k}', f'box0000{k % 2}', 'mfg', '1', 'desc', 'dk', 'mouser', 'jlc', 'u' * 28, '0')
+            for k in range(3)
+        ]
+        self.conn.executemany(f'INSERT INTO {models.Item.table_name} VALUES ({", ".join("?" * 10)})', items)
+        self.conn.commit()
+
+        migrations.migrate(self.conn)
+        query = f'SELECT count FROM {models.COUNTS_TABLE_NAME} WHERE table_name=? AND column_name=? AND value=?'
+        self.assertEqual((3,), self.conn.execute(query, (models.Item.table_name, '', '')).fetchone())
+        self.assertEqual((2,), self.conn.execute(query, (models.Item.table_name, 'box_id', 'box00000')).fetchone())
+        self.conn.execute(f'UPDATE {models.Item.table_name} SET box_id=? WHERE item_id=?', ('box00001', 'item0000'))
+        self.assertEqual((1,), self.conn.execute(query, (models.Item.table_name, 'box_id', 'box00000')).fetchone())
+        self.assertEqual((2,), self.conn.execute(query, (models.Item.table_name, 'box_id', 'box00001')).fetchone())
+        self.conn.execute(f'DELETE FROM {models.Item.table_name}')
+        self.assertEqual((0,), self.conn.execute(query, (models.Item.table_name, '', '')).fetchone())
+
+    def test_reservation_expiry_added(self):
+        self._create_legacy_tables()
+        self.conn.execute(
+            f'INSERT INTO {models.Reservation.table_name} VALUES (?, ?, ?, ?)', ('r' * 32, 'u' * 28, 'i' * 8, '1'),
+        )
+        self.conn.commit()
+
+        migrations.migrate(self.conn)
+        res = self.conn.execute(f'SELECT expires_epoch_millis FROM {models.Reservation.table_name}')
+        self.assertGreater(res.fetchone()[0], common.time_ms())
+        self.assertNotIn('ix_reservations_item_id', self._get_index_names(models.Reservation.table_name))
+
+    def test_latest_database_unchanged(self):
+        migrations.migrate(self.conn)
+        boxes = self._insert_boxes(3)
+        self.assertEqual(len(migrations.MIGRATIONS), migrations.migrate(self.conn))
+        res = self.conn.execute(f'SELECT * FROM {models.Box.table_name}')
+        self.assertListEqual(boxes, res.fetchall())
+
+    def test_concurrent_migration(self):
+        other_conn = sqlite3.connect(self.path)
+        other_conn.execute('BEGIN IMMEDIATE')
+        migrations.create_tables(other_conn.cursor())
+        other_conn.execute(f'PRAGMA user_version = {len(migrations.MIGRATIONS)}')
+        versions = []
+
+        def migrate():
+            conn = sqlite3.connect(self.path)
+            try:
+                versions.append(migrations.migrate(conn))
+            finally:
+                conn.close()
+
+        thread = threading.Thread(target=migrate)
+        thread.start()
+        time.sleep(0.1)
+        other_conn.commit()
+        other_conn.close()
+        thread.join()
+        self.assertListEqual([len(migrations.MIGRATIONS)], versions)
+
+    def test_failed_migration_rolled_back(self):
+        self._create_legacy_tables()
+        boxes = self._insert_boxes(3)
+        self._insert_boxes(1)  # Duplicate box ID cannot be migrated to a primary key
+
+        with self.assertRaisesRegex(migrations.MigrationError, 'Box box_id box00000 is not unique'):
+            migrations.migrate(self.conn)
+        self.assertEqual(0, self._get_version())
+        res = self.conn.execute(f'SELECT * FROM {models.Box.table_name} ORDER BY rowid')
+        self.assertListEqual(boxes + boxes[:1], res.fetchall())
+
+    def test_legacy_duplicate_names_rejected(self):
+        self._create_legacy_tables()
+        self.conn.executemany(
+            f'INSERT INTO {models.Box.table_name} VALUES (?, ?)', [('box00000', 'tst'), ('box00001', 'tst')],
+        )
+        self.conn.commit()
+
+        with self.assertRaisesRegex(migrations.MigrationError, 'Box name tst is not unique'):
+            migrations.migrate(self.conn)
+        self.assertEqual(0, self._get_version())
+        self.assertNotIn(f'ux_{models.Box.table_name}_name', self._get_index_names(models.Box.table_name))
+
+    def test_newer_database(self):
+        self.conn.execute(f'PRAGMA user_version = {len(migrations.MIGRATIONS) + 1}')
+        with self.assertRaises(migrations.MigrationError):
+            migrations.migrate(self.conn)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+import models
+from identifier import Identifier
+
+
+class TestEntityCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = models.EntityCache(max_size=2)
+        self.entities = [models.Box(box_id=Identifier(length=models.Box.id_length), name='box')]
+
+    def test_evicts_least_recently_used(self):
+        keys = [models.EntityCacheKey(models.Box, offset=i) for i in range(3)]
+        self.cache.add(keys[0], self.entities)
+        self.cache.add(keys[1], self.entities)
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.cache.add(keys[2], self.entities)
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+
+    def test_expired(self):
+        key = models.EntityCacheKey(models.Box, ttl_sec=0)
+        self.cache.add(key, self.entities)
+        self.assertIsNone(self.cache.get(key))
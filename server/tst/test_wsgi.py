@@ -0,0 +1,25 @@
+import threading
+import unittest
+
+import common
+import wsgi
+
+
+class TestCreateTables(unittest.TestCase):
+    def test_writer_released(self):
+        wsgi._create_tables()
+        errors = []
+
+        def write():
+            try:
+                with wsgi.app.app_context():
+                    conn, _ = common.get_db_connection()
+                    conn.execute('BEGIN IMMEDIATE')
+                    conn.rollback()
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        self.assertListEqual([], errors)
@@ -23,6 +23,8 @@ class TestBase(unittest.TestCase):
         self.client = wsgi.app.test_client()
         drop_all_tables()
         db._list_cache.clear()
+        db._count_cache.clear()
+        auth._principal_cache.clear()
         wsgi._create_tables()
         self.superuser = create_user()
 
@@ -125,8 +127,14 @@ class IdTests(ABC):
 def drop_all_tables() -> None:
     conn = sqlite3.connect(common.DATABASE_PATH)
     cursor = conn.cursor()
-    for entity_type in (models.Item, models.User, models.Reservation, models.Box):
-        cursor.execute(f'DROP TABLE IF EXISTS {entity_type.table_name}')
+    # Virtual tables first, which drop their own shadow tables
+    res = cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+        "ORDER BY sql LIKE 'CREATE VIRTUAL TABLE%' DESC",
+    )
+    for table_name, in res.fetchall():
+        cursor.execute(f'DROP TABLE IF EXISTS {table_name}')
+    cursor.execute('PRAGMA user_version = 0')
     conn.commit()
     cursor.close()
     conn.close()
@@ -146,6 +154,41 @@ def create_user(scope: Optional[auth.Scope] = None) -> models.User:
     return user
 
 
+def create_item(created_by: models.User, k: int = 0, box_id: str = 'box00000') -> models.Item:
+    item = models.Item(
+        item_id=Identifier(length=models.Item.id_length),
+        box_id=Identifier(length=models.Box.id_length, id_=box_id),
+        mfg_part_number=f'tst-mfg-{k}',
+        quantity=k,
+        description=f'tst item {k}',
+        digikey_part_number=f'tst-digikey-{k}',
+        mouser_part_number=f'tst-mouser-{k}',
+        jlcpcb_part_number=f'tst-jlcpcb-{k}',
+        created_by=created_by.user_id,
+        created_epoch_millis=common.time_ms(),
+    )
+    conn, cursor = common.get_db_connection()
+    db.create_entity(conn, cursor, item)
+    return item
+
+
+def create_reservation(
+    user: models.User, item: models.Item, quantity: int = 1, expires_epoch_millis: Optional[int] = None,
+) -> models.Reservation:
+    if expires_epoch_millis is None:
+        expires_epoch_millis = common.time_ms() + common.RESERVATION_TTL_MILLIS
+    reservation = models.Reservation(
+        reservation_id=Identifier(length=models.Reservation.id_length),
+        user_id=user.user_id,
+        item_id=item.item_id,
+        quantity=quantity,
+        expires_epoch_millis=expires_epoch_millis,
+    )
+    conn, cursor = common.get_db_connection()
+    db.create_entity(conn, cursor, reservation)
+    return reservation
+
+
 def max_authmask() -> int:
     return (0b1 << len(auth.Scope)) - 1
 